@@ -33,11 +33,57 @@ bl_info = {
 if "bpy" in locals():
     import importlib
     print("reload im local")
+    if "profiler" in locals():
+        importlib.reload(profiler)
+    if "im_writer" in locals():
+        importlib.reload(im_writer)
+    if "mesh_extract" in locals():
+        importlib.reload(mesh_extract)
+    if "vertex_dedup" in locals():
+        importlib.reload(vertex_dedup)
+    if "timeline" in locals():
+        importlib.reload(timeline)
+    if "pose_math" in locals():
+        importlib.reload(pose_math)
+    if "action_sampler" in locals():
+        importlib.reload(action_sampler)
+    if "texture_cache" in locals():
+        importlib.reload(texture_cache)
+    if "tga_writer" in locals():
+        importlib.reload(tga_writer)
+    if "adjacency" in locals():
+        importlib.reload(adjacency)
+    if "mesh_optimize" in locals():
+        importlib.reload(mesh_optimize)
+    if "export_cache" in locals():
+        importlib.reload(export_cache)
+    if "mesh_chunk" in locals():
+        importlib.reload(mesh_chunk)
+    if "temp_meshes" in locals():
+        importlib.reload(temp_meshes)
     if "export_im" in locals():
         print("lib reload")
         importlib.reload(export_im)
 import bpy
 
+#bound here so that the reloads above find them, export_im is imported when exporting
+from . import (
+        profiler,
+        im_writer,
+        mesh_extract,
+        vertex_dedup,
+        timeline,
+        pose_math,
+        action_sampler,
+        texture_cache,
+        tga_writer,
+        adjacency,
+        mesh_optimize,
+        export_cache,
+        mesh_chunk,
+        temp_meshes,
+        )
+
 from bpy.props import (
         BoolProperty,
         FloatProperty,
@@ -96,6 +142,12 @@ class ExportIM(bpy.types.Operator, ExportHelper):
             description="Convert all exported images to uncompressed TGA for older Trainz versions (experimental)",
             default=False,
             )
+
+    use_texture_cache: BoolProperty(
+            name="Cache Textures",
+            description="Remember what each converted texture and texture.txt was made from in a .im_cache folder next to the export, and skip rewriting the ones that haven't changed",
+            default=False,
+            )
     
     # legacy_chunk_data: BoolProperty(
     #         name="Legacy Chunk Data",
@@ -127,6 +179,43 @@ class ExportIM(bpy.types.Operator, ExportHelper):
             default=False,
             )
 
+    use_object_cache: BoolProperty(
+            name="Cache Object Data",
+            description="Keep each object's tangents, vertex deduplication and adjacency in a .im_cache folder next to the export and reuse them for objects that haven't changed",
+            default=False,
+            )
+
+    use_streaming: BoolProperty(
+            name="Stream Chunks",
+            description="Write each chunk to the file as soon as it's built instead of holding the whole model in memory, for very large scenes",
+            default=False,
+            )
+
+    spatial_split: BoolProperty(
+            name="Spatial Chunk Splitting",
+            description="Split meshes that exceed the 65k vertex/triangle chunk limits into spatially compact chunks instead of cutting them in face order",
+            default=False,
+            )
+
+    optimize_vertex_cache: BoolProperty(
+            name="Optimize Vertex Cache",
+            description="Reorder each chunk's triangles for the GPU vertex cache and its vertices in first use order",
+            default=False,
+            )
+
+    optimize_overdraw: BoolProperty(
+            name="Reduce Overdraw",
+            description="Sort the triangles of opaque chunks so that outward facing parts are drawn first. Implies vertex cache optimization",
+            default=False,
+            )
+
+    overdraw_threshold: FloatProperty(
+            name="Cache Threshold",
+            description="How much worse than the vertex cache optimized order (in cache misses per triangle) the overdraw ordering may get",
+            min=1.0, max=3.0,
+            default=1.05,
+            )
+
     use_wide_strings: BoolProperty(
             name="Force Wide Strings",
             description="Export all .im/.kin strings with wide 16 bit formatting instead of 8 bit. This may protect against some ripping software",
@@ -193,6 +282,12 @@ class ExportIM(bpy.types.Operator, ExportHelper):
             default=True,
             )
 
+    use_direct_sampling: BoolProperty(
+            name="Fast Sampling",
+            description="Evaluate the armature's action/NLA F-curves directly instead of updating the whole scene every frame. Falls back to full scene updates for constraints, drivers and other unsupported setups",
+            default=False,
+            )
+
     global_scale: FloatProperty(
             name="Scale",
             min=0.01, max=1000.0,
@@ -235,6 +330,27 @@ class ExportIM(bpy.types.Operator, ExportHelper):
         ('201', '201 (Trainz)', '200 with tangents data'),
     ], default='201')
 
+    log_level: EnumProperty(
+        name="Log Level",
+        description="Amount of detail printed to the console during export",
+        items=[
+        ('WARNING', 'Warnings', 'Only problems'),
+        ('INFO', 'Info', 'Summaries: files written, optimization statistics'),
+        ('DEBUG', 'Debug', 'Every object, material and bone'),
+    ], default='INFO')
+
+    write_profile: BoolProperty(
+            name="Write Profile",
+            description="Record the time, call count and peak memory of every export phase and write them to a .im.profile.json file next to the .im. Memory tracing slows the export down",
+            default=False,
+            )
+
+    use_cprofile: BoolProperty(
+            name="cProfile",
+            description="Run the export under cProfile and write the function level statistics to a .im.prof file next to the .im",
+            default=False,
+            )
+
     path_mode: path_reference_mode
 
     check_extension = True
@@ -326,12 +442,21 @@ class IM_PT_export_geometry(bpy.types.Panel):
 
         layout.prop(operator, 'export_tangents')
         layout.prop(operator, 'export_vertex_colors')
+        layout.prop(operator, 'spatial_split')
+        layout.prop(operator, 'use_object_cache')
+        layout.prop(operator, 'use_streaming')
+        layout.prop(operator, 'optimize_vertex_cache')
+        layout.prop(operator, 'optimize_overdraw')
+        row = layout.row()
+        row.enabled = operator.optimize_overdraw
+        row.prop(operator, 'overdraw_threshold')
 
         layout.prop(operator, 'export_curves')
         layout.prop(operator, 'global_scale')
         layout.prop(operator, 'path_mode')
         layout.prop(operator, 'use_texturetxt')
         layout.prop(operator, 'convert_tga')
+        layout.prop(operator, 'use_texture_cache')
 
 
 
@@ -396,6 +521,7 @@ class IM_PT_export_animation(bpy.types.Panel):
         layout.prop(operator, 'use_nla')
         layout.prop(operator, 'export_events')
         layout.prop(operator, 'use_blender_framerate')
+        layout.prop(operator, 'use_direct_sampling')
 
 class IM_PT_export_versions(bpy.types.Panel):
     bl_space_type = 'FILE_BROWSER'
@@ -429,6 +555,32 @@ class IM_PT_export_versions(bpy.types.Panel):
         layout.prop(operator, 'matl_version')
         layout.prop(operator, 'geom_version')
 
+class IM_PT_export_diagnostics(bpy.types.Panel):
+    bl_space_type = 'FILE_BROWSER'
+    bl_region_type = 'TOOL_PROPS'
+    bl_label = "Diagnostics"
+    bl_parent_id = "FILE_PT_operator"
+    bl_options = {'DEFAULT_CLOSED'}
+
+    @classmethod
+    def poll(cls, context):
+        sfile = context.space_data
+        operator = sfile.active_operator
+
+        return operator.bl_idname == "EXPORT_SCENE_OT_im"
+
+    def draw(self, context):
+        layout = self.layout
+        layout.use_property_split = True
+        layout.use_property_decorate = False  # No animation.
+
+        sfile = context.space_data
+        operator = sfile.active_operator
+
+        layout.prop(operator, 'log_level')
+        layout.prop(operator, 'write_profile')
+        layout.prop(operator, 'use_cprofile')
+
 def menu_func_export(self, context):
     self.layout.operator(ExportIM.bl_idname, text="Indexed Mesh (.im)")
 
@@ -439,7 +591,8 @@ classes = (
     IM_PT_export_geometry,
     IM_PT_export_armature,
     IM_PT_export_animation,
-    IM_PT_export_versions
+    IM_PT_export_versions,
+    IM_PT_export_diagnostics
 )
 
 
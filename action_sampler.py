@@ -0,0 +1,271 @@
+"""Depsgraph-free pose sampling for .kin export.
+
+scene.frame_set() re-evaluates the whole scene - subdivision, geometry nodes and all - just
+to move the armature. For the common case of an armature driven only by its action (or the
+strips of one NLA track) the pose can be computed directly instead: the bone F-curves are
+evaluated at the mapped action time and the pose matrices rebuilt from the rest hierarchy.
+
+Anything the sampler doesn't model (constraints, drivers, non-default bone inheritance,
+blended or animated NLA strips, ...) makes create() return None so the exporter keeps using
+frame_set, and frames no NLA strip covers are handed back to frame_set one by one.
+"""
+
+import logging
+import math
+import re
+
+import numpy as np
+
+from .pose_math import normalize_quaternions, quaternions_to_matrices
+
+log = logging.getLogger(__name__)
+
+_BONE_PATH = re.compile(r'^pose\.bones\["((?:[^"\\]|\\.)*)"\]\.(\w+)$')
+
+#pose channel -> (value slot, width)
+_CHANNELS = {
+    "location": (0, 3),
+    "rotation_quaternion": (3, 4),
+    "rotation_euler": (7, 3),
+    "rotation_axis_angle": (10, 4),
+    "scale": (14, 3),
+}
+_NUM_VALUES = 17
+
+def _unescape(name):
+    return re.sub(r'\\(.)', r'\1', name)
+
+def _euler_matrices(angles, order):
+    """(N, 3) euler angles to (N, 3, 3) matrices, rotating about the axes in order (e.g. 'XYZ')."""
+    out = np.broadcast_to(np.eye(3), (len(angles), 3, 3)).copy()
+    for axis_name in order:
+        axis = "XYZ".index(axis_name)
+        angle = angles[:, axis]
+        c, s = np.cos(angle), np.sin(angle)
+        rot = np.broadcast_to(np.eye(3), (len(angles), 3, 3)).copy()
+        a, b = [i for i in range(3) if i != axis]
+        sign = -1.0 if axis == 1 else 1.0
+        rot[:, a, a] = c
+        rot[:, b, b] = c
+        rot[:, a, b] = -s * sign
+        rot[:, b, a] = s * sign
+        out = rot @ out
+    return out
+
+def _axis_angle_matrices(values):
+    angle = values[:, 0]
+    axis = values[:, 1:4]
+    length = np.linalg.norm(axis, axis=1)
+    valid = length > 1.0e-35
+    half = angle * 0.5
+    quats = np.zeros((len(values), 4))
+    quats[:, 0] = 1.0
+    quats[valid, 0] = np.cos(half[valid])
+    quats[valid, 1:] = axis[valid] / length[valid, None] * np.sin(half[valid])[:, None]
+    return quaternions_to_matrices(quats)
+
+def _strip_time(strip, frame):
+    """Action time of a CLIP strip at a scene frame (Blender's nlastrip_get_frame_actionclip)."""
+    scale = abs(strip.scale)
+    length = strip.action_frame_end - strip.action_frame_start
+    if length == 0.0:
+        length = 1.0
+    repeat_end = frame == strip.frame_end and strip.repeat == math.floor(strip.repeat)
+    if strip.use_reverse:
+        if repeat_end:
+            return strip.action_frame_start
+        return strip.action_frame_end - math.fmod(frame - strip.frame_start, length * scale) / scale
+    if repeat_end:
+        return strip.action_frame_end
+    return strip.action_frame_start + math.fmod(frame - strip.frame_start, length * scale) / scale
+
+class ActionSampler:
+    """Computes armature space pose matrices (pose_bone.matrix) of every pose bone."""
+
+    def __init__(self, armature, sources):
+        pose_bones = armature.pose.bones
+        names = [pose_bone.name for pose_bone in pose_bones]
+        index = {name: idx for idx, name in enumerate(names)}
+        num_bones = len(names)
+
+        self.sources = sources
+        self.rotation_modes = [pose_bone.rotation_mode for pose_bone in pose_bones]
+
+        #current channel values, animated ones get overwritten per frame
+        self.base_values = np.zeros((num_bones, _NUM_VALUES))
+        for idx, pose_bone in enumerate(pose_bones):
+            for channel, (slot, width) in _CHANNELS.items():
+                self.base_values[idx, slot:slot + width] = getattr(pose_bone, channel)[:]
+
+        #rest pose offsets from the parent bone
+        self.parents = np.full(num_bones, -1, dtype=np.int64)
+        self.offsets = np.empty((num_bones, 4, 4))
+        depth = np.zeros(num_bones, dtype=np.int64)
+        for idx, pose_bone in enumerate(pose_bones):
+            bone = pose_bone.bone
+            rest = np.array([list(row) for row in bone.matrix_local], dtype=np.float64)
+            if bone.parent is not None:
+                parent_rest = np.array([list(row) for row in bone.parent.matrix_local], dtype=np.float64)
+                self.parents[idx] = index[bone.parent.name]
+                rest = np.linalg.inv(parent_rest) @ rest
+            self.offsets[idx] = rest
+
+            parent = bone.parent
+            while parent is not None:
+                depth[idx] += 1
+                parent = parent.parent
+        self.levels = [np.flatnonzero(depth == level) for level in range(int(depth.max()) + 1 if num_bones else 0)]
+
+        #per source, (F-curve, bone, value column) of every animated pose channel
+        self.curves = []
+        for action, _ in sources:
+            curves = []
+            for fcurve in action.fcurves:
+                if fcurve.mute:
+                    continue
+                match = _BONE_PATH.match(fcurve.data_path)
+                if match is None:
+                    continue
+                name, channel = _unescape(match.group(1)), match.group(2)
+                if name not in index or channel not in _CHANNELS:
+                    continue
+                slot, width = _CHANNELS[channel]
+                if fcurve.array_index >= width:
+                    continue
+                curves.append((fcurve, index[name], slot + fcurve.array_index))
+            self.curves.append(curves)
+
+    @classmethod
+    def create(cls, armature, track=None):
+        """Build a sampler for the armature's active action, or for one NLA track when track is
+        given. Returns None (after printing the reason) when the pose can't be computed directly."""
+        reason = cls._unsupported(armature, track)
+        if reason is None:
+            anim_data = armature.animation_data
+            if track is None:
+                sources = []
+                if anim_data is not None and anim_data.action is not None:
+                    sources.append((anim_data.action, None))
+            else:
+                sources = [(strip.action, strip) for strip in track.strips if not strip.mute]
+
+            for action, _ in sources:
+                if getattr(action, "fcurves", None) is None or len(getattr(action, "slots", ())) > 1:
+                    reason = "action " + action.name + " uses slots"
+                    break
+
+        if reason is not None:
+            log.info("Sampling animation with frame_set: " + reason)
+            return None
+        return cls(armature, sources)
+
+    @staticmethod
+    def _unsupported(armature, track):
+        if armature is None or armature.pose is None:
+            return "no armature"
+        if armature.data.pose_position != 'POSE':
+            return "armature is in rest position"
+
+        for id_data in (armature, armature.data):
+            anim_data = id_data.animation_data
+            if anim_data is not None and len(anim_data.drivers) > 0:
+                return "drivers"
+
+        for pose_bone in armature.pose.bones:
+            bone = pose_bone.bone
+            if len(pose_bone.constraints) > 0:
+                return "bone constraints (" + pose_bone.name + ")"
+            if (getattr(bone, "inherit_scale", 'FULL') != 'FULL' or not bone.use_inherit_rotation
+                    or not bone.use_local_location or getattr(bone, "use_relative_parent", False)):
+                return "bone inheritance settings (" + pose_bone.name + ")"
+
+        anim_data = armature.animation_data
+        if anim_data is None:
+            return None
+        if getattr(anim_data, "use_tweak_mode", False):
+            return "NLA tweak mode"
+
+        if track is None:
+            if anim_data.use_nla and any(not nla_track.mute and len(nla_track.strips) > 0 for nla_track in anim_data.nla_tracks):
+                return "NLA tracks"
+            if anim_data.action is not None and (getattr(anim_data, "action_blend_type", 'REPLACE') != 'REPLACE'
+                                                 or getattr(anim_data, "action_influence", 1.0) != 1.0):
+                return "action blending"
+        else:
+            if anim_data.action is not None:
+                return "active action on top of NLA"
+            for strip in track.strips:
+                if strip.mute:
+                    continue
+                if strip.type != 'CLIP' or strip.action is None:
+                    return "non clip strip " + strip.name
+                if strip.blend_type != 'REPLACE' or strip.use_animated_influence or strip.use_animated_time:
+                    return "strip blending " + strip.name
+                if strip.blend_in != 0.0 or strip.blend_out != 0.0 or len(strip.modifiers) > 0:
+                    return "strip blending " + strip.name
+        return None
+
+    def _action_times(self, frame):
+        """Action time of each source at frame, None for sources that don't contribute."""
+        if len(self.sources) == 0 or self.sources[0][1] is None:
+            return [frame] * len(self.sources)
+
+        #NLA: the strip under the frame, otherwise a neighbour holding its value
+        strips = [strip for _, strip in self.sources]
+        times = [None] * len(strips)
+        for idx, strip in enumerate(strips):
+            if strip.frame_start <= frame <= strip.frame_end:
+                times[idx] = _strip_time(strip, frame)
+                return times
+
+        previous = [idx for idx, strip in enumerate(strips) if strip.frame_end < frame]
+        if previous:
+            idx = max(previous, key=lambda i: strips[i].frame_end)
+            if strips[idx].extrapolation in ('HOLD', 'HOLD_FORWARD'):
+                times[idx] = _strip_time(strips[idx], strips[idx].frame_end)
+            return times
+
+        idx = min(range(len(strips)), key=lambda i: strips[i].frame_start)
+        if strips[idx].extrapolation == 'HOLD':
+            times[idx] = _strip_time(strips[idx], strips[idx].frame_start)
+        return times
+
+    def pose_matrices(self, frame):
+        """(bones, 4, 4) pose matrices at frame, in armature.pose.bones order, or None if the
+        frame isn't covered and has to be evaluated by the depsgraph."""
+        times = self._action_times(frame)
+        if len(self.sources) > 0 and all(time is None for time in times):
+            return None
+
+        values = self.base_values.copy()
+        for curves, time in zip(self.curves, times):
+            if time is None:
+                continue
+            for fcurve, bone_index, column in curves:
+                values[bone_index, column] = fcurve.evaluate(time)
+
+        #matrix_basis from location, rotation and scale
+        rotation = np.empty((len(values), 3, 3))
+        for mode in set(self.rotation_modes):
+            rows = np.array([idx for idx, bone_mode in enumerate(self.rotation_modes) if bone_mode == mode], dtype=np.int64)
+            if mode == 'QUATERNION':
+                rotation[rows] = quaternions_to_matrices(normalize_quaternions(values[rows, 3:7]))
+            elif mode == 'AXIS_ANGLE':
+                rotation[rows] = _axis_angle_matrices(values[rows, 10:14])
+            else:
+                rotation[rows] = _euler_matrices(values[rows, 7:10], mode)
+
+        basis = np.zeros((len(values), 4, 4))
+        basis[:, :3, :3] = rotation * values[:, None, 14:17]
+        basis[:, :3, 3] = values[:, 0:3]
+        basis[:, 3, 3] = 1.0
+
+        #pose = parent pose @ rest offset @ basis, parents first
+        local = self.offsets @ basis
+        pose = np.empty_like(local)
+        for level in self.levels:
+            roots = level[self.parents[level] < 0]
+            children = level[self.parents[level] >= 0]
+            pose[roots] = local[roots]
+            pose[children] = pose[self.parents[children]] @ local[children]
+        return pose
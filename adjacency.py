@@ -0,0 +1,61 @@
+"""Array based triangle adjacency for NINF chunks.
+
+Gives the same neighbors as collecting, per edge, the list of triangles using it and then
+walking each triangle's three edges: a triangle's neighbors are the other triangles on its
+first edge, then its second, then its third (each in ascending triangle order), and the
+first three of those are kept.
+
+Instead of dictionaries keyed per face, the (edge, triangle) incidences are sorted by edge
+once and every triangle reads its candidates out of the sorted runs.
+"""
+
+import numpy as np
+
+NO_NEIGHBOR = 0xFFFF
+
+#a triangle appears at most 3 times in one edge's run (degenerate triangles), so 3 more
+#entries are always enough to find 3 other triangles on that edge
+_MAX_RUN = 6
+
+def triangle_neighbors(tri_edges):
+    """(T, 3) edge indices of each triangle -> (T, 3) neighboring triangle indices, -1 padded."""
+    tri_edges = np.asarray(tri_edges, dtype=np.int64).reshape(-1, 3)
+    num_tris = len(tri_edges)
+    flat_edges = tri_edges.ravel()
+
+    #stable, so each edge's run lists its triangles in ascending order
+    order = np.argsort(flat_edges, kind='stable')
+    sorted_edges = flat_edges[order]
+    sorted_tris = order // 3
+    run_start = np.searchsorted(sorted_edges, flat_edges, side='left')
+    run_end = np.searchsorted(sorted_edges, flat_edges, side='right')
+
+    #expand every triangle corner edge into its candidates, in triangle then edge order
+    counts = np.minimum(run_end - run_start, _MAX_RUN)
+    slot = np.repeat(np.arange(len(flat_edges)), counts)
+    offset = np.arange(len(slot)) - np.repeat(np.cumsum(counts) - counts, counts)
+    candidates = sorted_tris[run_start[slot] + offset]
+    owner = slot // 3
+
+    other = candidates != owner
+    candidates = candidates[other]
+    owner = owner[other]
+
+    #owner is sorted, so the rank of a candidate is its distance to the owner's first one
+    rank = np.arange(len(owner)) - np.searchsorted(owner, owner, side='left')
+    keep = rank < 3
+
+    neighbors = np.full((num_tris, 3), -1, dtype=np.int64)
+    neighbors[owner[keep], rank[keep]] = candidates[keep]
+    return neighbors
+
+def neighbor_records(neighbors, tri_chunk, tri_primitive):
+    """Map (P, 3) neighboring triangle indices to (P, 3, 2) NINF records of (primitive index,
+    chunk index), NO_NEIGHBOR for missing neighbors. tri_chunk and tri_primitive give the
+    chunk and primitive each triangle of the mesh was written to."""
+    neighbors = np.asarray(neighbors, dtype=np.int64)
+    valid = neighbors >= 0
+    records = np.full(neighbors.shape + (2,), NO_NEIGHBOR, dtype=np.uint16)
+    records[valid, 0] = tri_primitive[neighbors[valid]]
+    records[valid, 1] = tri_chunk[neighbors[valid]]
+    return records
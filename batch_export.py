@@ -0,0 +1,187 @@
+"""Headless batch export of many .blend files over parallel background Blender processes.
+
+Driver (plain Python, outside Blender):
+
+    python batch_export.py manifest.json -j 4 --blender /path/to/blender --summary summary.json
+
+The manifest is JSON, paths are relative to the manifest:
+
+    {
+        "presets": {
+            "tane": {"use_skel": false, "export_tangents": true},
+            "legacy": {"use_explicit_versioning": true, "geom_version": "102"}
+        },
+        "jobs": [
+            {"blend": "loco/body.blend", "output": "loco/body.im", "preset": "tane"},
+            {"blend": "old/wagon.blend", "output": "old/wagon.im", "preset": "legacy",
+             "options": {"use_selection": true}}
+        ]
+    }
+
+Options are the export operator's keywords (see ExportIM), job options override the
+preset's. Every job runs in its own `blender --background --factory-startup` process, which
+loads the .blend, registers this add-on from its folder and runs the exporter. A summary of
+per job timings and failures is printed and optionally written as JSON.
+"""
+
+import argparse
+import concurrent.futures
+import json
+import os
+import subprocess
+import sys
+import time
+import traceback
+
+RESULT_MARKER = "IM_BATCH_RESULT "
+WORKER_FLAG = "--im-batch-worker"
+
+def load_jobs(manifest_path):
+    with open(manifest_path, "r") as f:
+        manifest = json.load(f)
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    presets = manifest.get("presets", {})
+
+    jobs = []
+    for job in manifest["jobs"]:
+        options = {}
+        if job.get("preset") is not None:
+            options.update(presets[job["preset"]])
+        options.update(job.get("options", {}))
+        jobs.append({
+            "blend": os.path.join(base_dir, job["blend"]),
+            "output": os.path.join(base_dir, job["output"]),
+            "preset": job.get("preset"),
+            "options": options,
+        })
+    return jobs
+
+def run_blender_script(blender, script, script_args, blend=None, timeout=None):
+    """Run a script in a background Blender process. Returns (the JSON the script printed after
+    RESULT_MARKER or None, the finished process). Raises subprocess.TimeoutExpired and OSError."""
+    args = [blender, "--background", "--factory-startup"]
+    if blend is not None:
+        args.append(blend)
+    args += ["--python", os.path.abspath(script), "--"] + list(script_args)
+
+    process = subprocess.run(args, capture_output=True, text=True, errors="replace", timeout=timeout)
+    result = None
+    for line in process.stdout.splitlines():
+        if line.startswith(RESULT_MARKER):
+            result = json.loads(line[len(RESULT_MARKER):])
+    return result, process
+
+def process_error(process):
+    return (process.stderr or process.stdout)[-2000:] or f"Blender exited with code {process.returncode}"
+
+def run_worker(blender, job, timeout=None):
+    """Export one job in a background Blender process and return its summary entry."""
+    entry = {"blend": job["blend"], "output": job["output"], "preset": job["preset"]}
+
+    start = time.perf_counter()
+    try:
+        result, process = run_blender_script(blender, __file__, [WORKER_FLAG, json.dumps(job)], job["blend"], timeout)
+    except subprocess.TimeoutExpired:
+        entry.update(status="timeout", elapsed=time.perf_counter() - start)
+        return entry
+    except OSError as e:
+        entry.update(status="error", elapsed=time.perf_counter() - start, error=str(e))
+        return entry
+    entry["elapsed"] = time.perf_counter() - start
+    entry["returncode"] = process.returncode
+
+    if result is None:
+        #Blender died before the exporter reported back
+        entry["status"] = "error"
+        entry["error"] = process_error(process)
+        return entry
+
+    entry.update(result)
+    return entry
+
+def run_batch(jobs, blender, num_workers, timeout=None):
+    results = [None] * len(jobs)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=num_workers) as executor:
+        futures = {executor.submit(run_worker, blender, job, timeout): index for index, job in enumerate(jobs)}
+        for future in concurrent.futures.as_completed(futures):
+            entry = future.result()
+            results[futures[future]] = entry
+            print(f"[{sum(r is not None for r in results)}/{len(jobs)}] {entry['status']:8} "
+                  f"{entry['elapsed']:7.1f}s  {entry['blend']}")
+    return results
+
+def summarize(results, wall_time):
+    failed = [entry for entry in results if entry["status"] != "ok"]
+    summary = {
+        "jobs": len(results),
+        "succeeded": len(results) - len(failed),
+        "failed": len(failed),
+        "wall_time": wall_time,
+        "export_time": sum(entry.get("export_time", 0.0) for entry in results),
+        "results": results,
+    }
+
+    print(f"{summary['succeeded']}/{summary['jobs']} exported in {wall_time:.1f}s")
+    for entry in failed:
+        print(f"FAILED ({entry['status']}) {entry['blend']}")
+        if entry.get("error"):
+            print("    " + entry["error"].strip().replace("\n", "\n    "))
+    return summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export .blend files to .im with parallel background Blender processes")
+    parser.add_argument("manifest", help="JSON manifest of jobs and option presets")
+    parser.add_argument("-j", "--jobs", type=int, default=max(1, min(4, os.cpu_count() or 1)),
+                        help="number of Blender processes to run at once")
+    parser.add_argument("--blender", default=os.environ.get("BLENDER", "blender"),
+                        help="Blender executable (default: $BLENDER or blender on the PATH)")
+    parser.add_argument("--summary", help="write the summary JSON here")
+    parser.add_argument("--timeout", type=float, help="seconds before a job is killed")
+    args = parser.parse_args(argv)
+
+    jobs = load_jobs(args.manifest)
+    start = time.perf_counter()
+    results = run_batch(jobs, args.blender, args.jobs, args.timeout)
+    summary = summarize(results, time.perf_counter() - start)
+
+    if args.summary:
+        with open(args.summary, "w") as f:
+            json.dump(summary, f, indent=2)
+    return 0 if summary["failed"] == 0 else 1
+
+def register_addon():
+    """Import the add-on from this folder and register it, returning the package."""
+    import importlib
+    import bpy
+
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, os.path.dirname(package_dir))
+    addon = importlib.import_module(os.path.basename(package_dir))
+    if not hasattr(bpy.types, "EXPORT_SCENE_OT_im"):
+        addon.register()
+    return addon
+
+def worker_main(job):
+    """Runs inside Blender with the job's .blend already loaded."""
+    import bpy
+
+    result = {}
+    start = time.perf_counter()
+    try:
+        register_addon()
+        os.makedirs(os.path.dirname(job["output"]), exist_ok=True)
+        status = bpy.ops.export_scene.im(filepath=job["output"], **job["options"])
+        result["status"] = "ok" if 'FINISHED' in status else "cancelled"
+    except Exception:
+        result["status"] = "error"
+        result["error"] = traceback.format_exc()
+    result["export_time"] = time.perf_counter() - start
+
+    sys.stdout.flush()
+    print(RESULT_MARKER + json.dumps(result), flush=True)
+
+if __name__ == "__main__":
+    if WORKER_FLAG in sys.argv:
+        worker_main(json.loads(sys.argv[sys.argv.index(WORKER_FLAG) + 1]))
+    else:
+        sys.exit(main())
@@ -0,0 +1,447 @@
+"""Export benchmarks on synthetic scenes, compared against a stored baseline.
+
+Driver (plain Python, outside Blender):
+
+    python benchmark.py --blender /path/to/blender -o results.json --baseline baseline.json
+
+Every case builds its scene from scratch in its own `blender --background --factory-startup`
+process (dense grids, many materials, meshes over the 65k vertex chunk limit, skinned rigs,
+long armature animations, NLA tracks, NINF on and off), exports it `--repeat` times under the
+export profiler and reports the fastest run's per phase times and counters, the output size and
+the process' peak RSS. A final run with memory tracing adds each phase's peak traced memory.
+
+With --baseline the results are compared case by case: the total export time, every phase
+taking at least --min-time in the baseline, the peak memory and the output size. Anything
+slower or bigger than its threshold ratio is reported as a regression and the exit code is 1.
+A baseline is just an earlier results file; --results compares an existing one without running
+Blender.
+"""
+
+import argparse
+import json
+import math
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+
+#Blender's --python doesn't put the script's folder on the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from batch_export import RESULT_MARKER, register_addon, run_blender_script, process_error
+
+RESULTS_VERSION = 1
+WORKER_FLAG = "--im-benchmark-worker"
+
+#scene: grid triangles and materials, optional rig (bones), animation (frames) and NLA tracks
+#options: export operator keywords on top of BASE_OPTIONS
+CASES = [
+    {"name": "grid_10k", "suites": ["quick", "default", "full"],
+     "scene": {"triangles": 10_000}},
+    {"name": "grid_200k", "suites": ["default", "full"],
+     "scene": {"triangles": 200_000}},
+    {"name": "grid_2m", "suites": ["full"],
+     "scene": {"triangles": 2_000_000}},
+    {"name": "materials_8", "suites": ["quick"],
+     "scene": {"triangles": 50_000, "materials": 8}},
+    {"name": "materials_64", "suites": ["default", "full"],
+     "scene": {"triangles": 200_000, "materials": 64}},
+    {"name": "chunk_split_1m", "suites": ["default", "full"],
+     "scene": {"triangles": 1_000_000}},
+    {"name": "chunk_split_1m_stream", "suites": ["default", "full"],
+     "scene": {"triangles": 1_000_000}, "options": {"use_streaming": True}},
+    {"name": "chunk_split_1m_spatial", "suites": ["full"],
+     "scene": {"triangles": 1_000_000}, "options": {"spatial_split": True}},
+    {"name": "skinned_rig_20k", "suites": ["quick"],
+     "scene": {"triangles": 20_000, "bones": 100}},
+    {"name": "skinned_rig_200k", "suites": ["default", "full"],
+     "scene": {"triangles": 200_000, "bones": 100}},
+    {"name": "anim_250", "suites": ["quick"],
+     "scene": {"triangles": 10_000, "bones": 100, "frames": 250},
+     "options": {"use_kin": True}},
+    {"name": "anim_5000", "suites": ["default", "full"],
+     "scene": {"triangles": 10_000, "bones": 100, "frames": 5000},
+     "options": {"use_kin": True}},
+    {"name": "anim_5000_direct", "suites": ["default", "full"],
+     "scene": {"triangles": 10_000, "bones": 100, "frames": 5000},
+     "options": {"use_kin": True, "use_direct_sampling": True}},
+    {"name": "nla_4x1250", "suites": ["default", "full"],
+     "scene": {"triangles": 10_000, "bones": 100, "frames": 1250, "nla_tracks": 4},
+     "options": {"use_kin": True, "use_nla": True}},
+    {"name": "ninf_off_200k", "suites": ["default", "full"],
+     "scene": {"triangles": 200_000}, "options": {"export_neighbor_info": False}},
+    {"name": "ninf_on_200k", "suites": ["default", "full"],
+     "scene": {"triangles": 200_000}, "options": {"export_neighbor_info": True}},
+    {"name": "ninf_on_10k", "suites": ["quick"],
+     "scene": {"triangles": 10_000}, "options": {"export_neighbor_info": True}},
+]
+
+BASE_OPTIONS = {"use_kin": False, "log_level": 'WARNING'}
+
+#files that make up an export, for the output size
+OUTPUT_EXTENSIONS = (".im", ".kin", ".txt")
+
+def select_cases(suite, names=None):
+    if names:
+        known = {case["name"]: case for case in CASES}
+        missing = [name for name in names if name not in known]
+        if missing:
+            raise SystemExit("Unknown benchmark cases: " + ", ".join(missing))
+        return [known[name] for name in names]
+    return [case for case in CASES if suite in case["suites"]]
+
+# --- inside Blender ---
+
+def _link_object(name, data):
+    import bpy
+    obj = bpy.data.objects.new(name, data)
+    bpy.context.scene.collection.objects.link(obj)
+    return obj
+
+def build_grid(triangles, num_materials=1):
+    """A wavy grid of about the given number of triangles, its faces split into num_materials
+    contiguous stripes."""
+    import bpy
+    import numpy as np
+
+    cells = max(1, triangles // 2)
+    nx = max(1, int(math.sqrt(cells)))
+    ny = max(1, cells // nx)
+    gx, gy = np.meshgrid(np.linspace(-1.0, 1.0, nx + 1), np.linspace(-1.0, 1.0, ny + 1))
+    gz = 0.05 * np.sin(gx * 12.0) * np.cos(gy * 9.0)
+    positions = np.stack([gx, gy, gz], axis=-1).reshape(-1, 3).astype(np.float32)
+
+    corner = (np.arange(ny)[:, None] * (nx + 1) + np.arange(nx)[None, :]).ravel()
+    a, b, c, d = corner, corner + 1, corner + nx + 2, corner + nx + 1
+    tris = np.stack([np.stack([a, b, c], axis=-1), np.stack([a, c, d], axis=-1)], axis=1).reshape(-1, 3)
+    tris = tris.astype(np.int32)
+
+    me = bpy.data.meshes.new("bench_grid")
+    me.vertices.add(len(positions))
+    me.vertices.foreach_set("co", positions.ravel())
+    me.loops.add(tris.size)
+    me.loops.foreach_set("vertex_index", tris.ravel())
+    me.polygons.add(len(tris))
+    me.polygons.foreach_set("loop_start", np.arange(0, tris.size, 3, dtype=np.int32))
+    if bpy.app.version < (4, 0, 0):
+        me.polygons.foreach_set("loop_total", np.full(len(tris), 3, dtype=np.int32))
+    me.update(calc_edges=True)
+
+    uvs = (positions[:, :2] + 1.0) * 0.5
+    uv_layer = me.uv_layers.new(name="UVMap")
+    uv_layer.data.foreach_set("uv", uvs[tris.ravel()].ravel())
+
+    for i in range(num_materials):
+        me.materials.append(bpy.data.materials.new(f"bench_{i:02}.m.notex"))
+    material_index = (np.arange(len(tris), dtype=np.int64) * num_materials // len(tris)).astype(np.int32)
+    me.polygons.foreach_set("material_index", material_index)
+
+    return _link_object("bench_grid", me)
+
+def build_rig(obj, num_bones):
+    """An armature of a root and num_bones children spread along X, with every vertex of obj
+    weighted to the two nearest bones."""
+    import bpy
+    import numpy as np
+
+    arm = bpy.data.armatures.new("bench_rig")
+    arm_obj = _link_object("b.r.bench_rig", arm)
+    bpy.context.view_layer.objects.active = arm_obj
+    bpy.ops.object.mode_set(mode='EDIT')
+    root = arm.edit_bones.new("b.r.root")
+    root.head = (0.0, 0.0, -0.5)
+    root.tail = (0.0, 0.0, -0.4)
+    bone_x = np.linspace(-1.0, 1.0, num_bones)
+    for i, x in enumerate(bone_x.tolist()):
+        bone = arm.edit_bones.new(f"b.r.bone_{i:03}")
+        bone.head = (x, 0.0, 0.0)
+        bone.tail = (x, 0.0, 0.1)
+        bone.parent = root
+    bpy.ops.object.mode_set(mode='OBJECT')
+
+    groups = [obj.vertex_groups.new(name=f"b.r.bone_{i:03}") for i in range(num_bones)]
+    positions = np.empty(len(obj.data.vertices) * 3, dtype=np.float32)
+    obj.data.vertices.foreach_get("co", positions)
+    t = (positions[0::3] + 1.0) * 0.5 * (num_bones - 1)
+    first = np.clip(np.floor(t).astype(np.int64), 0, max(num_bones - 2, 0))
+    weight = 1.0 - (t - first)
+
+    #vertex_groups.add takes one weight per call, so vertices are batched by (bone, weight)
+    for bones, weights in ((first, weight), (first + 1, 1.0 - weight)):
+        keys = bones * 1001 + np.round(weights * 1000).astype(np.int64)
+        order = np.argsort(keys, kind='stable')
+        unique, starts = np.unique(keys[order], return_index=True)
+        for key, members in zip(unique.tolist(), np.split(order, starts[1:])):
+            group, milli = divmod(key, 1001)
+            if milli > 0:
+                groups[group].add(members.tolist(), milli / 1000.0, 'REPLACE')
+
+    modifier = obj.modifiers.new("Armature", 'ARMATURE')
+    modifier.object = arm_obj
+    obj.parent = arm_obj
+    return arm_obj
+
+def _action_fcurves(arm_obj):
+    anim_data = arm_obj.animation_data
+    action = anim_data.action
+    #layered actions (Blender 4.4+) keep their F-curves in the slot's channelbag
+    if len(getattr(action, "layers", ())) > 0:
+        return action.layers[0].strips[0].channelbag(anim_data.action_slot).fcurves
+    return action.fcurves
+
+def animate(arm_obj, frames, phase=0.0, key_step=10):
+    """Key a swaying rotation on every pose bone over [0, frames), into a new action."""
+    import numpy as np
+
+    pose_bones = arm_obj.pose.bones
+    for pose_bone in pose_bones:
+        pose_bone.rotation_mode = 'QUATERNION'
+        pose_bone.keyframe_insert("rotation_quaternion", frame=0)
+
+    key_frames = np.arange(0, frames, key_step, dtype=np.float64)
+    bone_index = {pose_bone.name: i for i, pose_bone in enumerate(pose_bones)}
+    for fcurve in _action_fcurves(arm_obj):
+        bone_name = fcurve.data_path.split('"')[1]
+        angle = 0.3 * np.sin(key_frames * 0.05 + bone_index[bone_name] + phase)
+        value = (np.cos(angle * 0.5), 0.0, 0.0, np.sin(angle * 0.5))[fcurve.array_index]
+        co = np.empty((len(key_frames), 2), dtype=np.float32)
+        co[:, 0] = key_frames
+        co[:, 1] = value
+        fcurve.keyframe_points.add(len(key_frames) - len(fcurve.keyframe_points))
+        fcurve.keyframe_points.foreach_set("co", co.ravel())
+        fcurve.update()
+    return arm_obj.animation_data.action
+
+def build_scene(spec):
+    import bpy
+
+    bpy.ops.wm.read_factory_settings(use_empty=True)
+    scene = bpy.context.scene
+    scene.frame_start = 0
+    scene.frame_end = max(spec.get("frames", 1) - 1, 0)
+
+    obj = build_grid(spec["triangles"], spec.get("materials", 1))
+    if spec.get("bones"):
+        arm_obj = build_rig(obj, spec["bones"])
+        if spec.get("frames"):
+            arm_obj.animation_data_create()
+            num_tracks = spec.get("nla_tracks", 0)
+            for i in range(max(num_tracks, 1)):
+                arm_obj.animation_data.action = None
+                action = animate(arm_obj, spec["frames"], phase=float(i))
+                if num_tracks > 0:
+                    track = arm_obj.animation_data.nla_tracks.new()
+                    track.name = f"bench_track_{i}"
+                    track.strips.new(action.name, 0, action)
+            if num_tracks > 0:
+                arm_obj.animation_data.action = None
+
+    return {
+        "objects": len(scene.objects),
+        "triangles": len(obj.data.polygons),
+        "vertices": len(obj.data.vertices),
+    }
+
+def _output_bytes(output_dir):
+    return sum(os.path.getsize(os.path.join(output_dir, name)) for name in os.listdir(output_dir)
+               if name.endswith(OUTPUT_EXTENSIONS))
+
+def _peak_rss():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    #bytes on macOS, KiB elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def worker_main(case, repeat, trace_memory):
+    """Runs inside Blender: build the case's scene and time its exports."""
+    import importlib
+    import bpy
+
+    result = {"name": case["name"], "blender": bpy.app.version_string}
+    output_dir = tempfile.mkdtemp(prefix="im_benchmark_")
+    try:
+        addon = register_addon()
+        profiler = importlib.import_module(addon.__name__ + ".profiler")
+
+        start = time.perf_counter()
+        result["scene"] = build_scene(case["scene"])
+        result["build_time"] = time.perf_counter() - start
+
+        options = dict(BASE_OPTIONS, **case.get("options", {}))
+        filepath = os.path.join(output_dir, case["name"] + ".im")
+
+        runs = []
+        for _ in range(repeat):
+            profile = profiler.start()
+            try:
+                bpy.ops.export_scene.im(filepath=filepath, **options)
+            finally:
+                profiler.stop()
+            runs.append(profile.report())
+        best = min(runs, key=lambda report: report["total_time"])
+        result.update(export_time=best["total_time"], export_times=[report["total_time"] for report in runs],
+                      phases=best["phases"], counters=best["counters"], output_bytes=_output_bytes(output_dir))
+
+        if trace_memory:
+            profile = profiler.start(trace_memory=True)
+            try:
+                bpy.ops.export_scene.im(filepath=filepath, **options)
+            finally:
+                profiler.stop()
+            for name, stats in profile.report()["phases"].items():
+                if name in result["phases"]:
+                    result["phases"][name]["peak_memory"] = stats["peak_memory"]
+            result["peak_traced_memory"] = max((stats["peak_memory"] for stats in profile.phases.values()), default=0)
+
+        result["peak_rss"] = _peak_rss()
+        result["status"] = "ok"
+    except Exception:
+        result["status"] = "error"
+        result["error"] = traceback.format_exc()
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+    sys.stdout.flush()
+    print(RESULT_MARKER + json.dumps(result), flush=True)
+
+# --- driver ---
+
+def run_case(blender, case, repeat, trace_memory, timeout=None):
+    start = time.perf_counter()
+    args = [WORKER_FLAG, json.dumps({"case": case, "repeat": repeat, "trace_memory": trace_memory})]
+    try:
+        result, process = run_blender_script(blender, __file__, args, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return {"name": case["name"], "status": "timeout", "elapsed": time.perf_counter() - start}
+    except OSError as e:
+        return {"name": case["name"], "status": "error", "error": str(e), "elapsed": time.perf_counter() - start}
+
+    if result is None:
+        result = {"name": case["name"], "status": "error", "error": process_error(process)}
+    result["elapsed"] = time.perf_counter() - start
+    return result
+
+def run_suite(blender, cases, repeat, trace_memory, timeout=None):
+    """Cases run one after another, so they don't compete for the CPU."""
+    results = {}
+    for index, case in enumerate(cases):
+        result = run_case(blender, case, repeat, trace_memory, timeout)
+        results[case["name"]] = result
+        if result["status"] == "ok":
+            print(f"[{index + 1}/{len(cases)}] {case['name']:24} {result['export_time']:8.3f}s  "
+                  f"{result['output_bytes'] / 1024:10.1f} KiB out")
+        else:
+            print(f"[{index + 1}/{len(cases)}] {case['name']:24} {result['status']}")
+            if result.get("error"):
+                print("    " + result["error"].strip().replace("\n", "\n    "))
+    blender_versions = {result["blender"] for result in results.values() if "blender" in result}
+    return {
+        "version": RESULTS_VERSION,
+        "blender": blender_versions.pop() if len(blender_versions) == 1 else None,
+        "repeat": repeat,
+        "cases": results,
+    }
+
+def compare(results, baseline, time_threshold=1.15, memory_threshold=1.15, size_threshold=1.01, min_time=0.05):
+    """Compare results with a baseline. Returns a list of (case, metric, baseline, current, ratio,
+    regressed) rows; ratio is None when the metric can't be compared."""
+    rows = []
+    for name, current in results["cases"].items():
+        base = baseline["cases"].get(name)
+        if base is None or base.get("status") != "ok" or current.get("status") != "ok":
+            rows.append((name, "status", base.get("status") if base else None, current.get("status"), None,
+                         base is not None and base.get("status") == "ok"))
+            continue
+
+        metrics = [("export_time", base["export_time"], current["export_time"], time_threshold)]
+        for phase in sorted(set(base["phases"]) & set(current["phases"])):
+            if base["phases"][phase]["time"] >= min_time:
+                metrics.append(("phase " + phase, base["phases"][phase]["time"], current["phases"][phase]["time"], time_threshold))
+        for key in ("peak_traced_memory", "peak_rss"):
+            if base.get(key) and current.get(key):
+                metrics.append((key, base[key], current[key], memory_threshold))
+        metrics.append(("output_bytes", base["output_bytes"], current["output_bytes"], size_threshold))
+
+        for metric, old, new, threshold in metrics:
+            ratio = new / old if old else None
+            rows.append((name, metric, old, new, ratio, ratio is not None and ratio > threshold))
+    return rows
+
+def _format_value(metric, value):
+    if value is None or isinstance(value, str):
+        return str(value)
+    if metric == "output_bytes":
+        return f"{value / 1024:.1f} KiB"
+    if metric in ("peak_traced_memory", "peak_rss"):
+        return f"{value / (1024 * 1024):.1f} MiB"
+    return f"{value:.3f}s"
+
+def print_comparison(rows, verbose=False):
+    print(f"{'case':24} {'metric':32} {'baseline':>12} {'current':>12} {'ratio':>7}")
+    for name, metric, old, new, ratio, regressed in rows:
+        #phase rows are only interesting when they regressed
+        if not verbose and metric.startswith("phase ") and not regressed:
+            continue
+        ratio_text = f"{ratio:.2f}" if ratio is not None else "-"
+        print(f"{name:24} {metric:32} {_format_value(metric, old):>12} {_format_value(metric, new):>12} {ratio_text:>7}"
+              + ("  REGRESSION" if regressed else ""))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the .im exporter on synthetic scenes")
+    parser.add_argument("--blender", default=os.environ.get("BLENDER", "blender"),
+                        help="Blender executable (default: $BLENDER or blender on the PATH)")
+    parser.add_argument("--suite", choices=("quick", "default", "full"), default="default")
+    parser.add_argument("--case", action="append", dest="cases", help="run only this case (repeatable)")
+    parser.add_argument("--list", action="store_true", help="list the suite's cases and exit")
+    parser.add_argument("--repeat", type=int, default=3, help="exports per case, the fastest is kept")
+    parser.add_argument("--no-memory", action="store_true", help="skip the memory traced export")
+    parser.add_argument("--timeout", type=float, help="seconds before a case is killed")
+    parser.add_argument("-o", "--output", help="write the results JSON here")
+    parser.add_argument("--results", help="compare this results file instead of running Blender")
+    parser.add_argument("--baseline", help="results file to compare against")
+    parser.add_argument("--time-threshold", type=float, default=1.15, help="slowest allowed time ratio")
+    parser.add_argument("--memory-threshold", type=float, default=1.15, help="largest allowed memory ratio")
+    parser.add_argument("--size-threshold", type=float, default=1.01, help="largest allowed output size ratio")
+    parser.add_argument("--min-time", type=float, default=0.05, help="ignore phases faster than this in the baseline")
+    parser.add_argument("-v", "--verbose", action="store_true", help="show every phase in the comparison")
+    args = parser.parse_args(argv)
+
+    cases = select_cases(args.suite, args.cases)
+    if args.list:
+        for case in cases:
+            print(f"{case['name']:24} {json.dumps(case['scene'])} {json.dumps(case.get('options', {}))}")
+        return 0
+
+    if args.results:
+        with open(args.results, "r") as f:
+            results = json.load(f)
+    else:
+        results = run_suite(args.blender, cases, max(1, args.repeat), not args.no_memory, args.timeout)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(results, f, indent=2)
+
+    failed = any(result["status"] != "ok" for result in results["cases"].values())
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        if baseline.get("blender") != results.get("blender"):
+            print(f"Warning: baseline was recorded with Blender {baseline.get('blender')}, results with {results.get('blender')}")
+        rows = compare(results, baseline, args.time_threshold, args.memory_threshold, args.size_threshold, args.min_time)
+        print_comparison(rows, args.verbose)
+        regressions = [row for row in rows if row[5]]
+        print(f"{len(regressions)} regression(s) against {args.baseline}")
+        failed = failed or len(regressions) > 0
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    if WORKER_FLAG in sys.argv:
+        job = json.loads(sys.argv[sys.argv.index(WORKER_FLAG) + 1])
+        worker_main(job["case"], job["repeat"], job["trace_memory"])
+    else:
+        sys.exit(main())
@@ -0,0 +1,167 @@
+"""Persistent per-object cache of the expensive derived mesh data.
+
+Re-exporting an asset after touching one object shouldn't redo tangent generation, vertex
+deduplication and adjacency for all the others. Each object's cheap arrays (positions,
+normals, UVs, topology, weights - already in export space) are hashed together with the
+settings that affect the derived data, and the derived arrays are stored under that hash
+as an .npz file.
+
+An index remembers the key each object was last exported with. After an export, an entry
+is removed once it has been superseded, i.e. an object it belonged to now has another key
+and no other object still uses it. Entries no export has used for MAX_AGE are removed too,
+and the least recently used ones go when the cache grows past MAX_SIZE. Objects left out of
+an export (selection only, partial re-exports) keep their entries.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+import zipfile
+
+import numpy as np
+
+CACHE_VERSION = 1
+INDEX_FILENAME = "index.json"
+MAX_AGE = 30 * 24 * 60 * 60
+MAX_SIZE = 1 << 30
+
+log = logging.getLogger(__name__)
+
+def _update(digest, part):
+    if isinstance(part, dict):
+        for name in sorted(part):
+            digest.update(name.encode('utf-8'))
+            _update(digest, part[name])
+    elif isinstance(part, np.ndarray):
+        digest.update((part.dtype.str + str(part.shape)).encode('utf-8'))
+        digest.update(np.ascontiguousarray(part).data)
+    else:
+        digest.update(repr(part).encode('utf-8'))
+
+def content_hash(*parts):
+    """Hash nested dicts of arrays and plain values."""
+    digest = hashlib.sha1()
+    _update(digest, CACHE_VERSION)
+    for part in parts:
+        _update(digest, part)
+    return digest.hexdigest()
+
+class ObjectCache:
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.used = set()
+        #object name -> key, for the objects of this export
+        self.object_keys = {}
+        self.hits = 0
+        self.misses = 0
+        self.removed = 0
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + ".npz")
+
+    def _index_path(self):
+        return os.path.join(self.cache_dir, INDEX_FILENAME)
+
+    def load(self, key, object_name):
+        """The arrays stored under key, or None. key is now object_name's entry."""
+        self.used.add(key)
+        self.object_keys[object_name] = key
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                arrays = {name: data[name] for name in data.files}
+        except (OSError, ValueError, zipfile.BadZipFile):
+            self.misses += 1
+            return None
+        self.hits += 1
+        try:
+            #the modification time doubles as the last use, for MAX_AGE and MAX_SIZE
+            os.utime(path)
+        except OSError:
+            pass
+        return arrays
+
+    def store(self, key, arrays):
+        self.used.add(key)
+        path = self._path(key)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            temp_path = path + ".tmp"
+            with open(temp_path, "wb") as f:
+                np.savez(f, **{name: value for name, value in arrays.items() if value is not None})
+            os.replace(temp_path, path)
+        except OSError as e:
+            log.warning("Could not write object cache entry " + path + ": " + str(e))
+
+    def _remove(self, key):
+        try:
+            os.remove(self._path(key))
+            self.removed += 1
+        except OSError:
+            pass
+
+    def prune(self):
+        """Remove the entries superseded by this export and the ones past MAX_AGE or MAX_SIZE,
+        then save the index."""
+        try:
+            with open(self._index_path(), "r") as f:
+                data = json.load(f)
+            index = data["objects"] if data.get("version") == CACHE_VERSION else {}
+        except (OSError, ValueError, KeyError):
+            index = {}
+
+        previous_keys = {index[name] for name in self.object_keys if name in index}
+        index.update(self.object_keys)
+        live_keys = set(index.values())
+        for key in previous_keys - live_keys:
+            self._remove(key)
+
+        try:
+            names = os.listdir(self.cache_dir)
+        except OSError:
+            return
+        now = time.time()
+        entries = []
+        for name in names:
+            key, ext = os.path.splitext(name)
+            if ext not in (".npz", ".tmp") or key in self.used:
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            if ext == ".tmp":
+                #left behind by an interrupted write
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except OSError:
+                    pass
+            elif now - stat.st_mtime > MAX_AGE:
+                self._remove(key)
+            else:
+                entries.append((stat.st_mtime, stat.st_size, key))
+
+        #this export's entries are always kept, the others go least recently used first
+        total_size = sum(size for _, size, _ in entries)
+        for key in self.used:
+            try:
+                total_size += os.path.getsize(self._path(key))
+            except OSError:
+                pass
+        for _, size, key in sorted(entries):
+            if total_size <= MAX_SIZE:
+                break
+            self._remove(key)
+            total_size -= size
+
+        index = {name: key for name, key in index.items() if os.path.exists(self._path(key))}
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            temp_path = self._index_path() + ".tmp"
+            with open(temp_path, "w") as f:
+                json.dump({"version": CACHE_VERSION, "objects": index}, f)
+            os.replace(temp_path, self._index_path())
+        except OSError as e:
+            log.warning("Could not write object cache index " + self._index_path() + ": " + str(e))
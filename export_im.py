@@ -1,11 +1,14 @@
 import os
-import io
-import struct
+import contextlib
+import cProfile
+import logging
 import bmesh
 import bpy
 import math
+import numpy as np
 import mathutils
 import bl_math
+from dataclasses import replace
 from mathutils import Matrix, Vector, Color
 from bpy_extras import io_utils, node_shader_utils
 import bmesh
@@ -13,6 +16,37 @@ from bpy_extras.wm_utils.progress_report import (
     ProgressReport,
     ProgressReportSubstep,
 )
+from . import im_writer
+from . import profiler
+from .mesh_extract import foreach_get_array, extract_mesh_arrays, extract_vertex_weights, gather_weights
+from .mesh_chunk import MeshChunk
+from .temp_meshes import TemporaryMeshes
+from .im_writer import normalize_rows
+from .vertex_dedup import quantize_keys, dedup_ids, split_chunks, spatial_segments
+from .timeline import TimelineSweep, AnimatedBounds
+from .pose_math import decompose_matrices, invert_quaternions, remove_scale
+from .action_sampler import ActionSampler
+from .texture_cache import TextureCache, hash_bytes
+from .tga_writer import TgaWriterPool
+from .adjacency import triangle_neighbors, neighbor_records
+from .export_cache import ObjectCache, content_hash
+from .mesh_optimize import cache_stats, optimize_vertex_cache, optimize_vertex_fetch, optimize_overdraw, estimate_overdraw
+from .im_writer import (
+    InfoData,
+    TextureSlot,
+    MaterialData,
+    GeomData,
+    ChunkData,
+    InflBone,
+    InfluenceSpool,
+    ImStreamWriter,
+    SkelBone,
+    Attachment,
+    KinInfo,
+    KinEvent,
+)
+
+log = logging.getLogger(__name__)
 
 def name_compat(name):
     if name is None:
@@ -66,45 +100,114 @@ def sanitize_filename(str):
     
     return outstr
 
-GLOBAL_WIDE_STRINGS = False
-
-def jet_str(f, str, wide=False):
-    global GLOBAL_WIDE_STRINGS
-    wide = wide or GLOBAL_WIDE_STRINGS
-    
-    encoded_name = bytearray(str.encode('utf-16le' if wide else 'utf-8'))
-
-    #wacky Jet byte alignment
-    str_length = len(encoded_name)
-
-    numTerminators = 4 - str_length % 4 if str_length % 4 != 0 else 0
-    encoded_name += bytes('\0' * numTerminators, 'utf-8')
-
-    len_bytes = bytearray(struct.pack("<I", len(encoded_name)))
-    if(wide):
-        len_bytes[3] = 0x40
-    
-    f.write(len_bytes)
-    f.write(encoded_name)
-
-def texture_file(type, img_path, target_dir, is_npo2, alpha):
+@profiler.profiled("texture_txt")
+def texture_file(type, img_path, target_dir, is_npo2, alpha, texture_cache=None, produced_outputs=None):
     basename = os.path.basename(img_path).lower()
     texturepath = sanitize_filename(target_dir + '\\' + os.path.splitext(basename)[0] + ".texture")
     txtpath = texturepath + ".txt"
-    print("write to " + txtpath)
-    with open(txtpath, "w") as f:
-        f.write("Primary=" + basename + "\n")
-        if alpha:
-            f.write("Alpha=" + basename + "\n")
-        f.write("Tile=st" + "\n")
-        if is_npo2:
-            f.write("nonpoweroftwo=1\n")
-        if type == 8:
-            f.write("NormalMapHint=normalmap\n")
+
+    text = "Primary=" + basename + "\n"
+    if alpha:
+        text += "Alpha=" + basename + "\n"
+    text += "Tile=st" + "\n"
+    if is_npo2:
+        text += "nonpoweroftwo=1\n"
+    if type == 8:
+        text += "NormalMapHint=normalmap\n"
+
+    if produced_outputs is not None:
+        #materials sharing a texture write its texture.txt once per export
+        if produced_outputs.get(txtpath) == text:
+            return texturepath
+        produced_outputs[txtpath] = text
+
+    if texture_cache is not None:
+        #unchanged texture.txt files aren't rewritten
+        if texture_cache.write_text(txtpath, text):
+            log.debug("write to " + txtpath)
+    else:
+        log.debug("write to " + txtpath)
+        with open(txtpath, "w") as f:
+            f.write(text)
     return texturepath
 
+def output_color_settings(scene):
+    """The display and view settings save_render writes images with."""
+    image_settings = scene.render.image_settings
+    if image_settings.color_management == 'OVERRIDE':
+        return image_settings.display_settings, image_settings.view_settings
+    return scene.display_settings, scene.view_settings
+
+def is_standard_view(scene):
+    """True when save_render only encodes float images to sRGB, which the TGA pool does too.
+    Any other view transform, look, exposure, gamma or curve goes through save_render."""
+    display_settings, view_settings = output_color_settings(scene)
+    return display_settings.display_device == 'sRGB' and view_settings.view_transform == 'Standard' and \
+        view_settings.look == 'None' and view_settings.exposure == 0.0 and view_settings.gamma == 1.0 and \
+        not view_settings.use_curve_mapping
+
+def image_fingerprint(image, texture_cache):
+    """Hash of everything that ends up in a converted image: the source content and the color
+    management applied by save_render. Returns (hash, pixels), pixels being the float buffer
+    read to hash packed, generated or edited images, otherwise None."""
+    display_settings, view_settings = output_color_settings(bpy.context.scene)
+    settings = [image.size[0], image.size[1], image.colorspace_settings.name, image.alpha_mode,
+                display_settings.display_device, view_settings.view_transform,
+                view_settings.look, view_settings.exposure, view_settings.gamma, view_settings.use_curve_mapping]
+
+    source_hash = None
+    pixels = None
+    if image.source == 'FILE' and image.packed_file is None and not image.is_dirty:
+        source_hash = texture_cache.file_hash(bpy.path.abspath(image.filepath, library=image.library))
+    if source_hash is None:
+        #packed, generated or edited images
+        pixels = np.empty(len(image.pixels), dtype=np.float32)
+        image.pixels.foreach_get(pixels)
+        source_hash = hash_bytes(pixels.tobytes())
+
+    return hash_bytes(source_hash, repr(settings)), pixels
+
 # https://blenderartists.org/t/converting-textures-to-another-format/568064/4
-def convert_image(image, dest):
+@profiler.profiled("texture_convert")
+def convert_image(image, dest, texture_cache=None, tga_pool=None, produced_outputs=None):
+
+    #RGBA images are encoded natively on the worker pool, anything else goes through save_render,
+    #as do all images when the scene's view transform would change their pixels
+    use_pool = tga_pool is not None and image.channels == 4 and image.size[0] > 0 and image.size[1] > 0 and \
+        is_standard_view(bpy.context.scene)
+
+    if produced_outputs is not None:
+        #materials sharing an image convert it once per export
+        if produced_outputs.get(dest) == image.name_full:
+            log.debug("Already converted " + dest)
+            profiler.count("textures_skipped")
+            return
+        produced_outputs[dest] = image.name_full
+
+    pixels = None
+    if texture_cache is not None:
+        fingerprint, pixels = image_fingerprint(image, texture_cache)
+        key = hash_bytes(fingerprint, "tga" if use_pool else "TARGA_RAW RGBA")
+        if texture_cache.is_current(dest, key):
+            log.debug("Skipping unchanged texture " + dest)
+            profiler.count("textures_skipped")
+            return
+    profiler.count("textures_converted")
+
+    if use_pool:
+        width, height = image.size[:]
+        #pixels have to be read on the main thread, the encoding and writing happen on the pool
+        if pixels is None:
+            pixels = np.empty(width * height * 4, dtype=np.float32)
+            image.pixels.foreach_get(pixels)
+        linear = image.is_float and not image.colorspace_settings.is_data
+
+        on_done = None
+        if texture_cache is not None:
+            texture_cache.reserve(dest, key)
+            on_done = lambda path, key=key: texture_cache.record(path, key)
+        tga_pool.submit(dest, pixels, width, height, linear, on_done)
+        return
 
     # backup image settings
     backup_file_format = bpy.context.scene.render.image_settings.file_format
@@ -122,92 +225,61 @@ def convert_image(image, dest):
     bpy.context.scene.render.image_settings.file_format = backup_file_format
     bpy.context.scene.render.image_settings.color_mode = backup_color_mode
 
-def chunk_ver(f, ver):
-    f.write(struct.pack("<I", ver))
+    if texture_cache is not None:
+        texture_cache.record(dest, key)
 
-def end_chunk(f, chunk):
-    f.write(struct.pack("<I", chunk.tell()))
-    f.write(chunk.getbuffer())
+def jet_bone_name(name):
+    if not name.startswith("b.r."):
+        name = "b.r." + name
+    return name
 
-def recursive_writebone(chnk, srcBone, bones_flat, EXPORT_ALL_BONES):
+def recursive_kin_bone(srcBone, bones_flat, EXPORT_ALL_BONES):
     bones_flat.append(srcBone)
 
-    relevant_children = []
+    bone = SkelBone(jet_bone_name(srcBone.name))
     for child in srcBone.children:
         if "b.r." in child.name or EXPORT_ALL_BONES:
-            relevant_children.append(child)
-
-    chnk.write('BONE'.encode('utf-8'))
-    with io.BytesIO() as bone:
-        chunk_ver(bone, 100)
-        #BoneName
-        bone_name = srcBone.name
-        if not bone_name.startswith("b.r."):
-            bone_name = "b.r." + bone_name
-        jet_str(bone, bone_name)
-
-        #NumChildren
-        bone.write(struct.pack("<I", len(relevant_children)))
-        #BoneList
-        for child in relevant_children:
-            recursive_writebone(bone, child, bones_flat, EXPORT_ALL_BONES)
-        end_chunk(chnk, bone)
+            bone.children.append(recursive_kin_bone(child, bones_flat, EXPORT_ALL_BONES))
+    return bone
 
 #Recursive SKEL for embedded .im export
-def recursive_writebone_skel(chnk, srcBone, armature, EXPORT_GLOBAL_MATRIX, EXPORT_ALL_BONES):
-    relevant_children = []
-    for child in srcBone.children:
-        if "b.r." in child.name or EXPORT_ALL_BONES:
-            relevant_children.append(child)
-
-    chnk.write('BONE'.encode('utf-8'))
-    with io.BytesIO() as bone:
-        chunk_ver(bone, 100)
-        #BoneName
-        bone_name = srcBone.name
-        if not bone_name.startswith("b.r."):
-            bone_name = "b.r." + bone_name
-        jet_str(bone, bone_name)
-
-        if srcBone.parent == None:
-            boneMat = srcBone.matrix_local
-        else:
-            #convert bone transforms into world space and remove the scale
-            parentMatrix = srcBone.parent.matrix_local
-            parentMatrix = remove_scale_from_matrix(parentMatrix)
-            childMatrix = srcBone.matrix_local
-            childMatrix = remove_scale_from_matrix(childMatrix)
-
-            boneMat = parentMatrix.inverted() @ childMatrix
-        
-        if armature != None:
-            boneMat = EXPORT_GLOBAL_MATRIX @ armature.matrix_world @ boneMat
-        else:
-            boneMat = EXPORT_GLOBAL_MATRIX @ boneMat
+def recursive_skel_bone(srcBone, armature, EXPORT_GLOBAL_MATRIX, EXPORT_ALL_BONES):
+    if srcBone.parent == None:
+        boneMat = srcBone.matrix_local
+    else:
+        #convert bone transforms into world space and remove the scale
+        parentMatrix = srcBone.parent.matrix_local
+        parentMatrix = remove_scale_from_matrix(parentMatrix)
+        childMatrix = srcBone.matrix_local
+        childMatrix = remove_scale_from_matrix(childMatrix)
 
-        position, rotation, scale = boneMat.decompose()
+        boneMat = parentMatrix.inverted() @ childMatrix
 
-        # Shouldn't be necessary to invert the rotation for .im SKEL.
-        # rotation = rotation.inverted()
+    if armature != None:
+        boneMat = EXPORT_GLOBAL_MATRIX @ armature.matrix_world @ boneMat
+    else:
+        boneMat = EXPORT_GLOBAL_MATRIX @ boneMat
 
-        #Position
-        bone.write(struct.pack("<fff", *position))
-        #Orientation
-        bone.write(struct.pack("<ffff", rotation.x, rotation.y, rotation.z, rotation.w))
+    position, rotation, scale = boneMat.decompose()
 
-        #NumChildren
-        bone.write(struct.pack("<I", len(relevant_children)))
+    # Shouldn't be necessary to invert the rotation for .im SKEL.
+    # rotation = rotation.inverted()
 
-        #BoneList
-        for child in relevant_children:
-            recursive_writebone_skel(bone, child, armature, EXPORT_GLOBAL_MATRIX, EXPORT_ALL_BONES)
-        end_chunk(chnk, bone)
+    bone = SkelBone(jet_bone_name(srcBone.name), position[:], (rotation.x, rotation.y, rotation.z, rotation.w))
+    for child in srcBone.children:
+        if "b.r." in child.name or EXPORT_ALL_BONES:
+            bone.children.append(recursive_skel_bone(child, armature, EXPORT_GLOBAL_MATRIX, EXPORT_ALL_BONES))
+    return bone
 
 
-def write_kin(filepath, bones, armature, frame_start, frame_end, framerate, events, EXPORT_GLOBAL_MATRIX, EXPORT_ANIM_SCALE, EXPORT_ANIM_RELATIVE_POSITIONING, EXPORT_ALL_BONES):
-    print("Writing .kin to " + filepath)
+@profiler.profiled("kin")
+def write_kin(filepath, bones, armature, frame_start, frame_end, framerate, events, EXPORT_GLOBAL_MATRIX, EXPORT_ANIM_SCALE, EXPORT_ANIM_RELATIVE_POSITIONING, EXPORT_ALL_BONES, EXPORT_ANIM_DIRECT=False, timeline=None, track=None):
+    log.info("Writing .kin to " + filepath)
 
     scene = bpy.context.scene
+    #frames are sampled from a shared sweep when other consumers need the same range
+    if timeline is None:
+        timeline = TimelineSweep(scene, frame_start, frame_end)
     NumFrames = frame_end - frame_start + 1
 
     
@@ -228,325 +300,486 @@ def write_kin(filepath, bones, armature, frame_start, frame_end, framerate, even
             break
 
     if root_bone is None:
-        print("Could not find a root bone!")
+        log.warning("Could not find a root bone!")
         return
 
-    with open(filepath, "wb") as f:
-        #JIRF, filesize
-        f.write('JIRF'.encode('utf-8'))
-        with io.BytesIO() as rf: #resource file
-            rf.write('ANIM'.encode('utf-8'))
-
-            rf.write('INFO'.encode('utf-8'))
-            with io.BytesIO() as info:
-                version_needed = 100
-                if EXPORT_ANIM_SCALE or EXPORT_ANIM_RELATIVE_POSITIONING:
-                    version_needed = 102
-                # if EXPORT_ANIM_RELATIVE_POSITIONING:
-                #     version_needed = 257
-                flags_needed = version_needed >= 102
-
-                chunk_ver(info, version_needed)
-                #FileName
-                jet_str(info, os.path.basename(filepath).lower())
-                #NumFrames
-                info.write(struct.pack("<I", NumFrames))
-                #FrameRate
-                info.write(struct.pack("<I", framerate))
-                #MetricScale
-                info.write(struct.pack("<f", 1.0))
-
-                #Flags
-                if flags_needed:
-                    flags = 0
-                    if EXPORT_ANIM_SCALE:
-                        flags |= 0x2
-                    if EXPORT_ANIM_RELATIVE_POSITIONING:
-                        flags |= 0x1
-                        #flags |= 0x8
-                    
-                    info.write(struct.pack("<I", flags))
-
-                end_chunk(rf, info)
-
-            # AFAIK, supported event types are AET_SOUND_EVENT (0), and AET_GENERIC_EVENT (4)
-            # sound events will play the entry of the same name within the soundscript container in the config - best example of this is the PB interior coalman (<kuid:-25:696>)
-            # generic events are probably used by script
-
-            #Events
-            rf.write('EVNT'.encode('utf-8'))
-            with io.BytesIO() as evnt:
-                chunk_ver(evnt, 100)
-                #NumEvents
-                #evnt.write(struct.pack("<I", 0))
-                evnt.write(struct.pack("<I", len(events)))
-
-                for evt in events:
-                    typeid = 4 #AET_GENERIC_EVENT
-                    if(evt["type"] == "sound"):
-                        typeid = 0 #AET_SOUND_EVENT
-                    
-                    evnt.write(struct.pack("<I", evt["frame"]))
-                    evnt.write(struct.pack("<I", typeid))
-                    jet_str(evnt, evt["name"])
-                    
-
-                end_chunk(rf, evnt)
-
-            bones_flat = []
-
-            #Skeleton
-            rf.write('SKEL'.encode('utf-8'))
-            with io.BytesIO() as skel:
-                chunk_ver(skel, 100)
-                #SkeletonBlock
-                recursive_writebone(skel, root_bone, bones_flat, EXPORT_ALL_BONES)
-                #skel.write(struct.pack("<I", 0))
-                end_chunk(rf, skel)
-
-            posebones_flat = []
-            if armature != None:
-                for bone in bones_flat:
-                    print("bone " + bone.name)
-                    for posebone in armature.pose.bones:
-                        if posebone.name == bone.name:
-                            posebones_flat.append(posebone)
-                            break
-
-            objbones_flat = []
-            for obj in bones_flat:
-                if hasattr(obj, 'type') and (obj.type == 'EMPTY' or obj.type == 'LATTICE' or obj.type == 'MESH'):
-                    objbones_flat.append(obj)
-
-                #pose_bone = (b for b in armature.pose.bones if b.bone is bone)
-                #posebones_flat.append(pose_bone)
-            if armature != None:
-                print("Found " + str(len(posebones_flat)) + "/" + str(len(armature.pose.bones)) + " pose bones")
-
-            print("Found " + str(len(objbones_flat)) + " object bones")
-            #FrameList
-            for i in range(frame_start, frame_end + 1):
-                scene.frame_set(i)
-                rf.write('FRAM'.encode('utf-8'))
-                with io.BytesIO() as fram:
-                    if not EXPORT_ANIM_SCALE:
-                        chunk_ver(fram, 100)
-                    else:
-                        chunk_ver(fram, 101)
-                    
-                    #version 101 fixes a lot of things - bone matrices are parent relative rather than global, and rotations aren't backwards anymore
-
-                    #game may not bother animating if this is outside 0 to NumFrames - 1
-                    #FrameNum
-                    fram.write(struct.pack("<I", i - frame_start))
-
-                    #BoneDataList
-                    for pose_bone in posebones_flat:
-                        #mat = pose_bone.matrix_basis
-                        
-                        # if not EXPORT_ANIM_RELATIVE_POSITIONING or pose_bone.parent is None:
-                        #     mat = mat @ pose_bone.matrix
-                        # else:
-                        #     mat = mat @ pose_bone.parent.matrix.inverted() @ pose_bone.matrix
-                        
-                        if not EXPORT_ANIM_RELATIVE_POSITIONING:
-                            mat = armatureMat @ pose_bone.matrix
-                        else:
-                            if pose_bone.parent == None:
-                                # limitation here where the root node will ignore scaling data
-                                # we can't remove the scaling from the armature matrix alone as that will break the world space conversion of the root node's matrix
-                                mat = remove_scale_from_matrix(armatureMat @ pose_bone.matrix)
-                                #mat = pose_bone.matrix
-                            else:
-                                #convert bone transforms into world space and remove the scale if necessary
-                                parentMatrix = pose_bone.parent.matrix
-                                childMatrix = pose_bone.matrix
-
-                                # if not EXPORT_ANIM_SCALE:
-                                #     parentMatrix = remove_scale_from_matrix(parentMatrix)
-                                #     childMatrix = remove_scale_from_matrix(childMatrix)
-                                
-                                mat = parentMatrix.inverted() @ childMatrix
-
-                        
-                        mat = EXPORT_GLOBAL_MATRIX @ mat
-
-                        position, rotation, scale = mat.decompose()
-
-                        if EXPORT_ANIM_RELATIVE_POSITIONING: # and pose_bone.parent != None
-                            position = position * armatureScale
-                            #scale = scale * armatureScale
-                        
-                        if not EXPORT_ANIM_RELATIVE_POSITIONING:
-                            rotation = rotation.inverted()
-                        
-                        #Position
-                        fram.write(struct.pack("<fff", *position))
-                        #Orientation
-                        fram.write(struct.pack("<ffff", rotation.x, rotation.y, rotation.z, rotation.w))
-
-                        if EXPORT_ANIM_SCALE:
-                            #Scale
-                            fram.write(struct.pack("<fff", scale.x, scale.y, scale.z))
-
-                    for obj_bone in objbones_flat:
-                        #objMat = obj_bone.matrix_world
-                        #if obj_bone.parent != None:
-                            #objMat = obj_bone.parent.matrix_world.inverted() @ objMat
-                        #objMat = EXPORT_GLOBAL_MATRIX @ objMat
-
-                        objMat = obj_bone.matrix_world
-
-                        if EXPORT_ANIM_RELATIVE_POSITIONING:
-                            objMat = obj_bone.matrix_local
-
-                        objMat = EXPORT_GLOBAL_MATRIX @ objMat
-                        position, rotation, scale = objMat.decompose()
-
-                        if not EXPORT_ANIM_RELATIVE_POSITIONING:
-                            rotation = rotation.inverted()
-                        
-                        #Position
-                        fram.write(struct.pack("<fff", *position))
-                        #Orientation
-                        fram.write(struct.pack("<ffff", rotation.x, rotation.y, rotation.z, rotation.w))
-
-                        if EXPORT_ANIM_SCALE:
-                            #Scale
-                            fram.write(struct.pack("<fff", scale.x, scale.y, scale.z))
-
-                    end_chunk(rf, fram)
-
-            end_chunk(f, rf)
-
-def gather_curve_data(me, obj, objectParent, parentBone, material, EXPORT_BOUNDS, bounds_set, meshes):
-
-    if len(me.uv_layers) == 0:
-        uv_layer = None
-    else:
-        uv_layer = me.uv_layers.active.data[:]
+    info = KinInfo(os.path.basename(filepath).lower(), NumFrames, framerate, EXPORT_ANIM_SCALE, EXPORT_ANIM_RELATIVE_POSITIONING)
 
-    print("Processing curve...")
+    bones_flat = []
+    skeleton = recursive_kin_bone(root_bone, bones_flat, EXPORT_ALL_BONES)
 
-    #should be final - edge split, etc
-    vertgroups = obj.vertex_groups
+    posebones_flat = []
+    pose_indices = []
+    parent_indices = []
+    if armature != None:
+        pose_bones = armature.pose.bones
+        pose_index = {posebone.name: idx for idx, posebone in enumerate(pose_bones)}
+        for bone in bones_flat:
+            log.debug("bone " + bone.name)
+            if bone.name in pose_index:
+                posebone = pose_bones[pose_index[bone.name]]
+                posebones_flat.append(posebone)
+                pose_indices.append(pose_index[bone.name])
+                parent_indices.append(pose_index[posebone.parent.name] if posebone.parent != None else -1)
+
+    objbones_flat = []
+    for obj in bones_flat:
+        if hasattr(obj, 'type') and (obj.type == 'EMPTY' or obj.type == 'LATTICE' or obj.type == 'MESH'):
+            objbones_flat.append(obj)
+
+        #pose_bone = (b for b in armature.pose.bones if b.bone is bone)
+        #posebones_flat.append(pose_bone)
+    if armature != None:
+        log.debug("Found " + str(len(posebones_flat)) + "/" + str(len(armature.pose.bones)) + " pose bones")
+
+    log.debug("Found " + str(len(objbones_flat)) + " object bones")
+
+    pose_indices = np.array(pose_indices, dtype=np.int64)
+    parent_indices = np.array(parent_indices, dtype=np.int64)
+    is_root = parent_indices < 0
+    armature_matrix = np.array([list(row) for row in armatureMat], dtype=np.float64)
+    global_matrix = np.array([list(row) for row in EXPORT_GLOBAL_MATRIX], dtype=np.float64)
+    armature_scale = np.array(armatureScale[:], dtype=np.float64)
+    if len(pose_indices) > 0:
+        matrix_buffer = np.empty(len(armature.pose.bones) * 16, dtype=np.float32)
+
+    #evaluate the action directly instead of the whole scene, unless the frames get evaluated anyway
+    sampler = None
+    if EXPORT_ANIM_DIRECT and len(timeline.listeners) == 0 and len(pose_indices) > 0:
+        if len(objbones_flat) > 0:
+            log.info("Sampling animation with frame_set: object bones")
+        else:
+            sampler = ActionSampler.create(armature, track)
+
+    def evaluated_frames():
+        if sampler is None:
+            for i in timeline.frames():
+                yield i, None
+            return
+
+        for i in range(frame_start, frame_end + 1):
+            with profiler.phase("kin_evaluate"):
+                pose_matrices = sampler.pose_matrices(i)
+                if pose_matrices is None:
+                    scene.frame_set(i)
+            yield i, pose_matrices
+
+    def sample_frames():
+        for i, pose_matrices in evaluated_frames():
+            profiler.count("kin_frames")
+            #BoneDataList - position, rotation xyzw, scale
+            transforms = np.empty((len(pose_indices) + len(objbones_flat), 10), dtype=np.float64)
+
+            if len(pose_indices) > 0:
+                if pose_matrices is None:
+                    #all pose matrices in one call, foreach_get flattens them column by column
+                    armature.pose.bones.foreach_get("matrix", matrix_buffer)
+                    pose_matrices = matrix_buffer.reshape(-1, 4, 4).transpose(0, 2, 1).astype(np.float64)
+                bone_matrices = pose_matrices[pose_indices]
+
+                if not EXPORT_ANIM_RELATIVE_POSITIONING:
+                    mats = armature_matrix @ bone_matrices
+                else:
+                    mats = np.empty_like(bone_matrices)
+                    # limitation here where the root node will ignore scaling data
+                    # we can't remove the scaling from the armature matrix alone as that will break the world space conversion of the root node's matrix
+                    mats[is_root] = remove_scale(armature_matrix @ bone_matrices[is_root])
+                    #parent relative transforms
+                    parent_matrices = pose_matrices[parent_indices[~is_root]]
+                    mats[~is_root] = np.linalg.inv(parent_matrices) @ bone_matrices[~is_root]
 
-    #uv dictionary must be per object, otherwise duplicate objects (with similar normals and uvs) get merged
-    uv_dict = {}
-    uv = uv_key = uv_val = None
-    
-    unique_verts = []
-    indices = []
-    normals = []
+                mats = global_matrix @ mats
 
-    influence_bones = []
+                position, rotation, scale = decompose_matrices(mats)
 
-    for i, edge in enumerate(me.edges):
-        for v in edge.vertices:
-            vert = me.vertices[v]
+                if EXPORT_ANIM_RELATIVE_POSITIONING: # and pose_bone.parent != None
+                    position = position * armature_scale
+                else:
+                    rotation = invert_quaternions(rotation)
 
-            #texcoords are transformed 1.0 - y
-            uv = [0, 1]
-            no = vert.normal
+                transforms[:len(pose_indices), 0:3] = position
+                transforms[:len(pose_indices), 3:6] = rotation[:, 1:]
+                transforms[:len(pose_indices), 6] = rotation[:, 0]
+                transforms[:len(pose_indices), 7:10] = scale
 
-            uv_key = v, veckey3d(no)
-            uv_val = uv_dict.get(uv_key)
+            for row, obj_bone in enumerate(objbones_flat, len(pose_indices)):
+                #objMat = obj_bone.matrix_world
+                #if obj_bone.parent != None:
+                    #objMat = obj_bone.parent.matrix_world.inverted() @ objMat
+                #objMat = EXPORT_GLOBAL_MATRIX @ objMat
 
-            if uv_val is None:
-                uv_dict[uv_key] = len(unique_verts)
+                objMat = obj_bone.matrix_world
 
-                influences = {}
-                for group in vertgroups:
-                    try:
-                        weight = group.weight(v)
-                    except RuntimeError:
-                        weight = 0.0
-                    if weight != 0.0:
-                        influences[group.name] = weight
-                        if group.name not in influence_bones:
-                            influence_bones.append(group.name)
+                if EXPORT_ANIM_RELATIVE_POSITIONING:
+                    objMat = obj_bone.matrix_local
 
-                unique_verts.append([vert.co[:], uv[:], influences])
-                normals.append(no.normalized())
-                
-                if EXPORT_BOUNDS:
-                    if bounds_set:
-                        bounds_min.x = min(bounds_min.x, vert.co.x)
-                        bounds_min.y = min(bounds_min.y, vert.co.y)
-                        bounds_min.z = min(bounds_min.z, vert.co.z)
-                        bounds_max.x = max(bounds_max.x, vert.co.x)
-                        bounds_max.y = max(bounds_max.y, vert.co.y)
-                        bounds_max.z = max(bounds_max.z, vert.co.z)
-                    else:
-                        bounds_set = True
-                        bounds_min = mathutils.Vector(vert.co)
-                        bounds_max = mathutils.Vector(vert.co)
+                objMat = EXPORT_GLOBAL_MATRIX @ objMat
+                position, rotation, scale = objMat.decompose()
 
-            indices.append(uv_dict[uv_key])
+                if not EXPORT_ANIM_RELATIVE_POSITIONING:
+                    rotation = rotation.inverted()
 
-        if len(unique_verts) > 65532 or len(indices) // 3 > 65535:
-            #apply and update
-            mesh_data = {
-                "obj": obj,
-                "material": material,
-                "unique_verts": unique_verts.copy(),
-                "indices": indices.copy(),
-                "normals": normals.copy(),
-                "face_normals": [],
-                "face_list": [],
-                "tangents": [],
-                "area": 0.0,
-                "uv_layer": uv_layer,
-                "parent": objectParent,
-                "parent_bone": parentBone,
-                "is_curve": True,
-                "max_influence": len(influence_bones)
-            }
+                transforms[row] = (*position, rotation.x, rotation.y, rotation.z, rotation.w, *scale)
+
+            yield i - frame_start, transforms
 
-            meshes.append(mesh_data)
+    with open(filepath, "wb") as f:
+        im_writer.write_kin(f, info, events, skeleton, sample_frames())
 
-            unique_verts.clear()
-            indices.clear()
-            normals.clear()
+@profiler.profiled("curves")
+def gather_curve_data(me, obj, objectParent, parentBone, material, meshes):
 
-            uv_dict.clear()
-            uv = uv_key = uv_val = None
+    log.debug("Processing curve...")
 
-            influence_bones.clear()
+    #should be final - edge split, etc
+    weights = extract_vertex_weights(me, [group.name for group in obj.vertex_groups])
+    positions = foreach_get_array(me.vertices, "co", np.float32, 3)
+    normals = normalize_rows(foreach_get_array(me.vertices, "normal", np.float32, 3))
+
+    def add_chunk(vertex_ids, indices):
+        #texcoords are transformed 1.0 - y
+        texcoords = np.zeros((len(vertex_ids), 2), dtype=np.float32)
+        texcoords[:, 1] = 1.0
+        meshes.append(MeshChunk(obj, material, positions[vertex_ids], texcoords, normals[vertex_ids], indices,
+                                gather_weights([(weights, vertex_ids)]),
+                                parent=objectParent, parent_bone=parentBone, is_curve=True))
+
+    #every vertex is written once per chunk
+    vertex_slot = {}
+    vertex_ids = []
+    indices = []
+
+    for edge_vertices in foreach_get_array(me.edges, "vertices", np.int64, 2).tolist():
+        for v in edge_vertices:
+            slot = vertex_slot.get(v)
+            if slot is None:
+                slot = vertex_slot[v] = len(vertex_ids)
+                vertex_ids.append(v)
+            indices.append(slot)
+
+        if len(vertex_ids) > 65532 or len(indices) // 3 > 65535:
+            add_chunk(vertex_ids, indices)
+            vertex_slot.clear()
+            vertex_ids = []
+            indices = []
+
+            log.debug("Block split.")
+
+    if len(vertex_ids) > 0:
+        add_chunk(vertex_ids, indices)
+
+
+
+def derive_mesh_arrays(self, obj, me, mesh_arrays, use_tangents, use_neighbors):
+    """The expensive per object data: tangents, vertex dedup ids of every triangle corner
+    and, with use_neighbors, triangle adjacency. Missing entries are left out."""
+    derived = {}
+    if use_tangents:
+        try:
+            with profiler.phase("tangents"):
+                me.calc_tangents()
+                derived["tangents"] = foreach_get_array(me.loops, "tangent", np.float32, 3)
+        except Exception:
+            self.report({'INFO'}, 'Mesh \'' + obj.name + '\' has polygons with more than 4 vertices. Unable to calculate tangents.')
+
+    #deduplicating all corners at once gives the same classes as per material subset
+    with profiler.phase("dedup"):
+        corners = mesh_arrays["tri_loops"].ravel()
+        keys = quantize_keys(mesh_arrays["loop_vertex"][corners],
+                             mesh_arrays["uvs"][corners] if mesh_arrays["uvs"] is not None else None,
+                             mesh_arrays["corner_normals"][corners],
+                             mesh_arrays["colors"][corners] if mesh_arrays["colors"] is not None else None)
+        # todo - is this necessary? probably not, tangents don't seem to be affected by split normals
+        # veckey3d(tg),
+        derived["corner_ids"] = dedup_ids(keys)
+
+    if use_neighbors:
+        with profiler.phase("adjacency"):
+            derived["tri_neighbors"] = triangle_neighbors(mesh_arrays["loop_edge"][mesh_arrays["tri_loops"]])
+    return derived
+
+def is_opaque(mat):
+    if mat is None:
+        return True
+    #Blender 4.2 replaced blend_method with surface_render_method
+    if hasattr(mat, "surface_render_method"):
+        return mat.surface_render_method != 'BLENDED'
+    return mat.blend_method != 'BLEND'
+
+@profiler.profiled("optimize")
+def optimize_chunk(chunk, chunk_index, overdraw_threshold=None):
+    """Reorder a chunk's triangles for the vertex cache and its vertices in first use order.
+    With an overdraw_threshold the triangle clusters are also sorted to reduce overdraw."""
+    indices = chunk.indices
+    num_vertices = chunk.num_vertices
+    acmr_before, atvr_before = cache_stats(indices)
+
+    face_order = optimize_vertex_cache(indices, num_vertices)
+    if overdraw_threshold is not None:
+        overdraw_before = estimate_overdraw(indices, chunk.positions)
+        face_order = face_order[optimize_overdraw(indices.reshape(-1, 3)[face_order], chunk.positions, overdraw_threshold)]
+    _, vertex_order = optimize_vertex_fetch(indices.reshape(-1, 3)[face_order], num_vertices)
+    chunk.reorder(face_order, vertex_order)
+
+    #NINF primitive indices follow the new triangle order
+    new_primitive = np.empty(len(face_order), dtype=np.int64)
+    new_primitive[face_order] = np.arange(len(face_order))
+    for neighbor_arrays, faces in chunk.face_parts:
+        neighbor_arrays["tri_primitive"][faces] = new_primitive[neighbor_arrays["tri_primitive"][faces]]
+
+    acmr_after, atvr_after = cache_stats(chunk.indices)
+    log.info(f"Chunk {chunk_index} vertex cache: ACMR {acmr_before:.3f} -> {acmr_after:.3f}, ATVR {atvr_before:.3f} -> {atvr_after:.3f}")
+    if overdraw_threshold is not None:
+        overdraw_after = estimate_overdraw(chunk.indices, chunk.positions)
+        reduction = 100.0 * (1.0 - overdraw_after / overdraw_before) if overdraw_before > 0.0 else 0.0
+        log.info(f"Chunk {chunk_index} estimated overdraw: {overdraw_before:.3f} -> {overdraw_after:.3f} ({reduction:.1f}% reduction)")
+
+def chunk_neighbors(face_parts, face_order=None):
+    """NINF records of a chunk's triangles. Needs every triangle of the chunk's objects assigned
+    to its chunk and primitive (tri_chunk, tri_primitive)."""
+    neighbors = [neighbor_records(neighbor_arrays["tri_neighbors"][faces], neighbor_arrays["tri_chunk"], neighbor_arrays["tri_primitive"])
+                 for neighbor_arrays, faces in face_parts]
+    neighbors = np.concatenate(neighbors) if neighbors else np.zeros((0, 3, 2), dtype=np.uint16)
+    if face_order is not None:
+        neighbors = neighbors[face_order]
+    return neighbors
+
+class StreamedChunks:
+    """Takes the place of the list of MeshChunks when streaming: appended chunks are converted
+    and written right away, keeping only what their NINF records need later."""
+
+    def __init__(self, operator, writer, convert, use_neighbors):
+        self.operator = operator
+        self.writer = writer
+        self.convert = convert
+        self.use_neighbors = use_neighbors
+        self.neighbor_parts = []
+
+    def __len__(self):
+        return len(self.neighbor_parts)
+
+    def append(self, mesh_chunk):
+        neighbors = None
+        if self.use_neighbors:
+            #reserved for now, neighbors in later chunks aren't assigned yet
+            num_faces = sum(len(faces) for _, faces in mesh_chunk.face_parts)
+            neighbors = np.zeros((num_faces, 3, 2), dtype=np.uint16)
+
+        chunk = self.convert(len(self), mesh_chunk, neighbors)
+        with profiler.phase("write_chunk"):
+            warnings = self.writer.write_chunk(chunk)
+        for warning in warnings:
+            self.operator.report({'WARNING'}, warning)
+        self.neighbor_parts.append((mesh_chunk.face_parts, mesh_chunk.face_order) if self.use_neighbors else None)
+
+    def write_neighbors(self):
+        for index, parts in enumerate(self.neighbor_parts):
+            if parts is not None:
+                self.writer.set_neighbors(index, chunk_neighbors(*parts))
+
+@profiler.profiled("materials")
+def gather_material_data(self, mat, matl_version, source_dir, dest_dir, copy_set,
+                         EXPORT_TEXTURETXT, EXPORT_CONVERT_TGA, EXPORT_SUBSURF_AMBIENT,
+                         EXPORT_CUSTOM_PROPERTIES, EXPORT_PATH_MODE, texture_cache=None, tga_pool=None, reported_images=None,
+                         produced_outputs=None):
+    custom_properties = {}
+    if matl_version >= 102 and EXPORT_CUSTOM_PROPERTIES:
+        for K in mat.keys():
+            data = mat[K]
+            if K not in '_RNA_UI' and (isinstance(data, float) or isinstance(data, int) or isinstance(data, str) or isinstance(data, bool)):
+                if not isinstance(data, str):
+                    data = str(data)
+                custom_properties[K] = data
+
+    #nodes
+    mat_wrap = node_shader_utils.PrincipledBSDFWrapper(mat)
+
+    base_color = mat_wrap.base_color
+    if mat_wrap.base_color_texture != None and mat_wrap.base_color_texture.image != None:
+        base_color = [1.0, 1.0, 1.0]
+
+    #Ambient
+    if not EXPORT_SUBSURF_AMBIENT or mat_wrap.node_principled_bsdf is None:
+        ambient = base_color[:3]
+    else:
+        ambient = mat_wrap.node_principled_bsdf.inputs["Subsurface Color"].default_value[:3]
+
+    #Specular
+    if isinstance(mat_wrap.specular_tint, Color):
+        # Blender 4.0 - specular tint is now a Color
+        specular = (mat_wrap.specular_tint[0] * mat_wrap.specular,
+                    mat_wrap.specular_tint[1] * mat_wrap.specular,
+                    mat_wrap.specular_tint[2] * mat_wrap.specular)
+    else:
+        specular = (bl_math.lerp(mat_wrap.specular, mat_wrap.specular * base_color[0], mat_wrap.specular_tint),
+                    bl_math.lerp(mat_wrap.specular, mat_wrap.specular * base_color[1], mat_wrap.specular_tint),
+                    bl_math.lerp(mat_wrap.specular, mat_wrap.specular * base_color[2], mat_wrap.specular_tint))
+
+    #Emissive
+    if hasattr(mat_wrap, 'emission_strength'):
+        emission_strength = mat_wrap.emission_strength
+    else:
+        emission_strength = 1.0
+
+    emission = [emission_strength * c for c in mat_wrap.emission_color[:3]]
+
+    #Shininess
+    shininess = (1.0 - mat_wrap.roughness) * 128.0
+    shininess = min(max(shininess, 10.0), 128.0)
+
+    #Texture setup
+    textures = []
+
+    image_source = [
+        None, #TEX_Ambient
+        "base_color_texture", #TEX_Diffuse
+        "specular_texture", #TEX_Specular
+        "roughness_texture", #TEX_Shine
+        None, #TEX_Shinestrength
+        "emission_color_texture" if emission_strength != 0.0 else None, #TEX_Selfillum
+        "alpha_texture", #TEX_Opacity
+        None, #TEX_Filtercolor
+        "normalmap_texture", #TEX_Bump,
+        "metallic_texture", #TEX_Reflect,
+        "ior_texture", #TEX_Refract,
+        None, #TEX_Displacement
+        ]
+    for type, entry in enumerate(image_source):
+        if entry is None:
+            continue
+        tex_wrap = getattr(mat_wrap, entry, None)
+        if tex_wrap is None:
+            continue
+        image = tex_wrap.image
+        if image is None:
+            continue
+        is_npo2 = not power_of_two(image.size[0]) or not power_of_two(image.size[1])
+        #images shared by several materials are only reported once
+        image_key = bpy.path.abspath(image.filepath, library=image.library) if image.filepath else image.name
+        if is_npo2 and (reported_images is None or image_key not in reported_images):
+            self.report({'WARNING'}, 'Texture ' + image.filepath + ' is not a power of two. Consider resizing it.')
+            if reported_images is not None:
+                reported_images.add(image_key)
+
+        if not EXPORT_CONVERT_TGA:
+            filepath = io_utils.path_reference(image.filepath, source_dir, dest_dir,
+                                    EXPORT_PATH_MODE, "", copy_set, image.library)
+        else:
+            # Windows sucks.
+            image_path = image.filepath.lstrip('\\/')
+
+            # Resave the image.
+            basepath = os.path.basename(image_path).lower()
+            filepath = dest_dir + '\\' + os.path.splitext(basepath)[0] + ".tga"
+            # output_image = image.copy()
+
+            # Don't allow images bigger than 4k.
+            # if output_image.size[0] > 2048 or output_image.size[1] > 2048:
+            #     output_image.scale(2048, 2048)
+                
+            # output_image.file_format = 'TARGA_RAW'
+            # print(f"Saved image to {filepath}, src={image_path}")
+            # output_image.save_render(filepath=filepath)
+
+            # bpy.data.images.remove(output_image)
+
+            convert_image(image, filepath, texture_cache, tga_pool, produced_outputs)
+            # print(f"Saved image to {filepath}, src={image_path}")
             
-            print("Block split.")
-
-    if len(unique_verts) > 0:
-        mesh_data = {
-            "obj": obj,
-            "material": material,
-            "unique_verts": unique_verts.copy(),
-            "indices": indices.copy(),
-            "normals": normals.copy(),
-            "face_normals": [],
-            "face_list": [],
-            "tangents": [],
-            "area": 0.0,
-            "uv_layer": uv_layer,
-            "parent": objectParent,
-            "parent_bone": parentBone,
-            "is_curve": True,
-            "max_influence": len(influence_bones)
-        }
-
-        meshes.append(mesh_data)
-
-
-
-def write_file(self, filepath, objects, scene,
+        
+        strength = 1.0
+
+        #don't modify strength for tbumptex shinestrength
+        if entry == "normalmap_texture" and type == 8:
+            strength = 0.2 * mat_wrap.normalmap_strength
+
+        # TODO: adjust strength value for TEX_Reflect (m.reflect)
+        
+        if EXPORT_TEXTURETXT:
+            texturepath = texture_file(type, filepath, dest_dir, is_npo2, image.depth == (128 if image.is_float else 32),
+                                       texture_cache, produced_outputs)
+        else:
+            basename = os.path.basename(filepath).lower()
+            texturepath = dest_dir + '\\' + os.path.splitext(basename)[0] + ".texture"
+
+        textures.append(TextureSlot(type, texturepath, strength))
+
+    return MaterialData(matl_version, mat.name, not mat.use_backface_culling, mat_wrap.alpha,
+                        ambient, base_color[:3], specular, emission, shininess,
+                        custom_properties, textures)
+
+@profiler.profiled("geom")
+def gather_geom_data(self, i, chunk, bones, geom_version, EXPORT_SKEL, EXPORT_GLOBAL_MATRIX, EXPORT_VERTEX_COLORS):
+    obj             = chunk.obj
+    influences_in   = chunk.influences
+    objParent       = chunk.parent
+    parentBoneName  = chunk.parent_bone
+
+    parentBone = None
+    if parentBoneName in bones:
+        parentBone = bones[parentBoneName]
+
+    #Parent (200)
+    parent_name = None
+    inv_parent_transform = None
+    if geom_version >= 200:
+        if EXPORT_SKEL and parentBone != None:
+            parent_name = parentBoneName
+            
+            inv_parent_transform = parentBone["worldMatrix"].inverted()
+        elif EXPORT_SKEL and objParent != None:
+            parent_name = objParent.name
+
+            #OLD METHOD
+            #parentMat = EXPORT_GLOBAL_MATRIX @ objParent.matrix_world
+            #co_vector = parentMat.inverted() @ co_vector
+            parentLoc, parentRot, parentScale = objParent.matrix_world.decompose()
+
+            locMat = mathutils.Matrix.Translation(parentLoc)
+            rotMat = parentRot.to_matrix().to_4x4()
+            inv_parent_transform = (EXPORT_GLOBAL_MATRIX @ locMat @ rotMat).inverted()
+
+    geom = GeomData(geom_version, chunk.positions, chunk.texcoords, chunk.indices, chunk.normals,
+                    face_normals=chunk.face_normals,
+                    tangents=chunk.tangents,
+                    colors=chunk.colors if EXPORT_VERTEX_COLORS else None,
+                    area=chunk.area,
+                    is_curve=chunk.is_curve,
+                    max_influence=chunk.max_influence,
+                    parent_name=parent_name,
+                    parent_transform=[list(row) for row in inv_parent_transform] if inv_parent_transform is not None else None)
+
+    #transform the whole chunk into parent space at once
+    geom, nan_kinds = im_writer.prepare_geom(geom)
+    for kind in nan_kinds:
+        self.report({'WARNING'}, 'NaN ' + kind + ' data detected in chunk ' + str(i) + " {" + obj.name + "}")
+
+    #BoneTransform = None #identity?
+    with profiler.phase("influences"):
+        for group, name in enumerate(influences_in["names"]):
+            if name in bones:
+                bonegroup = bones[name]
+                #boneMat = bone.matrix_local.inverted()
+                bonegroup["infl"][i] = im_writer.bone_influences(bonegroup["invWorldMatrix"], geom.positions, influences_in, group)
+
+    return geom
+
+def write_file(self, filepath, objects, scene, cleanup,
                EXPORT_APPLY_MODIFIERS=True,
                EXPORT_CURVES=False,
                EXPORT_TEXTURETXT=True,
                EXPORT_CONVERT_TGA=False,
+               EXPORT_TEXTURE_CACHE=False,
                EXPORT_TANGENTS=True,
                EXPORT_BOUNDS=True,
                EXPORT_VERTEX_COLORS=False,
                EXPORT_NEIGHBOR_INFO=False,
+               EXPORT_OPTIMIZE_VERTEX_CACHE=False,
+               EXPORT_OPTIMIZE_OVERDRAW=False,
+               EXPORT_OVERDRAW_THRESHOLD=1.05,
+               EXPORT_SPATIAL_SPLIT=False,
+               EXPORT_OBJECT_CACHE=False,
+               EXPORT_STREAM=False,
                EXPORT_SUBSURF_AMBIENT=False,
                EXPORT_CUSTOM_PROPERTIES=False,
                EXPORT_KIN=True,
@@ -557,6 +790,7 @@ def write_file(self, filepath, objects, scene,
                EXPORT_ALL_BONES=False,
                EXPORT_ANIM_NLA=False,
                EXPORT_ANIM_EVENTS=True,
+               EXPORT_ANIM_DIRECT=False,
                EXPORT_EXPLICIT_VERSIONING=False,
                EXPORT_INFO_VERSION=None,
                EXPORT_MATL_VERSION=None,
@@ -571,7 +805,8 @@ def write_file(self, filepath, objects, scene,
 
     #split objects
     meshes = []
-    hold_meshes = [] #prevent garbage collection of bmeshes
+    #evaluated mesh copies, removed once extracted or when the export ends
+    temp_meshes = cleanup.enter_context(TemporaryMeshes())
 
     #set to defaults
     bounds_set = False
@@ -584,29 +819,194 @@ def write_file(self, filepath, objects, scene,
     material_groups = {}
     curves = []
 
+    object_cache = None
+    if EXPORT_OBJECT_CACHE:
+        object_cache = ObjectCache(os.path.join(os.path.dirname(filepath), ".im_cache", os.path.basename(filepath)))
+
+    #one pass over the timeline feeds both the animated bounds and the .kin frames
+    timeline = TimelineSweep(scene, scene.frame_start, scene.frame_end)
+    anim_bounds = None
     if use_anim_bounds:
-        for i in range(scene.frame_start, scene.frame_end + 1):
-            scene.frame_set(i)
-            for obj in objects:
-                for coord in obj.bound_box:
-                    co_vector = mathutils.Vector((coord[0], coord[1], coord[2], 1.0))
-                    co_vector = EXPORT_GLOBAL_MATRIX @ obj.matrix_world @ co_vector
-                    if bounds_set:
-                        bounds_min.x = min(bounds_min.x, co_vector.x)
-                        bounds_min.y = min(bounds_min.y, co_vector.y)
-                        bounds_min.z = min(bounds_min.z, co_vector.z)
-                        bounds_max.x = max(bounds_max.x, co_vector.x)
-                        bounds_max.y = max(bounds_max.y, co_vector.y)
-                        bounds_max.z = max(bounds_max.z, co_vector.z)
-                    else:
-                        bounds_set = True
-                        bounds_min = mathutils.Vector(co_vector)
-                        bounds_max = mathutils.Vector(co_vector)
-                    
+        anim_bounds = AnimatedBounds(objects, EXPORT_GLOBAL_MATRIX)
+        timeline.add_listener(anim_bounds)
+        #bone rest matrices and meshes are gathered on the first frame
         scene.frame_set(scene.frame_start)
 
+    active_armature = None
+    bones = {}
+    root_bone = None
+    for ob in objects:
+        if ob.type != 'ARMATURE':
+            continue
+        active_armature = ob
+        break
+
+    if active_armature is None:
+        log.info("No armature in scene.")
+        #EXPORT_KIN = False
+    else:
+        for bone in active_armature.data.bones:
+            if "b.r." in bone.name or EXPORT_ALL_BONES:
+                #bone, chunk influences
+
+                if bone.parent == None:
+                    boneMat = active_armature.matrix_world @ bone.matrix_local
+                else:
+                    #convert bone transforms into world space and remove the scale
+                    parentMatrix = active_armature.matrix_world @ bone.parent.matrix_local
+                    parentMatrix = remove_scale_from_matrix(parentMatrix)
+                    childMatrix = active_armature.matrix_world @ bone.matrix_local
+                    childMatrix = remove_scale_from_matrix(childMatrix)
+
+                    boneMat = parentMatrix.inverted() @ childMatrix
+                
+                boneMat = EXPORT_GLOBAL_MATRIX @ boneMat
+                worldMat = EXPORT_GLOBAL_MATRIX @ remove_scale_from_matrix(active_armature.matrix_world @ bone.matrix_local)
+
+                bone_data = {
+                    "srcBone": bone,
+                    "matrix": boneMat,
+                    "worldMatrix": worldMat,
+                    "invWorldMatrix": [list(row) for row in worldMat.inverted()],
+                    "infl": {}
+                }
+
+                bones[bone.name] = bone_data
+                if bone.parent == None:
+                    root_bone = bone
 
-    for obj in objects:
+    #legacy empty, lattice support
+    for ob in objects:
+        if "b.r." in ob.name:
+            log.debug("Found bone object " + ob.name)
+            
+            if ob.parent == None:
+                boneMat = ob.matrix_world
+            else:
+                boneMat = ob.matrix_parent_inverse @ ob.matrix_world
+
+            boneMat = EXPORT_GLOBAL_MATRIX @ boneMat
+            worldMat = EXPORT_GLOBAL_MATRIX @ ob.matrix_world
+            
+            bone_data = {
+                "srcBone": ob,
+                "matrix": boneMat,
+                "worldMatrix": worldMat,
+                "invWorldMatrix": [list(row) for row in worldMat.inverted()],
+                "infl": {}
+            }
+
+            bones[ob.name] = bone_data
+            if ob.parent == None:
+                root_bone = ob
+
+    copy_set = set()
+    reported_images = set()
+    #converted images and texture.txt files written by this export, path -> what it was made from
+    produced_outputs = {}
+    source_dir = os.path.dirname(bpy.data.filepath)
+    dest_dir = os.path.dirname(filepath)
+    texture_cache = None
+    if EXPORT_TEXTURE_CACHE:
+        texture_cache = TextureCache(os.path.join(dest_dir, ".im_cache"))
+    tga_pool = None
+    if EXPORT_CONVERT_TGA:
+        tga_pool = TgaWriterPool()
+        #an export that fails drops its queued images instead of leaving the workers running
+        cleanup.callback(tga_pool.shutdown)
+
+    info_version = 104
+    if EXPORT_EXPLICIT_VERSIONING:
+        info_version = int(EXPORT_INFO_VERSION)
+    else:
+        if EXPORT_BOUNDS:
+            info_version = 104
+        else:
+            info_version = 102
+
+    matl_version = 103
+    if EXPORT_EXPLICIT_VERSIONING:
+        matl_version = int(EXPORT_MATL_VERSION)
+
+    geom_version = 201
+    if EXPORT_EXPLICIT_VERSIONING:
+        geom_version = int(EXPORT_GEOM_VERSION)
+    else:
+        if EXPORT_VERTEX_COLORS:
+            geom_version = 104
+
+    objLocation, objRotation, objScale = EXPORT_GLOBAL_MATRIX.decompose()
+
+    #MATL data is gathered once per material and shared by all of its chunks
+    material_cache = {}
+    default_matl = None
+
+    def chunk_data(i, mesh_chunk, neighbors=None):
+        nonlocal default_matl
+        obj             = mesh_chunk.obj
+        mat             = mesh_chunk.material
+
+        material_key = mat if mat is not None else obj.name + ".m.notex"
+        matl = material_cache.get(material_key)
+        if matl is None and mat is None:
+            #chunks without a material share one default material, named after their object
+            if default_matl is None:
+                defaultMaterial = bpy.data.materials.new("default.m.notex")
+                default_matl = gather_material_data(self, defaultMaterial, matl_version, source_dir, dest_dir, copy_set,
+                                                    EXPORT_TEXTURETXT, EXPORT_CONVERT_TGA, EXPORT_SUBSURF_AMBIENT,
+                                                    EXPORT_CUSTOM_PROPERTIES, EXPORT_PATH_MODE, texture_cache, tga_pool,
+                                                    reported_images, produced_outputs)
+                bpy.data.materials.remove(defaultMaterial)
+            matl = replace(default_matl, name=material_key)
+            material_cache[material_key] = matl
+        elif matl is None:
+            #initial period before material name extension isn't required
+            #TrainzMeshImporter name structure?
+            # filename, CRC32?, material name, extension
+            #*rmines2*4B6A2F83*material #1*m.onetex
+            #*waterglass_left*704EDB8B*bulb*m.onetex
+
+            if not mat.name.endswith("m.notex") and \
+                not mat.name.endswith("m.onetex") and \
+                not mat.name.endswith("m.reflect") and \
+                not mat.name.endswith("m.gloss") and \
+                not mat.name.endswith("m.tbumptex") and \
+                not mat.name.endswith("m.tbumpgloss") and \
+                not mat.name.endswith("m.tbumpenv"):
+                self.report({'WARNING'}, "Material " + mat.name + " on object " + obj.name + " is missing a valid material extension. This may cause issues in games earlier than TANE. A list of valid legacy material extensions is available here: https://online.ts2009.com/mediaWiki/index.php/Material_Types")
+
+            matl = gather_material_data(self, mat, matl_version, source_dir, dest_dir, copy_set,
+                                        EXPORT_TEXTURETXT, EXPORT_CONVERT_TGA, EXPORT_SUBSURF_AMBIENT,
+                                        EXPORT_CUSTOM_PROPERTIES, EXPORT_PATH_MODE, texture_cache, tga_pool,
+                                        reported_images, produced_outputs)
+            material_cache[material_key] = matl
+
+        geom = gather_geom_data(self, i, mesh_chunk, bones, geom_version, EXPORT_SKEL, EXPORT_GLOBAL_MATRIX, EXPORT_VERTEX_COLORS)
+
+        if influence_spool is not None:
+            #the bone space positions move to the spool with the rest of the chunk's INFL records
+            for bonegroup in bones.values():
+                if i in bonegroup["infl"]:
+                    bonegroup["infl"][i] = influence_spool.add(*bonegroup["infl"][i])
+
+        return ChunkData(matl, geom, neighbors)
+
+    #streamed chunks are written as soon as they're built, only NINF and INFL state is kept
+    stream = None
+    influence_spool = None
+    if EXPORT_STREAM:
+        def remove_partial_file(exc_type, exc, tb):
+            if exc_type is not None and os.path.exists(filepath):
+                os.remove(filepath)
+        cleanup.push(remove_partial_file)
+        im_file = cleanup.enter_context(open(filepath, "wb"))
+        #INFO is rewritten once the counts and bounds are known
+        stream = ImStreamWriter(im_file, InfoData(info_version, objLocation[:], (objRotation.w, objRotation.x, objRotation.y, objRotation.z), 0))
+        influence_spool = InfluenceSpool()
+        cleanup.callback(influence_spool.close)
+        meshes = StreamedChunks(self, stream, chunk_data, EXPORT_NEIGHBOR_INFO)
+
+    for obj_index, obj in enumerate(objects):
 
         #curves can be converted into meshes
         is_curve = obj.type == 'CURVE'
@@ -626,12 +1026,9 @@ def write_file(self, filepath, objects, scene,
             # Force all meshes to triangulate themselves.
             triangle_mod = obj.modifiers.new('im', 'TRIANGULATE')
 
-            depsgraph = bpy.context.evaluated_depsgraph_get()
-            final = obj.evaluated_get(depsgraph)
-            try:
-                me = final.to_mesh(preserve_all_data_layers=True, depsgraph=depsgraph).copy()
-            except RuntimeError:
-                me = None
+            with profiler.phase("evaluate"):
+                depsgraph = bpy.context.evaluated_depsgraph_get()
+                me = temp_meshes.evaluated_copy(obj, depsgraph)
             
             if triangle_mod != None:
                 obj.modifiers.remove(triangle_mod)
@@ -645,6 +1042,7 @@ def write_file(self, filepath, objects, scene,
 
         if me is None:
             continue
+        profiler.count("objects")
 
         #uv_layer = me.uv_layers.active.data
         #mesh_triangulate(me)
@@ -662,349 +1060,239 @@ def write_file(self, filepath, objects, scene,
             if "b.r." in obj.parent_bone:
                 parentBone = obj.parent_bone
         
-        print("Pre-processing object " + obj.name)
-        me.transform(EXPORT_GLOBAL_MATRIX @ obj.matrix_world)
-        
-        if bpy.app.version < (4, 1, 0):
-            me.calc_normals_split()
+        log.debug("Pre-processing object " + obj.name)
+        with profiler.phase("transform"):
+            me.transform(EXPORT_GLOBAL_MATRIX @ obj.matrix_world)
+
+            if bpy.app.version < (4, 1, 0):
+                me.calc_normals_split()
 
         use_tangents = EXPORT_TANGENTS
         if EXPORT_TANGENTS:
-            if len(me.uv_layers) > 0 or me.uv_layers.active: # or len(me.uv_layers.active.data) < len(me.loops)
-                try:
-                    me.calc_tangents()
-                except Exception:
-                    self.report({'INFO'}, 'Mesh \'' + obj.name + '\' has polygons with more than 4 vertices. Unable to calculate tangents.')
-                    use_tangents = False
-            else:
+            if not (len(me.uv_layers) > 0 or me.uv_layers.active): # or len(me.uv_layers.active.data) < len(me.loops)
                 self.report({'WARNING'}, 'Object \'' + obj.name + '\' is missing UV data, which is required for tangent generation.')
                 use_tangents = False
-            
+
 
         materials = me.materials[:]
-        print("object contains " + str(len(materials)) + " materials")
+        log.debug("object contains " + str(len(materials)) + " materials")
         if len(materials) == 0:
             materials.append(None)
 
         if EXPORT_CURVES and is_curve:
-            gather_curve_data(me, obj, objectParent, parentBone, materials[0], EXPORT_BOUNDS, bounds_set, meshes)
+            gather_curve_data(me, obj, objectParent, parentBone, materials[0], meshes)
+            temp_meshes.release(me)
             continue
         
-        me.calc_loop_triangles()
-
+        with profiler.phase("extract"):
+            me.calc_loop_triangles()
+            mesh_arrays = extract_mesh_arrays(me, False, EXPORT_VERTEX_COLORS)
+            #should be final - edge split, etc
+            mesh_arrays["weights"] = extract_vertex_weights(me, [group.name for group in obj.vertex_groups])
+        profiler.count("triangles", len(mesh_arrays["tri_loops"]))
+
+        #tangents, dedup ids and adjacency only depend on the arrays above
+        derived = None
+        if object_cache is not None:
+            with profiler.phase("object_cache"):
+                cache_key = content_hash(mesh_arrays, use_tangents, bpy.app.version[:])
+                derived = object_cache.load(cache_key, obj.name)
+            if derived is not None and EXPORT_NEIGHBOR_INFO and "tri_neighbors" not in derived:
+                derived = None
+        if derived is None:
+            derived = derive_mesh_arrays(self, obj, me, mesh_arrays, use_tangents, EXPORT_NEIGHBOR_INFO)
+            if object_cache is not None:
+                with profiler.phase("object_cache"):
+                    object_cache.store(cache_key, derived)
+        elif use_tangents and "tangents" not in derived:
+            self.report({'INFO'}, 'Mesh \'' + obj.name + '\' has polygons with more than 4 vertices. Unable to calculate tangents.')
+        mesh_arrays.update(derived)
+        use_tangents = mesh_arrays["tangents"] is not None
+        #everything from here on works on the extracted arrays
+        temp_meshes.release(me)
+
+        tri_material = mesh_arrays["tri_material"]
+        invalid_faces = (tri_material < 0) | (tri_material >= len(materials))
+        if invalid_faces.any():
+            self.report({'WARNING'}, f'Object \'{obj.name}\' contains an invalid material index {tri_material[invalid_faces][0]}.')
+            tri_material = np.where(invalid_faces, 0, tri_material)
+
+        #slots sharing a material are collated, in face order
         mats_2_faces = {}
-        edges_2_faces = {}
-
-        invalid_material_indices = {}
-
-        for face in me.loop_triangles:
-            mat_index = face.material_index
-            if mat_index is None:
-                mat_index = 0
-            if mat_index < 0 or mat_index >= len(materials):
-                mat_index = 0
-                if mat_index not in invalid_material_indices:
-                    invalid_material_indices[mat_index] = True
-                    self.report({'WARNING'}, f'Object \'{obj.name}\' contains an invalid material index {face.material_index}.')
-
-            mat = materials[mat_index]
-            if mat not in mats_2_faces:
-                mats_2_faces[mat] = []
-            mats_2_faces[mat].append(face)
-
-            if EXPORT_NEIGHBOR_INFO:
-                for l in face.loops:
-                    edge_index = me.loops[l].edge_index
-                    if not edge_index in edges_2_faces:
-                        edges_2_faces[edge_index] = []
-                    edges_2_faces[edge_index].append(face)
+        for mat in materials:
+            if mat in mats_2_faces:
+                continue
+            slots = [idx for idx, slot_mat in enumerate(materials) if slot_mat == mat]
+            faces = np.flatnonzero(np.isin(tri_material, slots))
+            if len(faces) > 0:
+                mats_2_faces[mat] = faces
+
+        if EXPORT_NEIGHBOR_INFO:
+            num_tris = len(mesh_arrays["tri_loops"])
+            #kept apart from the other arrays, which can be released once the object's chunks are done
+            mesh_arrays["neighbors"] = {
+                "tri_neighbors": mesh_arrays["tri_neighbors"],
+                #filled in as the faces are assigned to chunks
+                "tri_chunk": np.zeros(num_tris, dtype=np.int64),
+                "tri_primitive": np.zeros(num_tris, dtype=np.int64),
+            }
         
         for mat in materials:
             #if objects have a different parent (animation) they shouldn't be collated
             mat_key = mat, use_tangents, objectParent, parentBone
 
-            if mat_key not in material_groups:
-                material_groups[mat_key] = []
-
             #if the material doesn't have any faces assigned to it, don't bother giving it a chunk
             if mat not in mats_2_faces:
                 continue
 
+            if mat_key not in material_groups:
+                material_groups[mat_key] = []
+
             obj_data = {
-                "me": me,
-                "obj": final,
+                "mesh_index": obj_index,
+                "arrays": mesh_arrays,
+                "obj": obj,
                 "materials": materials,
                 "faces": mats_2_faces[mat],
-                "edges_2_faces": edges_2_faces,
                 "parent": objectParent,
                 "parent_bone": parentBone
             }
 
             material_groups[mat_key].append(obj_data)
 
-    neighbor_map = {}
-    face_2_index_map = {}
-
-    for mat_key, group in material_groups.items():
-        material = mat_key[0]
-        use_tangents = mat_key[1]
-        print("Processing material")
-        #per-chunk data
-
-        unique_verts = []
-        indices = []
-        normals = []
-        face_normals = []
-        face_list = []
-        tangents = []
-        colors = []
-
-        area = 0.0
-        influence_bones = []
-        
-        for obj_data in group:
-            me = obj_data["me"]
-            obj = obj_data["obj"]
-            materials = obj_data["materials"]
-            obj_faces = obj_data["faces"]
-            edges_2_faces = obj_data["edges_2_faces"]
-            objectParent = obj_data["parent"]
-            parentBone = obj_data["parent_bone"]
-
-            if len(me.uv_layers) == 0:
-                uv_layer = None
-            else:
-                uv_layer = me.uv_layers.active.data[:]
-            me_verts = me.vertices[:]
-            me_edges = me.edges[:]
-
-            if EXPORT_VERTEX_COLORS and len(me.vertex_colors) != 0:
-                # Blender 4.0 TODO: this is broken
-                color_layer = me.vertex_colors.active.data[:]
-            else:
-                color_layer = None
-
-            print("Processing mesh...")
-
-            #should be final - edge split, etc
-            vertgroups = obj.vertex_groups
+    with profiler.phase("chunks"):
+        #groups are let go of as they're done, so an object's arrays are freed after its last chunk
+        while material_groups:
+            mat_key = next(iter(material_groups))
+            group = material_groups.pop(mat_key)
+            material = mat_key[0]
+            use_tangents = mat_key[1]
+            log.debug("Processing material")
 
             #uv dictionary must be per object, otherwise duplicate objects (with similar normals and uvs) get merged
-            uv_dict = {}
-            uv = uv_key = uv_val = None
-
-            for i, face in enumerate(obj_faces):
-                area += face.area
-
-                face_normals.append(face.normal.normalized())
-
-                neighbors = []
-
-                if EXPORT_NEIGHBOR_INFO:
-                    #store the face's parent chunk
-                    neighbor_map[face] = [f for e in face.loops
-                        for f in edges_2_faces[me.loops[e].edge_index] if f is not face]
-                    face_2_index_map[face] = {
-                        "index": len(face_list),
-                        "attribute": len(meshes)
-                    }
-                    face_list.append(face)
-
-
-                for uv_index, l_index in enumerate(face.loops):
-                    loop = me.loops[l_index]
-                    vert = me_verts[loop.vertex_index]
-                    
-                    #no = loop.normal
-                    if bpy.app.version < (4, 1, 0):
-                        no = mathutils.Vector(face.split_normals[uv_index])
+            segments = []
+            for obj_data in group:
+                mesh_arrays = obj_data["arrays"]
+                obj_data["corners"] = mesh_arrays["tri_loops"][obj_data["faces"]].ravel()
+                segments.append(mesh_arrays["corner_ids"].reshape(-1, 3)[obj_data["faces"]].ravel())
+
+            chunk_breaks = ()
+            if EXPORT_SPATIAL_SPLIT:
+                with profiler.phase("spatial_split"):
+                    group, segments, chunk_breaks, min_chunks = spatial_segments(group, segments)
+
+            chunks = split_chunks(segments, breaks=chunk_breaks)
+            if EXPORT_SPATIAL_SPLIT and len(chunks) > 1:
+                log.info(f"Spatial split: {len(chunks)} chunks, at least {min_chunks} needed")
+
+            for chunk_index, chunk in enumerate(chunks):
+                positions = []
+                texcoords = []
+                weight_parts = []
+                normals = []
+                face_normals = []
+                face_parts = []
+                num_faces = 0
+                tangents = []
+                colors = []
+
+                area = 0.0
+
+                for segment_index, face_start, face_end, vertex_corners in chunk["parts"]:
+                    obj_data = group[segment_index]
+                    mesh_arrays = obj_data["arrays"]
+                    obj = obj_data["obj"]
+                    obj_faces = obj_data["faces"][face_start:face_end]
+                    objectParent = obj_data["parent"]
+                    parentBone = obj_data["parent_bone"]
+
+                    log.debug("Processing mesh...")
+
+                    vertex_loops = obj_data["corners"][vertex_corners]
+                    vertex_indices = mesh_arrays["loop_vertex"][vertex_loops]
+
+                    positions.append(mesh_arrays["positions"][vertex_indices])
+                    if mesh_arrays["uvs"] is not None:
+                        texcoords.append(mesh_arrays["uvs"][vertex_loops])
                     else:
-                        no = me.corner_normals[l_index].vector
-                    
-                    tg = loop.tangent
-
-                    color = color_layer[l_index].color if color_layer else [1, 1, 1, 1]
-                    uv = uv_layer[l_index].uv if uv_layer != None else [0, 0]
-
-                    uv_key = loop.vertex_index, veckey2d(uv), veckey3d(no), veckey3d(color)
-                    # todo - is this necessary? probably not, tangents don't seem to be affected by split normals
-                    # veckey3d(tg),
-
-                    uv_val = uv_dict.get(uv_key)
-
-                    if uv_val is None:
-                        uv_dict[uv_key] = len(unique_verts)
-
-                        influences = {}
-                        for group in vertgroups:
-                            try:
-                                weight = group.weight(loop.vertex_index)
-                            except RuntimeError:
-                                weight = 0.0
-                            if weight != 0.0:
-                                influences[group.name] = weight
-                                if group.name not in influence_bones:
-                                    influence_bones.append(group.name)
-
-                        max_vert_influences = max(max_vert_influences, len(influences))
-
-                        unique_verts.append([vert.co[:], uv[:], influences])
-                        normals.append(no.normalized())
-
-                        if use_tangents:
-                            tangents.append(tg.normalized())
-
-                        if EXPORT_VERTEX_COLORS:
-                            colors.append(color)
-                        
-                        if EXPORT_BOUNDS and not use_anim_bounds:
-                            if bounds_set:
-                                bounds_min.x = min(bounds_min.x, vert.co.x)
-                                bounds_min.y = min(bounds_min.y, vert.co.y)
-                                bounds_min.z = min(bounds_min.z, vert.co.z)
-                                bounds_max.x = max(bounds_max.x, vert.co.x)
-                                bounds_max.y = max(bounds_max.y, vert.co.y)
-                                bounds_max.z = max(bounds_max.z, vert.co.z)
-                            else:
-                                bounds_set = True
-                                bounds_min = mathutils.Vector(vert.co)
-                                bounds_max = mathutils.Vector(vert.co)
-
-                    indices.append(uv_dict[uv_key])
-                
-
-
-                if len(unique_verts) > 65532 or len(indices) // 3 > 65535:
-                    #apply and update
-                    mesh_data = {
-                        "obj": obj,
-                        "material": material,
-                        "unique_verts": unique_verts.copy(),
-                        "indices": indices.copy(),
-                        "normals": normals.copy(),
-                        "face_normals": face_normals.copy(),
-                        "face_list": face_list.copy(),
-                        "tangents": tangents.copy(),
-                        "colors": colors.copy(),
-                        "area": area,
-                        "uv_layer": uv_layer,
-                        "parent": objectParent,
-                        "parent_bone": parentBone,
-                        "is_curve": False,
-                        "max_influence": len(influence_bones)
-                    }
-
-                    meshes.append(mesh_data)
-
-                    unique_verts.clear()
-                    indices.clear()
-                    normals.clear()
-                    face_normals.clear()
-                    face_list.clear()
-                    tangents.clear()
-                    colors.clear()
-                    area = 0.0
-                    uv_dict.clear()
-                    uv = uv_key = uv_val = None
-
-                    max_chunk_influences = max(max_chunk_influences, len(influence_bones))
-                    influence_bones.clear()
-
-                    print("Block split.")
-
-        #Add remaining verts
-        if len(unique_verts) > 0:
-            mesh_data = {
-                "obj": obj,
-                "material": material,
-                "unique_verts": unique_verts.copy(),
-                "indices": indices.copy(),
-                "normals": normals.copy(),
-                "face_normals": face_normals.copy(),
-                "face_list": face_list.copy(),
-                "tangents": tangents.copy(),
-                "colors": colors.copy(),
-                "area": area,
-                "uv_layer": uv_layer,
-                "parent": objectParent,
-                "parent_bone": parentBone,
-                "is_curve": False,
-                "max_influence": len(influence_bones)
-            }
-            meshes.append(mesh_data)
-
-            max_chunk_influences = max(max_chunk_influences, len(influence_bones))
-            
-
-        print("Complete.")
-
-        #bm.free()
+                        texcoords.append(np.zeros((len(vertex_loops), 2), dtype=np.float32))
+                    normals.append(normalize_rows(mesh_arrays["corner_normals"][vertex_loops]))
+                    if use_tangents:
+                        tangents.append(normalize_rows(mesh_arrays["tangents"][vertex_loops]))
+                    if EXPORT_VERTEX_COLORS:
+                        if mesh_arrays["colors"] is not None:
+                            colors.append(mesh_arrays["colors"][vertex_loops])
+                        else:
+                            colors.append(np.ones((len(vertex_loops), 4), dtype=np.float32))
 
-    active_armature = None
-    bones = {}
-    root_bone = None
-    for ob in objects:
-        if ob.type != 'ARMATURE':
-            continue
-        active_armature = ob
-        break
+                    #faces are summed in order to match the previous per face accumulation
+                    for face_area in mesh_arrays["tri_area"][obj_faces].tolist():
+                        area += face_area
+                    face_normals.append(normalize_rows(mesh_arrays["tri_normal"][obj_faces]))
 
-    if active_armature is None:
-        print("No armature in scene.")
-        #EXPORT_KIN = False
-    else:
-        for bone in active_armature.data.bones:
-            if "b.r." in bone.name or EXPORT_ALL_BONES:
-                #bone, chunk influences
+                    if EXPORT_NEIGHBOR_INFO:
+                        #store the faces' parent chunk
+                        neighbor_arrays = mesh_arrays["neighbors"]
+                        neighbor_arrays["tri_chunk"][obj_faces] = len(meshes)
+                        neighbor_arrays["tri_primitive"][obj_faces] = np.arange(num_faces, num_faces + len(obj_faces))
+                        face_parts.append((neighbor_arrays, obj_faces))
+                    num_faces += len(obj_faces)
+
+                    weight_parts.append((mesh_arrays["weights"], vertex_indices))
+
+                positions = np.concatenate(positions)
+                vertex_influences = gather_weights(weight_parts)
+                if EXPORT_SPATIAL_SPLIT and len(chunks) > 1:
+                    extent = (positions.max(axis=0) - positions.min(axis=0)).tolist()
+                    log.info(f"Chunk {len(meshes)}: {len(positions)} vertices, {len(chunk['indices']) // 3} triangles, "
+                          f"extent {extent[0]:.2f} x {extent[1]:.2f} x {extent[2]:.2f}")
+                if len(positions) > 0:
+                    max_vert_influences = max(max_vert_influences, int(np.diff(vertex_influences["indptr"]).max()))
+
+                if EXPORT_BOUNDS and not use_anim_bounds:
+                    chunk_min = positions.min(axis=0).tolist()
+                    chunk_max = positions.max(axis=0).tolist()
+                    if bounds_set:
+                        bounds_min.x = min(bounds_min.x, chunk_min[0])
+                        bounds_min.y = min(bounds_min.y, chunk_min[1])
+                        bounds_min.z = min(bounds_min.z, chunk_min[2])
+                        bounds_max.x = max(bounds_max.x, chunk_max[0])
+                        bounds_max.y = max(bounds_max.y, chunk_max[1])
+                        bounds_max.z = max(bounds_max.z, chunk_max[2])
+                    else:
+                        bounds_set = True
+                        bounds_min = mathutils.Vector(chunk_min)
+                        bounds_max = mathutils.Vector(chunk_max)
 
-                if bone.parent == None:
-                    boneMat = active_armature.matrix_world @ bone.matrix_local
-                else:
-                    #convert bone transforms into world space and remove the scale
-                    parentMatrix = active_armature.matrix_world @ bone.parent.matrix_local
-                    parentMatrix = remove_scale_from_matrix(parentMatrix)
-                    childMatrix = active_armature.matrix_world @ bone.matrix_local
-                    childMatrix = remove_scale_from_matrix(childMatrix)
+                mesh_chunk = MeshChunk(obj, material, positions, np.concatenate(texcoords), np.concatenate(normals),
+                                       chunk["indices"], vertex_influences,
+                                       face_normals=np.concatenate(face_normals),
+                                       tangents=np.concatenate(tangents) if use_tangents else None,
+                                       colors=np.concatenate(colors) if EXPORT_VERTEX_COLORS else None,
+                                       area=area,
+                                       parent=objectParent,
+                                       parent_bone=parentBone,
+                                       face_parts=face_parts)
 
-                    boneMat = parentMatrix.inverted() @ childMatrix
-                
-                boneMat = EXPORT_GLOBAL_MATRIX @ boneMat
-                worldMat = EXPORT_GLOBAL_MATRIX @ remove_scale_from_matrix(active_armature.matrix_world @ bone.matrix_local)
+                if EXPORT_OPTIMIZE_VERTEX_CACHE or EXPORT_OPTIMIZE_OVERDRAW:
+                    overdraw_threshold = None
+                    if EXPORT_OPTIMIZE_OVERDRAW and is_opaque(material):
+                        overdraw_threshold = EXPORT_OVERDRAW_THRESHOLD
+                    optimize_chunk(mesh_chunk, len(meshes), overdraw_threshold)
 
-                bone_data = {
-                    "srcBone": bone,
-                    "matrix": boneMat,
-                    "worldMatrix": worldMat,
-                    "infl": [[] for _ in range(len(meshes))]
-                }
+                meshes.append(mesh_chunk)
+                profiler.count("chunks")
+                profiler.count("vertices", mesh_chunk.num_vertices)
+                profiler.count("chunk_bytes", mesh_chunk.nbytes)
 
-                bones[bone.name] = bone_data
-                if bone.parent == None:
-                    root_bone = bone
+                max_chunk_influences = max(max_chunk_influences, len(vertex_influences["names"]))
 
-    #legacy empty, lattice support
-    for ob in objects:
-        if "b.r." in ob.name:
-            print("Found bone object " + ob.name)
-            
-            if ob.parent == None:
-                boneMat = ob.matrix_world
-            else:
-                boneMat = ob.matrix_parent_inverse @ ob.matrix_world
+                if chunk_index < len(chunks) - 1:
+                    log.debug("Block split.")
 
-            boneMat = EXPORT_GLOBAL_MATRIX @ boneMat
-            worldMat = EXPORT_GLOBAL_MATRIX @ ob.matrix_world
-            
-            bone_data = {
-                "srcBone": ob,
-                "matrix": boneMat,
-                "worldMatrix": worldMat,
-                "infl": [[] for _ in range(len(meshes))]
-            }
+            log.debug("Complete.")
 
-            bones[ob.name] = bone_data
-            if ob.parent == None:
-                root_bone = ob
+            #bm.free()
 
     if EXPORT_KIN:
         anim_framerate = 30
@@ -1014,23 +1302,18 @@ def write_file(self, filepath, objects, scene,
         if EXPORT_ANIM_EVENTS:
             for evt in scene.timeline_markers:
                 name = evt.name
-                type = "generic"
+                is_sound = False
                 if name.startswith("s."):
                     name = name[2:]
-                    type = "sound"
-                
-                data = {
-                    "frame": evt.frame,
-                    "type": type,
-                    "name": name
-                }
-                events.append(data)
+                    is_sound = True
+
+                events.append(KinEvent(evt.frame, name, is_sound))
 
         if EXPORT_BLENDER_FRAMERATE:
             anim_framerate = int(scene.render.fps / scene.render.fps_base)
         
         if not EXPORT_ANIM_NLA:
-            write_kin(os.path.splitext(filepath)[0] + ".kin", bones, active_armature, scene.frame_start, scene.frame_end, anim_framerate, events, EXPORT_GLOBAL_MATRIX, EXPORT_ANIM_SCALE, EXPORT_ANIM_RELATIVE_POSITIONING, EXPORT_ALL_BONES)
+            write_kin(os.path.splitext(filepath)[0] + ".kin", bones, active_armature, scene.frame_start, scene.frame_end, anim_framerate, events, EXPORT_GLOBAL_MATRIX, EXPORT_ANIM_SCALE, EXPORT_ANIM_RELATIVE_POSITIONING, EXPORT_ALL_BONES, EXPORT_ANIM_DIRECT, timeline)
         else:
             for track in active_armature.animation_data.nla_tracks:
                 if len(track.strips) == 0:
@@ -1044,18 +1327,37 @@ def write_file(self, filepath, objects, scene,
                     frame_end = max(frame_end, strip.action_frame_end)
                 
                 track.is_solo = True
-                write_kin(os.path.join(os.path.dirname(filepath), track.name + ".kin"), bones, active_armature, int(frame_start), int(frame_end), anim_framerate, events, EXPORT_GLOBAL_MATRIX, EXPORT_ANIM_SCALE, EXPORT_ANIM_RELATIVE_POSITIONING, EXPORT_ALL_BONES)
+                write_kin(os.path.join(os.path.dirname(filepath), track.name + ".kin"), bones, active_armature, int(frame_start), int(frame_end), anim_framerate, events, EXPORT_GLOBAL_MATRIX, EXPORT_ANIM_SCALE, EXPORT_ANIM_RELATIVE_POSITIONING, EXPORT_ALL_BONES, EXPORT_ANIM_DIRECT, track=track)
                 track.is_solo = False
 
         #reset frame after writing kin, for object transforms
         # scene.frame_set(0)
         scene.frame_set(scene.frame_start)
 
+    if anim_bounds is not None:
+        #NLA tracks are sampled in solo, so the bounds get their own sweep unless the .kin already covered the timeline
+        with profiler.phase("animated_bounds"):
+            if timeline.finish() > 0:
+                scene.frame_set(scene.frame_start)
+
+        if anim_bounds.min is not None:
+            if bounds_set:
+                bounds_min.x = min(bounds_min.x, anim_bounds.min[0])
+                bounds_min.y = min(bounds_min.y, anim_bounds.min[1])
+                bounds_min.z = min(bounds_min.z, anim_bounds.min[2])
+                bounds_max.x = max(bounds_max.x, anim_bounds.max[0])
+                bounds_max.y = max(bounds_max.y, anim_bounds.max[1])
+                bounds_max.z = max(bounds_max.z, anim_bounds.max[2])
+            else:
+                bounds_set = True
+                bounds_min = mathutils.Vector(anim_bounds.min.tolist())
+                bounds_max = mathutils.Vector(anim_bounds.max.tolist())
+
     #Attachment setup
     attachments = []
     for ob in objects:
         if ob.type == 'EMPTY' and 'a.' in ob.name:
-            print("Attachment " + ob.name)
+            log.debug("Attachment " + ob.name)
             attachments.append(ob)
 
             obj_loc = ob.matrix_world.translation
@@ -1074,624 +1376,125 @@ def write_file(self, filepath, objects, scene,
                     bounds_max = mathutils.Vector(obj_loc)
 
 
-    copy_set = set()
-    with open(filepath, "wb") as f:
-        #fw = f.write
-        source_dir = os.path.dirname(bpy.data.filepath)
-        dest_dir = os.path.dirname(filepath)
-
-        #JIRF, filesize
-        f.write('JIRF'.encode('utf-8'))
-        with io.BytesIO() as rf: #resource file
-            rf.write('IDXM'.encode('utf-8'))
-
-            rf.write('INFO'.encode('utf-8'))
-            with io.BytesIO() as info:
-                info_version = 104
-                if EXPORT_EXPLICIT_VERSIONING:
-                    info_version = int(EXPORT_INFO_VERSION)
-                else:
-                    if EXPORT_BOUNDS:
-                        info_version = 104
-                    else:
-                        info_version = 102
-                
-                chunk_ver(info, info_version)
-
-                objLocation, objRotation, objScale = EXPORT_GLOBAL_MATRIX.decompose()
-
-                #Position
-                info.write(struct.pack("<fff", objLocation.x, objLocation.y, objLocation.z))
-                #Rotation
-                info.write(struct.pack("<ffff", objRotation.w, objRotation.x, objRotation.y, objRotation.z))
-                #NumAttributes
-                info.write(struct.pack("<I", len(meshes)))
-
-                if info_version >= 102:
-                    # Nonzero MaxInfluencePerVertex without any bones present causes rendering to fail in JET but not in TANE+.
-                    if root_bone is not None:
-                        #MaxInfluencePerVertex
-                        info.write(struct.pack("<I", max_vert_influences))
-                        #MaxInfluencePerChunk
-                        info.write(struct.pack("<I", max_chunk_influences))
-                    else:
-                        #MaxInfluencePerVertex
-                        info.write(struct.pack("<I", 0))
-                        #MaxInfluencePerChunk
-                        info.write(struct.pack("<I", 0))
-
-                #Bounding Box
-                if info_version >= 104:
-                    info.write(struct.pack("<fff", bounds_min.x, bounds_min.y, bounds_min.z))
-                    info.write(struct.pack("<fff", bounds_max.x, bounds_max.y, bounds_max.z))
-
-                end_chunk(rf, info)
-
-
-            for i, entry in enumerate(meshes):
-
-                obj             = entry["obj"]
-                mat             = entry["material"]
-                verts           = entry["unique_verts"]
-                indices         = entry["indices"]
-                normals         = entry["normals"]
-                face_normals    = entry["face_normals"]
-                face_list       = entry["face_list"]
-                tangents        = entry["tangents"]
-                colors          = entry["colors"]
-                area            = entry["area"]
-                uv_layer        = entry["uv_layer"]
-                objParent       = entry["parent"]
-                parentBoneName  = entry["parent_bone"]
-                is_curve        = entry["is_curve"]
-                max_influence   = entry["max_influence"]
-
-                parentBone = None
-                if parentBoneName in bones:
-                    parentBone = bones[parentBoneName]
-
-                defaultMaterial = bpy.data.materials.new(obj.name + ".m.notex")
-                if mat is None:
-                    mat = defaultMaterial
-                
-                #initial period before material name extension isn't required
-                #TrainzMeshImporter name structure?
-                # filename, CRC32?, material name, extension
-                #*rmines2*4B6A2F83*material #1*m.onetex
-                #*waterglass_left*704EDB8B*bulb*m.onetex
-
-                if not mat.name.endswith("m.notex") and \
-                    not mat.name.endswith("m.onetex") and \
-                    not mat.name.endswith("m.reflect") and \
-                    not mat.name.endswith("m.gloss") and \
-                    not mat.name.endswith("m.tbumptex") and \
-                    not mat.name.endswith("m.tbumpgloss") and \
-                    not mat.name.endswith("m.tbumpenv"):
-                    self.report({'WARNING'}, "Material " + mat.name + " on object " + obj.name + " is missing a valid material extension. This may cause issues in games earlier than TANE. A list of valid legacy material extensions is available here: https://online.ts2009.com/mediaWiki/index.php/Material_Types")
-                
-                rf.write('CHNK'.encode('utf-8'))
-                with io.BytesIO() as attr:
-                    chunk_ver(attr, 100)
-                    #Chunk ID
-                    attr.write(struct.pack("<I", i))
-                    attr.write('MATL'.encode('utf-8'))
-                    with io.BytesIO() as matl:
-                        matl_version = 103
-                        if EXPORT_EXPLICIT_VERSIONING:
-                            matl_version = int(EXPORT_MATL_VERSION)
-                        
-                        chunk_ver(matl, matl_version)
-
-                        # MATL versions:
-                        # 101
-                        # 102 - 101 + properties, opacity
-                        # 103 - same as 102
-                        
-                        if matl_version >= 102:
-                            # Name
-                            jet_str(matl, mat.name)
-
-                            custom_properties = {}
-                            if EXPORT_CUSTOM_PROPERTIES:
-                                for K in mat.keys():
-                                    data = mat[K]
-                                    if K not in '_RNA_UI' and (isinstance(data, float) or isinstance(data, int) or isinstance(data, str) or isinstance(data, bool)):
-                                        if not isinstance(data, str):
-                                            data = str(data)
-                                        custom_properties[K] = data
-                            
-                            #NumProperties
-                            matl.write(struct.pack("<I", len(custom_properties)))
-                            for k in custom_properties:
-                                jet_str(matl, k)
-                                jet_str(matl, custom_properties[k])
-                        
-                        #nodes
-                        mat_wrap = node_shader_utils.PrincipledBSDFWrapper(mat)
-
-                        #TwoSided
-                        matl.write(struct.pack("<I", int(not mat.use_backface_culling)))
-
-                        #Opacity
-                        if matl_version >= 102:
-                            matl.write(struct.pack("<f", mat_wrap.alpha))
-
-                        base_color = mat_wrap.base_color
-                        if mat_wrap.base_color_texture != None and mat_wrap.base_color_texture.image != None:
-                            base_color = [1.0, 1.0, 1.0]
-
-                        #Ambient
-                        matl.write(struct.pack("<fff", base_color[0] if not EXPORT_SUBSURF_AMBIENT or mat_wrap.node_principled_bsdf is None else mat_wrap.node_principled_bsdf.inputs["Subsurface Color"].default_value[0],
-                                                       base_color[1] if not EXPORT_SUBSURF_AMBIENT or mat_wrap.node_principled_bsdf is None else mat_wrap.node_principled_bsdf.inputs["Subsurface Color"].default_value[1],
-                                                       base_color[2] if not EXPORT_SUBSURF_AMBIENT or mat_wrap.node_principled_bsdf is None else mat_wrap.node_principled_bsdf.inputs["Subsurface Color"].default_value[2]))
-                        #Diffuse
-                        matl.write(struct.pack("<fff", base_color[0],
-                                                       base_color[1],
-                                                       base_color[2]))
-                        #Specular
-                        if isinstance(mat_wrap.specular_tint, Color):
-                            # Blender 4.0 - specular tint is now a Color
-                            matl.write(struct.pack("<fff", mat_wrap.specular_tint[0] * mat_wrap.specular,
-                                                           mat_wrap.specular_tint[1] * mat_wrap.specular,
-                                                           mat_wrap.specular_tint[2] * mat_wrap.specular))
-                        else:
-                            matl.write(struct.pack("<fff", bl_math.lerp(mat_wrap.specular, mat_wrap.specular * base_color[0], mat_wrap.specular_tint),
-                                                        bl_math.lerp(mat_wrap.specular, mat_wrap.specular * base_color[1], mat_wrap.specular_tint),
-                                                        bl_math.lerp(mat_wrap.specular, mat_wrap.specular * base_color[2], mat_wrap.specular_tint)))
-                        
-                        #Emissive
-                        if hasattr(mat_wrap, 'emission_strength'):
-                            emission_strength = mat_wrap.emission_strength
-                        else:
-                            emission_strength = 1.0
-
-                        emission = [emission_strength * c for c in mat_wrap.emission_color[:3]]
-                        matl.write(struct.pack("<fff", emission[0],
-                                                       emission[1],
-                                                       emission[2]))
-                        
-                        #Shininess
-                        shininess = (1.0 - mat_wrap.roughness) * 128.0
-                        shininess = min(max(shininess, 10.0), 128.0)
-                        matl.write(struct.pack("<f", shininess))
-
-                        #Texture setup
-                        #texCount = 0
-                        textures = []
-
-                        image_source = [
-                            None, #TEX_Ambient
-                            "base_color_texture", #TEX_Diffuse
-                            "specular_texture", #TEX_Specular
-                            "roughness_texture", #TEX_Shine
-                            None, #TEX_Shinestrength
-                            "emission_color_texture" if emission_strength != 0.0 else None, #TEX_Selfillum
-                            "alpha_texture", #TEX_Opacity
-                            None, #TEX_Filtercolor
-                            "normalmap_texture", #TEX_Bump,
-                            "metallic_texture", #TEX_Reflect,
-                            "ior_texture", #TEX_Refract,
-                            None, #TEX_Displacement
-                            ]
-                        for type, entry in enumerate(image_source):
-                            if entry is None:
-                                continue
-                            tex_wrap = getattr(mat_wrap, entry, None)
-                            if tex_wrap is None:
-                                continue
-                            image = tex_wrap.image
-                            if image is None:
-                                continue
-                            is_npo2 = not power_of_two(image.size[0]) or not power_of_two(image.size[1])
-                            if is_npo2:
-                                self.report({'WARNING'}, 'Texture ' + image.filepath + ' is not a power of two. Consider resizing it.')
-
-                            if not EXPORT_CONVERT_TGA:
-                                filepath = io_utils.path_reference(image.filepath, source_dir, dest_dir,
-                                                        EXPORT_PATH_MODE, "", copy_set, image.library)
-                            else:
-                                # Windows sucks.
-                                image_path = image.filepath.lstrip('\\/')
-
-                                # Resave the image.
-                                basepath = os.path.basename(image_path).lower()
-                                filepath = dest_dir + '\\' + os.path.splitext(basepath)[0] + ".tga"
-                                # output_image = image.copy()
-
-                                # Don't allow images bigger than 4k.
-                                # if output_image.size[0] > 2048 or output_image.size[1] > 2048:
-                                #     output_image.scale(2048, 2048)
-                                    
-                                # output_image.file_format = 'TARGA_RAW'
-                                # print(f"Saved image to {filepath}, src={image_path}")
-                                # output_image.save_render(filepath=filepath)
-
-                                # bpy.data.images.remove(output_image)
-
-                                convert_image(image, filepath)
-                                # print(f"Saved image to {filepath}, src={image_path}")
-                                
-                            
-                            strength = 1.0
-
-                            #don't modify strength for tbumptex shinestrength
-                            if entry == "normalmap_texture" and type == 8:
-                                strength = 0.2 * mat_wrap.normalmap_strength
-
-                            # TODO: adjust strength value for TEX_Reflect (m.reflect)
-                            
-                            if EXPORT_TEXTURETXT:
-                                texturepath = texture_file(type, filepath, dest_dir, is_npo2, image.depth == (128 if image.is_float else 32))
-                            else:
-                                basename = os.path.basename(filepath).lower()
-                                texturepath = dest_dir + '\\' + os.path.splitext(basename)[0] + ".texture"
-
-                            textures.append([type, texturepath, strength])
-
-                        #NumTextures
-                        matl.write(struct.pack("<I", len(textures)))
-                        for tex in textures:
-                            #Type
-                            matl.write(struct.pack("<I", tex[0]))
-                            #FileName
-                            jet_str(matl, tex[1])
-                            #Amount
-                            matl.write(struct.pack("<f", tex[2]))
-
-                        end_chunk(attr, matl)
-
-                    attr.write('GEOM'.encode('utf-8'))
-                    with io.BytesIO() as geom:
-                        geom_version = 201
-                        if EXPORT_EXPLICIT_VERSIONING:
-                            geom_version = int(EXPORT_GEOM_VERSION)
-                        else:
-                            if EXPORT_VERTEX_COLORS:
-                                geom_version = 104
-                        
-                        chunk_ver(geom, geom_version)
-                        
-                        # GEOM versions:
-                        # 103 - Multiple texturesets
-                        # 104 - 103 + vertex colors
-                        # 200 - Parent bones
-                        # 201 - 200 + tangent data
-
-                        # I've only ever seen 103 and 104 show up in Bridge It - if any legacy Trainz assets actually use these let me know
-
-                        #Flags
-                        if not is_curve:
-                            if geom_version >= 101:
-                                geom.write(struct.pack("<I", 4)) #GC_TRIANGLES
-                        else:
-                            if geom_version >= 101:
-                                geom.write(struct.pack("<I", 2)) #GC_LINES
-                            else:
-                                # Curves not supported.
-                                self.report({'WARNING'}, 'Curves not supported in GEOM v100!')
-                        
-                        # UseTangents (201)
-                        if geom_version >= 201:
-                            if EXPORT_TANGENTS and len(tangents) > 0:
-                                geom.write(struct.pack("<I", 1))
-                            else:
-                                geom.write(struct.pack("<I", 0))
-
-                        # Area
-                        geom.write(struct.pack("<f", area))
-
-                        # NumVertices
-                        geom.write(struct.pack("<I", len(verts)))
-
-                        # NumPrimitives
-                        # NOTE: NumPrimitives is supposed to be geom_version >= 101 according to JET docs,
-                        # but D20 meshes are v100 and have this field.
-                        if not is_curve:
-                            geom.write(struct.pack("<I", len(indices) // 3))
-                        else:
-                            geom.write(struct.pack("<I", len(indices) // 2))
-                        
-                        #NumIndices
-                        if geom_version >= 101:
-                            geom.write(struct.pack("<I", len(indices)))
-                        
-                        #NumFaceNormals
-                        if geom_version >= 101:
-                            geom.write(struct.pack("<I", len(face_normals)))
-
-                        #NumTexCoordSets
-                        if geom_version == 103 or geom_version == 104:
-                            geom.write(struct.pack("<I", 1))
-                        
-                        #Required for games pre-TANE, otherwise mesh refuses to animate
-                        #MaxInfluence (102)
-                        if geom_version >= 102:
-                            geom.write(struct.pack("<I", max_influence))
-
-                        #Parent (200)
-                        has_chunk_parent = False
-                        inv_parent_transform = None
-                        if geom_version >= 200:
-                            if EXPORT_SKEL and parentBone != None:
-                                jet_str(geom, parentBoneName)
-                                
-                                inv_parent_transform = parentBone["worldMatrix"].inverted()
-                                has_chunk_parent = True
-                            elif EXPORT_SKEL and objParent != None:
-                                jet_str(geom, objParent.name)
-
-                                #OLD METHOD
-                                #parentMat = EXPORT_GLOBAL_MATRIX @ objParent.matrix_world
-                                #co_vector = parentMat.inverted() @ co_vector
-                                parentLoc, parentRot, parentScale = objParent.matrix_world.decompose()
-
-                                locMat = mathutils.Matrix.Translation(parentLoc)
-                                rotMat = parentRot.to_matrix().to_4x4()
-                                inv_parent_transform = (EXPORT_GLOBAL_MATRIX @ locMat @ rotMat).inverted()
-
-                                has_chunk_parent = True
-                            else:
-                                geom.write(struct.pack("<I", 0))
-
-                        #Vertices
-                        for idx, vert in enumerate(verts):
-                            co = vert[0]
-                            texcoord = vert[1]
-                            influences = vert[2]
-
-                            #geom.write(struct.pack("<fff", co[0], co[1], co[2]))
-                            #geom.write(struct.pack("<ff", texcoord[0], 1.0 - texcoord[1]))
-
-                            co_vector = mathutils.Vector((co[0], co[1], co[2], 1.0))
-                            if has_chunk_parent:
-                                co_vector = inv_parent_transform @ co_vector
-
-                            if not math.isfinite(co_vector[0]) or not math.isfinite(co_vector[1]) or not math.isfinite(co_vector[2]):
-                                self.report({'WARNING'}, 'NaN position data detected in chunk ' + str(i) + " {" + obj.name + "}")
-                                if not math.isfinite(co_vector[0]): co_vector[0] = 0.0
-                                if not math.isfinite(co_vector[1]): co_vector[1] = 0.0
-                                if not math.isfinite(co_vector[2]): co_vector[2] = 0.0
-
-                            if not math.isfinite(texcoord[0]) or not math.isfinite(texcoord[1]):
-                                self.report({'WARNING'}, 'NaN UV data detected in chunk ' + str(i) + " {" + obj.name + "}")
-                                if not math.isfinite(texcoord[0]): texcoord[0] = 0.0
-                                if not math.isfinite(texcoord[1]): texcoord[1] = 0.0
-                                
-                            #co_vector = EXPORT_GLOBAL_MATRIX @ obj.matrix_parent_inverse @ co_vector
-
-                            geom.write(struct.pack("<fff", co_vector[0], co_vector[1], co_vector[2]))
-                            geom.write(struct.pack("<ff", texcoord[0], 1.0 - texcoord[1]))
-
-                            #BoneTransform = None #identity?
-                            for name, weight in influences.items():
-                                if name in bones:
-                                    bonegroup = bones[name]
-                                    bone = bonegroup["srcBone"]
-                                    chunkinfl = bonegroup["infl"][i]
-
-                                    #boneMat = bone.matrix_local.inverted()
-                                    boneMat = bonegroup["worldMatrix"].inverted()
-                                    chunkinfl.append([idx, weight, boneMat @ co_vector]) #boneMat @ co_vector
-
-                        #Indices
-                        for idx in indices:
-                            geom.write(struct.pack("<H", idx))
-                        
-                        #VertexNormals
-                        for normal in normals:
-                            co_normal = mathutils.Vector((normal[0], normal[1], normal[2]))
-                            if has_chunk_parent:
-                                co_normal = (inv_parent_transform.to_3x3() @ co_normal).normalized()
-
-                            if not math.isfinite(co_normal[0]) or not math.isfinite(co_normal[1]) or not math.isfinite(co_normal[2]):
-                                self.report({'WARNING'}, 'NaN normal data detected in chunk ' + str(i) + " {" + obj.name + "}")
-                                if not math.isfinite(co_normal[0]): co_normal[0] = 0.0
-                                if not math.isfinite(co_normal[1]): co_normal[1] = 0.0
-                                if not math.isfinite(co_normal[2]): co_normal[2] = 0.0
-
-                            geom.write(struct.pack("<fff", co_normal[0], co_normal[1], co_normal[2]))
-                        
-                        #FaceNormals
-                        if geom_version >= 101:
-                            for normal in face_normals:
-                                co_normal = mathutils.Vector((normal[0], normal[1], normal[2]))
-                                if has_chunk_parent:
-                                    co_normal = (inv_parent_transform.to_3x3() @ co_normal).normalized()
-                                
-                                if not math.isfinite(co_normal[0]) or not math.isfinite(co_normal[1]) or not math.isfinite(co_normal[2]):
-                                    self.report({'WARNING'}, 'NaN face normal data detected in chunk ' + str(i) + " {" + obj.name + "}")
-                                    if not math.isfinite(co_normal[0]): co_normal[0] = 0.0
-                                    if not math.isfinite(co_normal[1]): co_normal[1] = 0.0
-                                    if not math.isfinite(co_normal[2]): co_normal[2] = 0.0
-                                
-                                geom.write(struct.pack("<fff", co_normal[0], co_normal[1], co_normal[2]))
-                        
-                        #VertexColors (104 only)
-                        if geom_version == 104 and EXPORT_VERTEX_COLORS and len(colors) > 0:
-                            for color in colors:
-                                geom.write(struct.pack("<BBBB", int(color[0] * 255.0), int(color[1] * 255.0), int(color[2] * 255.0), int(color[3] * 255.0)))
-                        
-                        #Tangents (201)
-                        if geom_version >= 201 and EXPORT_TANGENTS and len(tangents) > 0:
-                            for tangent in tangents:
-                                # original indexed mesh tangents were left handed whereas Blender uses a right handed coordinate system.
-                                # so flip the tangent sign here to compensate.
-                                co_tangent = -mathutils.Vector((tangent[0], tangent[1], tangent[2]))
-                                if has_chunk_parent:
-                                    co_tangent = (inv_parent_transform.to_3x3() @ co_tangent).normalized()
-                                
-                                if not math.isfinite(co_tangent[0]) or not math.isfinite(co_tangent[1]) or not math.isfinite(co_tangent[2]):
-                                    self.report({'WARNING'}, 'NaN tangent data detected in chunk ' + str(i) + " {" + obj.name + "}")
-                                    if not math.isfinite(co_tangent[0]): co_tangent[0] = 0.0
-                                    if not math.isfinite(co_tangent[1]): co_tangent[1] = 0.0
-                                    if not math.isfinite(co_tangent[2]): co_tangent[2] = 0.0
-                                
-                                geom.write(struct.pack("<fff", co_tangent[0], co_tangent[1], co_tangent[2]))
-
-                        #bm.free()
-
-                        end_chunk(attr, geom)
-                    
-                    if EXPORT_NEIGHBOR_INFO:
-                        attr.write('NINF'.encode('utf-8'))
-                        with io.BytesIO() as ninf:
-                            chunk_ver(ninf, 100)
-                            for face in face_list:
-                                neighbors = neighbor_map[face]
-                                for i in range(3):
-                                    primitiveIndex = 0xFFFF
-                                    neighborChunkIdx = 0xFFFF
-                                    if i < len(neighbors):
-                                        face_data = face_2_index_map[neighbors[i]]
-                                        primitiveIndex = face_data["index"]
-                                        neighborChunkIdx = face_data["attribute"]
-                                    
-                                    ninf.write(struct.pack("<H", primitiveIndex))
-                                    ninf.write(struct.pack("<H", neighborChunkIdx))
-                            
-                            end_chunk(attr, ninf)
-                    
-                    end_chunk(rf, attr)
-                bpy.data.materials.remove(defaultMaterial)
-            
-            if EXPORT_SKEL and EXPORT_KIN and root_bone is not None:
-                rf.write('SKEL'.encode('utf-8'))
-                with io.BytesIO() as skel:
-                    chunk_ver(skel, 100)
-                    # if root_bone is not None:
-                    recursive_writebone_skel(skel, root_bone, active_armature, EXPORT_GLOBAL_MATRIX, EXPORT_ALL_BONES)
-                    end_chunk(rf, skel)
-            else:
-                rf.write('INFL'.encode('utf-8'))
-                with io.BytesIO() as infl:
-                    chunk_ver(infl, 100)
-
-                    #NumBones
-                    infl.write(struct.pack("<I", len(bones)))
-                    #Bones
-                    for key in bones:
-                        bonegroup = bones[key]
-                        bone = bonegroup["srcBone"]
-                        chunkinfl = bonegroup["infl"] # per chunk influences
-
-                        #Name
-                        bone_name = bone.name
-                        if not bone_name.startswith("b.r."):
-                            bone_name = "b.r." + bone_name
-                        jet_str(infl, bone_name)
-
-                        #Parent
-                        if bone.parent != None:
-                            parent_name = bone.parent.name
-                            if not parent_name.startswith("b.r."):
-                                parent_name = "b.r." + parent_name
-                            jet_str(infl, parent_name)
-                        else:
-                            infl.write(struct.pack("<I", 0))
-
-
-                        #boneMat = bone.matrix_local
-                        loc, rot, scale = bonegroup["matrix"].decompose()
-
-                        #rot = mathutils.Quaternion()
-
-                        #LocalPosition
-                        #infl.write(struct.pack("<fff", bone.head[0], bone.head[1], bone.head[2]))
-                        infl.write(struct.pack("<fff", loc[0], loc[1], loc[2]))
-                        print("bone " + bone.name + " location: " + str(loc[0]) + " " + str(loc[1]) + " " + str(loc[2]))
-                        #infl.write(struct.pack("<fff", 0.0, 0.0, 5.0))
-                        #LocalOrientation
-                        print("bone " + bone.name + " rotation: " + str(rot.x) + " " + str(rot.y) + " " + str(rot.z) + " " + str(rot.w))
-
-                        rotationMat = rot.to_matrix().transposed()
-                        #rotationMat = rot.to_matrix()
-                        infl.write(struct.pack("<fffffffff", *rotationMat[0], *rotationMat[1], *rotationMat[2]))
-
-                        necessary_infl = []
-                        for influencelist in chunkinfl:
-                            #having this breaks stuff
-                            #if len(influencelist) > 0:
-                            necessary_infl.append(influencelist)
-
-                        #NumInfluences
-                        infl.write(struct.pack("<I", len(necessary_infl)))
-                        #Influences
-                        for i, influencelist in enumerate(necessary_infl):
-                            #ChunkIndex
-                            infl.write(struct.pack("<I", i))
-                            #NumVertices
-                            infl.write(struct.pack("<I", len(influencelist)))
-                            for influence in influencelist:
-                                #Index
-                                infl.write(struct.pack("<I", influence[0]))
-                                #Weight
-                                infl.write(struct.pack("<f", influence[1]))
-                                #Position
-                                vertpos = influence[2]
-                                infl.write(struct.pack("<fff", vertpos[0], vertpos[1], vertpos[2]))
-                    end_chunk(rf, infl)
-
-            #AttachmentInfo
-            if len(attachments) > 0:
-                rf.write('ATCH'.encode('utf-8'))
-                with io.BytesIO() as atch:
-                    chunk_ver(atch, 100)
-                    #NumAttachments
-                    atch.write(struct.pack("<I", len(attachments)))
-                    #Attachments
-                    for att in attachments:
-
-                        att_name = att.name
-
-                        att_parent_name = ""
-                        if att.parent is not None and "b.r." in att.parent.name:
-                            att_parent_name = att.parent.name
-                        elif att.parent_bone is not None and "b.r." in att.parent_bone:
-                            att_parent_name = att.parent_bone
-                        
-                        #attachment parent bones
-                        if att.parent is not None:
-                            if(not "/" in att_name):
-                                att_name = "a." + att_parent_name[2:] + "/" + att_name
-                            
-                        #Name
-                        jet_str(atch, att_name)
-
-                        attMat = EXPORT_GLOBAL_MATRIX @ att.matrix_world
-                        loc, rot, scale = attMat.decompose()
-                        rotationMat = rot.to_matrix().transposed()
-                        #Orientation
-                        atch.write(struct.pack("<fffffffff", *rotationMat[0], *rotationMat[1], *rotationMat[2]))
-                        #Position
-                        atch.write(struct.pack("<fff", loc[0], loc[1], loc[2]))
-
-                    end_chunk(rf, atch)
-
-
-                #me.transform(EXPORT_GLOBAL_MATRIX @ ob_mat)
-
-            #with io.BytesIO() as attr:
-
-            #for i, ob_main in enumerate(objects):
-            end_chunk(f, rf)
-
-        #fw('IDXM'.encode('utf-8'))
-    #copy images?
-    io_utils.path_reference_copy(copy_set)
-    print("done")
+    info = InfoData(info_version, objLocation[:], (objRotation.w, objRotation.x, objRotation.y, objRotation.z), len(meshes),
+                    bounds_min=bounds_min[:], bounds_max=bounds_max[:])
+
+    # Nonzero MaxInfluencePerVertex without any bones present causes rendering to fail in JET but not in TANE+.
+    if root_bone is not None:
+        info.max_vert_influences = max_vert_influences
+        info.max_chunk_influences = max_chunk_influences
 
+    if stream is None:
+        chunks = [chunk_data(i, mesh_chunk) for i, mesh_chunk in enumerate(meshes)]
+        if EXPORT_NEIGHBOR_INFO:
+            #every chunk has been assigned by now, so neighbors in later chunks resolve too
+            for mesh_chunk, chunk in zip(meshes, chunks):
+                chunk.neighbors = chunk_neighbors(mesh_chunk.face_parts, mesh_chunk.face_order)
+    else:
+        meshes.write_neighbors()
 
+    skeleton = None
+    influences = []
+    if EXPORT_SKEL and EXPORT_KIN and root_bone is not None:
+        # if root_bone is not None:
+        skeleton = recursive_skel_bone(root_bone, active_armature, EXPORT_GLOBAL_MATRIX, EXPORT_ALL_BONES)
+    else:
+        for key in bones:
+            bonegroup = bones[key]
+            bone = bonegroup["srcBone"]
 
+            parent_name = None
+            if bone.parent != None:
+                parent_name = jet_bone_name(bone.parent.name)
+
+            #boneMat = bone.matrix_local
+            loc, rot, scale = bonegroup["matrix"].decompose()
+
+            #rot = mathutils.Quaternion()
+
+            log.debug("bone " + bone.name + " location: " + str(loc[0]) + " " + str(loc[1]) + " " + str(loc[2]))
+            log.debug("bone " + bone.name + " rotation: " + str(rot.x) + " " + str(rot.y) + " " + str(rot.z) + " " + str(rot.w))
+
+            rotationMat = rot.to_matrix().transposed()
+            #rotationMat = rot.to_matrix()
+
+            influences.append(InflBone(jet_bone_name(bone.name), parent_name, loc[:],
+                                       (*rotationMat[0], *rotationMat[1], *rotationMat[2]), bonegroup["infl"]))
+
+    atch = []
+    for att in attachments:
+
+        att_name = att.name
+
+        att_parent_name = ""
+        if att.parent is not None and "b.r." in att.parent.name:
+            att_parent_name = att.parent.name
+        elif att.parent_bone is not None and "b.r." in att.parent_bone:
+            att_parent_name = att.parent_bone
+        
+        #attachment parent bones
+        if att.parent is not None:
+            if(not "/" in att_name):
+                att_name = "a." + att_parent_name[2:] + "/" + att_name
+
+        attMat = EXPORT_GLOBAL_MATRIX @ att.matrix_world
+        loc, rot, scale = attMat.decompose()
+        rotationMat = rot.to_matrix().transposed()
+        atch.append(Attachment(att_name, (*rotationMat[0], *rotationMat[1], *rotationMat[2]), loc[:]))
+
+    with profiler.phase("write_im"):
+        if stream is None:
+            with open(filepath, "wb") as f:
+                warnings = im_writer.write_im(f, info, chunks, skeleton, influences, atch)
+            for i, warning in warnings:
+                self.report({'WARNING'}, warning)
+        else:
+            stream.finish(info, skeleton, influences, atch, influence_spool)
+
+    #copy images?
+    io_utils.path_reference_copy(copy_set)
+
+    if tga_pool is not None:
+        with profiler.phase("texture_wait"):
+            tga_errors = tga_pool.wait()
+        for path, error in tga_errors:
+            self.report({'WARNING'}, 'Could not write texture ' + path + ': ' + str(error))
+    if texture_cache is not None:
+        texture_cache.save()
+    if object_cache is not None:
+        object_cache.prune()
+        log.info(f"Object cache: {object_cache.hits} objects reused, {object_cache.misses} rebuilt, {object_cache.removed} stale entries removed")
+    log.info("Exported " + filepath)
+
+
+
+def configure_logging(level):
+    """Show the add-on's log records at level and above on the console."""
+    package_log = logging.getLogger(__package__)
+    package_log.setLevel(level)
+    if not any(getattr(handler, "im_export", False) for handler in package_log.handlers):
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(levelname)s %(name)s: %(message)s"))
+        handler.im_export = True
+        package_log.addHandler(handler)
+        package_log.propagate = False
 
 def _write(self, context, filepath,
            EXPORT_APPLY_MODIFIERS,
            EXPORT_CURVES,
            EXPORT_TEXTURETXT,
            EXPORT_CONVERT_TGA,
+           EXPORT_TEXTURE_CACHE,
            EXPORT_TANGENTS,
            EXPORT_BOUNDS,
            EXPORT_VERTEX_COLORS,
            EXPORT_NEIGHBOR_INFO,
+           EXPORT_OPTIMIZE_VERTEX_CACHE,
+           EXPORT_OPTIMIZE_OVERDRAW,
+           EXPORT_OVERDRAW_THRESHOLD,
+           EXPORT_SPATIAL_SPLIT,
+           EXPORT_OBJECT_CACHE,
+           EXPORT_STREAM,
            EXPORT_WIDE_STRINGS,
            EXPORT_SUBSURF_AMBIENT,
            EXPORT_CUSTOM_PROPERTIES,
@@ -1703,6 +1506,7 @@ def _write(self, context, filepath,
            EXPORT_ALL_BONES,
            EXPORT_ANIM_NLA,
            EXPORT_ANIM_EVENTS,
+           EXPORT_ANIM_DIRECT,
            EXPORT_EXPLICIT_VERSIONING,
            EXPORT_INFO_VERSION,
            EXPORT_MATL_VERSION,
@@ -1710,10 +1514,13 @@ def _write(self, context, filepath,
            EXPORT_SEL_ONLY,
            EXPORT_GLOBAL_MATRIX,
            EXPORT_PATH_MODE,
+           EXPORT_LOG_LEVEL,
+           EXPORT_PROFILE,
+           EXPORT_CPROFILE,
            ):
-    
-    global GLOBAL_WIDE_STRINGS
-    GLOBAL_WIDE_STRINGS = EXPORT_WIDE_STRINGS
+
+    configure_logging(EXPORT_LOG_LEVEL)
+    im_writer.GLOBAL_WIDE_STRINGS = EXPORT_WIDE_STRINGS
 
     base_name, ext = os.path.splitext(filepath)
     context_name = [base_name, '', '', ext]  # Base name, scene name, frame number, extension
@@ -1735,35 +1542,62 @@ def _write(self, context, filepath,
 
     #orig_frame = scene.frame_current
     full_path = ''.join(context_name)
+
+    export_profile = profiler.start(trace_memory=True) if EXPORT_PROFILE else None
+    cprofile = None
+    if EXPORT_CPROFILE:
+        cprofile = cProfile.Profile()
+        cprofile.enable()
+    try:
         # EXPORT THE FILE.
-    write_file(self, full_path, objects, scene,
-               EXPORT_APPLY_MODIFIERS,
-               EXPORT_CURVES,
-               EXPORT_TEXTURETXT,
-               EXPORT_CONVERT_TGA,
-               EXPORT_TANGENTS,
-               EXPORT_BOUNDS,
-               EXPORT_VERTEX_COLORS,
-               EXPORT_NEIGHBOR_INFO,
-               EXPORT_SUBSURF_AMBIENT,
-               EXPORT_CUSTOM_PROPERTIES,
-               EXPORT_KIN,
-               EXPORT_BLENDER_FRAMERATE,
-               EXPORT_SKEL,
-               EXPORT_ANIM_SCALE,
-               EXPORT_ANIM_RELATIVE_POSITIONING,
-               EXPORT_ALL_BONES,
-               EXPORT_ANIM_NLA,
-               EXPORT_ANIM_EVENTS,
-               EXPORT_EXPLICIT_VERSIONING,
-               EXPORT_INFO_VERSION,
-               EXPORT_MATL_VERSION,
-               EXPORT_GEOM_VERSION,
-               EXPORT_SEL_ONLY,
-               EXPORT_GLOBAL_MATRIX,
-               EXPORT_PATH_MODE,
-               #progress,
-               )
+        with contextlib.ExitStack() as cleanup:
+            write_file(self, full_path, objects, scene, cleanup,
+                       EXPORT_APPLY_MODIFIERS,
+                       EXPORT_CURVES,
+                       EXPORT_TEXTURETXT,
+                       EXPORT_CONVERT_TGA,
+                       EXPORT_TEXTURE_CACHE,
+                       EXPORT_TANGENTS,
+                       EXPORT_BOUNDS,
+                       EXPORT_VERTEX_COLORS,
+                       EXPORT_NEIGHBOR_INFO,
+                       EXPORT_OPTIMIZE_VERTEX_CACHE,
+                       EXPORT_OPTIMIZE_OVERDRAW,
+                       EXPORT_OVERDRAW_THRESHOLD,
+                       EXPORT_SPATIAL_SPLIT,
+                       EXPORT_OBJECT_CACHE,
+                       EXPORT_STREAM,
+                       EXPORT_SUBSURF_AMBIENT,
+                       EXPORT_CUSTOM_PROPERTIES,
+                       EXPORT_KIN,
+                       EXPORT_BLENDER_FRAMERATE,
+                       EXPORT_SKEL,
+                       EXPORT_ANIM_SCALE,
+                       EXPORT_ANIM_RELATIVE_POSITIONING,
+                       EXPORT_ALL_BONES,
+                       EXPORT_ANIM_NLA,
+                       EXPORT_ANIM_EVENTS,
+                       EXPORT_ANIM_DIRECT,
+                       EXPORT_EXPLICIT_VERSIONING,
+                       EXPORT_INFO_VERSION,
+                       EXPORT_MATL_VERSION,
+                       EXPORT_GEOM_VERSION,
+                       EXPORT_SEL_ONLY,
+                       EXPORT_GLOBAL_MATRIX,
+                       EXPORT_PATH_MODE,
+                       #progress,
+                       )
+    finally:
+        if cprofile is not None:
+            cprofile.disable()
+            cprofile.dump_stats(full_path + ".prof")
+            log.info("cProfile stats written to " + full_path + ".prof")
+        if export_profile is not None:
+            profiler.stop()
+            export_profile.write(full_path + ".profile.json")
+            for line in export_profile.summary_lines():
+                log.info(line)
+            log.info(f"Export profile written to {full_path}.profile.json ({export_profile.total_time:.3f}s total)")
 
 
 
@@ -1775,10 +1609,17 @@ def save(self, context,
          export_curves=False,
          use_texturetxt=True,
          convert_tga=False,
+         use_texture_cache=False,
          export_tangents=True,
          export_bounds=True,
          export_vertex_colors=False,
          export_neighbor_info=False,
+         optimize_vertex_cache=False,
+         optimize_overdraw=False,
+         overdraw_threshold=1.05,
+         spatial_split=False,
+         use_object_cache=False,
+         use_streaming=False,
          use_wide_strings=False,
          subsurf_ambient=False,
          mat_custom_properties=False,
@@ -1790,12 +1631,16 @@ def save(self, context,
          export_all_bones=False,
          use_nla=False,
          export_events=True,
+         use_direct_sampling=False,
          use_explicit_versioning=False,
          info_version=None,
          matl_version=None,
          geom_version=None,
          global_matrix=None,
-         path_mode='AUTO'
+         path_mode='AUTO',
+         log_level='INFO',
+         write_profile=False,
+         use_cprofile=False,
          ):
 
     _write(self, context, filepath,
@@ -1803,10 +1648,17 @@ def save(self, context,
            EXPORT_CURVES=export_curves,
            EXPORT_TEXTURETXT=use_texturetxt,
            EXPORT_CONVERT_TGA=convert_tga,
+           EXPORT_TEXTURE_CACHE=use_texture_cache,
            EXPORT_TANGENTS=export_tangents,
            EXPORT_BOUNDS=export_bounds,
            EXPORT_VERTEX_COLORS=export_vertex_colors,
            EXPORT_NEIGHBOR_INFO=export_neighbor_info,
+           EXPORT_OPTIMIZE_VERTEX_CACHE=optimize_vertex_cache,
+           EXPORT_OPTIMIZE_OVERDRAW=optimize_overdraw,
+           EXPORT_OVERDRAW_THRESHOLD=overdraw_threshold,
+           EXPORT_SPATIAL_SPLIT=spatial_split,
+           EXPORT_OBJECT_CACHE=use_object_cache,
+           EXPORT_STREAM=use_streaming,
            EXPORT_WIDE_STRINGS=use_wide_strings,
            EXPORT_SUBSURF_AMBIENT=subsurf_ambient,
            EXPORT_CUSTOM_PROPERTIES=mat_custom_properties,
@@ -1818,6 +1670,7 @@ def save(self, context,
            EXPORT_ALL_BONES=export_all_bones,
            EXPORT_ANIM_NLA=use_nla,
            EXPORT_ANIM_EVENTS=export_events,
+           EXPORT_ANIM_DIRECT=use_direct_sampling,
            EXPORT_EXPLICIT_VERSIONING=use_explicit_versioning,
            EXPORT_INFO_VERSION=info_version,
            EXPORT_MATL_VERSION=matl_version,
@@ -1825,6 +1678,9 @@ def save(self, context,
            EXPORT_SEL_ONLY=use_selection,
            EXPORT_GLOBAL_MATRIX=global_matrix,
            EXPORT_PATH_MODE=path_mode,
+           EXPORT_LOG_LEVEL=log_level,
+           EXPORT_PROFILE=write_profile,
+           EXPORT_CPROFILE=use_cprofile,
            )
 
     return {'FINISHED'}
@@ -0,0 +1,814 @@
+"""Serialization core for Auran JET indexed mesh (.im) and animation (.kin) files.
+
+Nothing in here touches bpy or mathutils - the Blender side of the exporter gathers
+plain Python values/arrays into the dataclasses below and hands them over, so the
+writer can be imported, profiled and reused headless (add the add-on directory to
+sys.path and ``import im_writer``).
+"""
+
+import contextlib
+import functools
+import io
+import os
+import struct
+import tempfile
+from dataclasses import dataclass, field, replace
+
+import numpy as np
+
+GLOBAL_WIDE_STRINGS = False
+
+@functools.lru_cache(maxsize=4096)
+def _encode_jet_str(str, wide):
+    encoded_name = bytearray(str.encode('utf-16le' if wide else 'utf-8'))
+
+    #wacky Jet byte alignment
+    str_length = len(encoded_name)
+
+    numTerminators = 4 - str_length % 4 if str_length % 4 != 0 else 0
+    encoded_name += bytes('\0' * numTerminators, 'utf-8')
+
+    len_bytes = bytearray(struct.pack("<I", len(encoded_name)))
+    if(wide):
+        len_bytes[3] = 0x40
+
+    return bytes(len_bytes + encoded_name)
+
+def jet_str(f, str, wide=False):
+    global GLOBAL_WIDE_STRINGS
+    wide = wide or GLOBAL_WIDE_STRINGS
+
+    #bone, material and texture names repeat a lot, so the encoding is memoized
+    f.write(_encode_jet_str(str, wide))
+
+def normalize_rows(vectors):
+    """Row-wise normalize a float32 (N, K) array the same way mathutils' Vector.normalized() does.
+
+    The squared length is accumulated in double from float products, the reciprocal length is
+    applied in float precision and vectors too short to normalize become zero.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    sq = np.zeros(len(vectors), dtype=np.float64)
+    for k in reversed(range(vectors.shape[1])):
+        sq += (vectors[:, k] * vectors[:, k]).astype(np.float64)
+
+    valid = sq > 1.0e-35
+    inv_len = np.zeros(len(vectors), dtype=np.float32)
+    inv_len[valid] = np.float32(1.0) / np.sqrt(sq[valid]).astype(np.float32)
+    return vectors * inv_len[:, None]
+
+def transform_rows(matrix, vectors, w=1.0):
+    """Multiply (N, 3) float32 vectors by a 4x4 (w=1.0, points) or 3x3 (w=None, directions) matrix.
+
+    Like mathutils' Matrix @ Vector, products are taken in float precision and summed in double.
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if w is not None:
+        vectors = np.concatenate([vectors, np.full((len(vectors), 1), w, dtype=np.float32)], axis=1)
+    size = vectors.shape[1]
+
+    out = np.empty((len(vectors), 3), dtype=np.float32)
+    for row in range(3):
+        dot = np.zeros(len(vectors), dtype=np.float64)
+        for col in range(size):
+            dot += (matrix[row, col] * vectors[:, col]).astype(np.float64)
+        out[:, row] = dot
+    return out
+
+def chunk_ver(f, ver):
+    f.write(struct.pack("<I", ver))
+
+def end_chunk(f, chunk):
+    f.write(struct.pack("<I", chunk.tell()))
+    f.write(chunk.getbuffer())
+
+@contextlib.contextmanager
+def jet_chunk(f, tag):
+    """Write a tagged, size prefixed chunk straight into f.
+
+    A placeholder size is written first and back-patched with a seek once the body is done,
+    so nested chunks never get copied into their parents. Non-seekable outputs fall back to
+    buffering the chunk in memory.
+    """
+    f.write(tag.encode('utf-8'))
+    if not f.seekable():
+        with io.BytesIO() as chunk:
+            yield chunk
+            end_chunk(f, chunk)
+        return
+
+    size_pos = f.tell()
+    f.write(b'\0\0\0\0')
+    yield f
+    end_pos = f.tell()
+    f.seek(size_pos)
+    f.write(struct.pack("<I", end_pos - size_pos - 4))
+    f.seek(end_pos)
+
+
+@dataclass
+class InfoData:
+    version: int
+    position: tuple
+    rotation: tuple # w, x, y, z
+    num_attributes: int
+    max_vert_influences: int = 0
+    max_chunk_influences: int = 0
+    bounds_min: tuple = (0.0, 0.0, 0.0)
+    bounds_max: tuple = (0.0, 0.0, 0.0)
+
+@dataclass
+class TextureSlot:
+    type: int
+    path: str
+    amount: float
+
+@dataclass
+class MaterialData:
+    version: int
+    name: str
+    two_sided: bool
+    opacity: float
+    ambient: tuple
+    diffuse: tuple
+    specular: tuple
+    emissive: tuple
+    shininess: float
+    properties: dict = field(default_factory=dict)
+    textures: list = field(default_factory=list)
+
+@dataclass
+class GeomData:
+    """Chunk geometry as (N, K) arrays. texcoords are Blender UVs (V is flipped on write) and
+    tangents are Blender's right handed tangents, see prepare_geom."""
+    version: int
+    positions: np.ndarray
+    texcoords: np.ndarray
+    indices: np.ndarray
+    normals: np.ndarray
+    face_normals: np.ndarray = None
+    tangents: np.ndarray = None
+    colors: np.ndarray = None
+    area: float = 0.0
+    is_curve: bool = False
+    max_influence: int = 0
+    parent_name: str = None
+    #inverse parent transform (4x4), applied by prepare_geom
+    parent_transform: np.ndarray = None
+    chunk_space: bool = False
+
+@dataclass
+class ChunkData:
+    matl: MaterialData
+    geom: GeomData
+    #(primitives, 3, 2) array of (primitive index, chunk index) per neighbor, 0xFFFF for none, None to omit NINF
+    neighbors: np.ndarray = None
+
+@dataclass
+class InflBone:
+    name: str
+    parent_name: str
+    position: tuple
+    orientation: tuple # 3x3 row major
+    #chunk index -> (vertex indices, weights, (N, 3) bone space positions), chunks without influences are left out
+    influences: dict = field(default_factory=dict)
+
+@dataclass
+class SkelBone:
+    name: str
+    position: tuple = None
+    rotation: tuple = None # x, y, z, w
+    children: list = field(default_factory=list)
+
+@dataclass
+class Attachment:
+    name: str
+    orientation: tuple # 3x3 row major
+    position: tuple
+
+@dataclass
+class KinInfo:
+    filename: str
+    num_frames: int
+    framerate: int
+    anim_scale: bool = False
+    relative_positioning: bool = False
+
+@dataclass
+class KinEvent:
+    frame: int
+    name: str
+    is_sound: bool = False
+
+
+def write_info(rf, info):
+    with jet_chunk(rf, 'INFO') as chnk:
+        chunk_ver(chnk, info.version)
+        #Position
+        chnk.write(struct.pack("<fff", *info.position))
+        #Rotation
+        chnk.write(struct.pack("<ffff", *info.rotation))
+        #NumAttributes
+        chnk.write(struct.pack("<I", info.num_attributes))
+
+        if info.version >= 102:
+            #MaxInfluencePerVertex
+            chnk.write(struct.pack("<I", info.max_vert_influences))
+            #MaxInfluencePerChunk
+            chnk.write(struct.pack("<I", info.max_chunk_influences))
+
+        #Bounding Box
+        if info.version >= 104:
+            chnk.write(struct.pack("<fff", *info.bounds_min))
+            chnk.write(struct.pack("<fff", *info.bounds_max))
+
+def write_matl(attr, mat):
+    with jet_chunk(attr, 'MATL') as matl:
+        chunk_ver(matl, mat.version)
+
+        # MATL versions:
+        # 101
+        # 102 - 101 + properties, opacity
+        # 103 - same as 102
+
+        if mat.version >= 102:
+            # Name
+            jet_str(matl, mat.name)
+            #NumProperties
+            matl.write(struct.pack("<I", len(mat.properties)))
+            for k in mat.properties:
+                jet_str(matl, k)
+                jet_str(matl, mat.properties[k])
+
+        #TwoSided
+        matl.write(struct.pack("<I", int(mat.two_sided)))
+
+        #Opacity
+        if mat.version >= 102:
+            matl.write(struct.pack("<f", mat.opacity))
+
+        #Ambient
+        matl.write(struct.pack("<fff", *mat.ambient))
+        #Diffuse
+        matl.write(struct.pack("<fff", *mat.diffuse))
+        #Specular
+        matl.write(struct.pack("<fff", *mat.specular))
+        #Emissive
+        matl.write(struct.pack("<fff", *mat.emissive))
+        #Shininess
+        matl.write(struct.pack("<f", mat.shininess))
+
+        #NumTextures
+        matl.write(struct.pack("<I", len(mat.textures)))
+        for tex in mat.textures:
+            #Type
+            matl.write(struct.pack("<I", tex.type))
+            #FileName
+            jet_str(matl, tex.path)
+            #Amount
+            matl.write(struct.pack("<f", tex.amount))
+
+def matl_bytes(mat):
+    """The complete MATL chunk of mat as bytes."""
+    with io.BytesIO() as buffer:
+        write_matl(buffer, mat)
+        return buffer.getvalue()
+
+def _vec3_array(values):
+    if values is None:
+        return np.zeros((0, 3), dtype=np.float32)
+    return np.asarray(values, dtype=np.float32).reshape(-1, 3)
+
+def prepare_geom(geom):
+    """Bring GEOM data into chunk space.
+
+    Applies the inverse parent transform, flips the tangents to JET's left handed convention
+    and zeroes non-finite components. Returns (GeomData, list of the kinds of data that
+    contained NaNs). Already prepared data is returned unchanged.
+    """
+    if geom.chunk_space:
+        return geom, []
+
+    warnings = []
+    def sanitize(values, kind):
+        bad = ~np.isfinite(values)
+        if bad.any():
+            warnings.append(kind)
+            values = np.where(bad, np.float32(0.0), values)
+        return values
+
+    positions = _vec3_array(geom.positions)
+    texcoords = np.asarray(geom.texcoords, dtype=np.float32).reshape(-1, 2)
+    normals = _vec3_array(geom.normals)
+    face_normals = _vec3_array(geom.face_normals)
+    tangents = None
+    if geom.tangents is not None and len(geom.tangents) > 0:
+        # original indexed mesh tangents were left handed whereas Blender uses a right handed coordinate system.
+        # so flip the tangent sign here to compensate.
+        tangents = -_vec3_array(geom.tangents)
+
+    if geom.parent_transform is not None:
+        #one batched multiply per block instead of a matrix per vertex
+        positions = transform_rows(geom.parent_transform, positions)
+        normals = normalize_rows(transform_rows(geom.parent_transform, normals, None))
+        face_normals = normalize_rows(transform_rows(geom.parent_transform, face_normals, None))
+        if tangents is not None:
+            tangents = normalize_rows(transform_rows(geom.parent_transform, tangents, None))
+
+    positions = sanitize(positions, 'position')
+    texcoords = sanitize(texcoords, 'UV')
+    normals = sanitize(normals, 'normal')
+    face_normals = sanitize(face_normals, 'face normal')
+    if tangents is not None:
+        tangents = sanitize(tangents, 'tangent')
+
+    colors = None
+    if geom.colors is not None and len(geom.colors) > 0:
+        colors = np.asarray(geom.colors, dtype=np.float32).reshape(-1, 4)
+
+    return replace(geom, positions=positions, texcoords=texcoords, indices=np.asarray(geom.indices),
+                   normals=normals, face_normals=face_normals, tangents=tangents, colors=colors,
+                   parent_transform=None, chunk_space=True), warnings
+
+def write_geom(attr, geom, bulk=True):
+    """Write a GEOM chunk. Returns a list of warnings for the caller to report.
+
+    With bulk set, each data block is packed into one little-endian array and written with a
+    single tobytes(); otherwise every element goes through struct.pack. Both produce the same bytes.
+    """
+    geom, nan_kinds = prepare_geom(geom)
+    warnings = ['NaN ' + kind + ' data detected' for kind in nan_kinds]
+    geom_version = geom.version
+    use_tangents = geom.tangents is not None
+
+    with jet_chunk(attr, 'GEOM') as chnk:
+        chunk_ver(chnk, geom_version)
+
+        # GEOM versions:
+        # 103 - Multiple texturesets
+        # 104 - 103 + vertex colors
+        # 200 - Parent bones
+        # 201 - 200 + tangent data
+
+        # I've only ever seen 103 and 104 show up in Bridge It - if any legacy Trainz assets actually use these let me know
+
+        #Flags
+        if not geom.is_curve:
+            if geom_version >= 101:
+                chnk.write(struct.pack("<I", 4)) #GC_TRIANGLES
+        else:
+            if geom_version >= 101:
+                chnk.write(struct.pack("<I", 2)) #GC_LINES
+            else:
+                # Curves not supported.
+                warnings.append('Curves not supported in GEOM v100!')
+
+        # UseTangents (201)
+        if geom_version >= 201:
+            chnk.write(struct.pack("<I", int(use_tangents)))
+
+        # Area
+        chnk.write(struct.pack("<f", geom.area))
+
+        # NumVertices
+        chnk.write(struct.pack("<I", len(geom.positions)))
+
+        # NumPrimitives
+        # NOTE: NumPrimitives is supposed to be geom_version >= 101 according to JET docs,
+        # but D20 meshes are v100 and have this field.
+        if not geom.is_curve:
+            chnk.write(struct.pack("<I", len(geom.indices) // 3))
+        else:
+            chnk.write(struct.pack("<I", len(geom.indices) // 2))
+
+        #NumIndices
+        if geom_version >= 101:
+            chnk.write(struct.pack("<I", len(geom.indices)))
+
+        #NumFaceNormals
+        if geom_version >= 101:
+            chnk.write(struct.pack("<I", len(geom.face_normals)))
+
+        #NumTexCoordSets
+        if geom_version == 103 or geom_version == 104:
+            chnk.write(struct.pack("<I", 1))
+
+        #Required for games pre-TANE, otherwise mesh refuses to animate
+        #MaxInfluence (102)
+        if geom_version >= 102:
+            chnk.write(struct.pack("<I", geom.max_influence))
+
+        #Parent (200)
+        if geom_version >= 200:
+            if geom.parent_name is not None:
+                jet_str(chnk, geom.parent_name)
+            else:
+                chnk.write(struct.pack("<I", 0))
+
+        write_colors = geom_version == 104 and geom.colors is not None
+        write_tangents = geom_version >= 201 and use_tangents
+
+        if bulk:
+            #Vertices
+            vertices = np.empty((len(geom.positions), 5), dtype='<f4')
+            vertices[:, :3] = geom.positions
+            vertices[:, 3] = geom.texcoords[:, 0]
+            vertices[:, 4] = 1.0 - geom.texcoords[:, 1].astype(np.float64)
+            chnk.write(vertices.tobytes())
+
+            #Indices
+            chnk.write(geom.indices.astype('<u2').tobytes())
+
+            #VertexNormals
+            chnk.write(geom.normals.astype('<f4').tobytes())
+
+            #FaceNormals
+            if geom_version >= 101:
+                chnk.write(geom.face_normals.astype('<f4').tobytes())
+
+            #VertexColors (104 only)
+            if write_colors:
+                colors = np.trunc(geom.colors.astype(np.float64) * 255.0)
+                chnk.write(np.clip(colors, 0, 255).astype(np.uint8).tobytes())
+
+            #Tangents (201)
+            if write_tangents:
+                chnk.write(geom.tangents.astype('<f4').tobytes())
+        else:
+            #Vertices
+            for co, texcoord in zip(geom.positions.tolist(), geom.texcoords.tolist()):
+                chnk.write(struct.pack("<fff", co[0], co[1], co[2]))
+                chnk.write(struct.pack("<ff", texcoord[0], 1.0 - texcoord[1]))
+
+            #Indices
+            for idx in geom.indices.tolist():
+                chnk.write(struct.pack("<H", idx))
+
+            #VertexNormals
+            for normal in geom.normals.tolist():
+                chnk.write(struct.pack("<fff", normal[0], normal[1], normal[2]))
+
+            #FaceNormals
+            if geom_version >= 101:
+                for normal in geom.face_normals.tolist():
+                    chnk.write(struct.pack("<fff", normal[0], normal[1], normal[2]))
+
+            #VertexColors (104 only)
+            if write_colors:
+                for color in geom.colors.tolist():
+                    chnk.write(struct.pack("<BBBB", *[min(max(int(c * 255.0), 0), 255) for c in color]))
+
+            #Tangents (201)
+            if write_tangents:
+                for tangent in geom.tangents.tolist():
+                    chnk.write(struct.pack("<fff", tangent[0], tangent[1], tangent[2]))
+
+    return warnings
+
+def write_ninf(attr, neighbors):
+    with jet_chunk(attr, 'NINF') as ninf:
+        chunk_ver(ninf, 100)
+        #PrimitiveIndex, NeighborChunkIndex for the 3 neighbors of each primitive
+        ninf.write(np.asarray(neighbors, dtype='<u2').reshape(-1, 3, 2).tobytes())
+
+def write_chnk(rf, index, chunk, bulk=True, matl_cache=None):
+    """Write a CHNK (MATL, GEOM and optional NINF). Returns the GEOM warnings.
+
+    With a matl_cache dict, chunks sharing one MaterialData object reuse its serialized MATL.
+    """
+    with jet_chunk(rf, 'CHNK') as attr:
+        chunk_ver(attr, 100)
+        #Chunk ID
+        attr.write(struct.pack("<I", index))
+        if matl_cache is None:
+            write_matl(attr, chunk.matl)
+        else:
+            #keyed by identity, the entry keeps the MaterialData alive so the id stays unique
+            entry = matl_cache.get(id(chunk.matl))
+            if entry is None:
+                entry = matl_cache[id(chunk.matl)] = (chunk.matl, matl_bytes(chunk.matl))
+            attr.write(entry[1])
+        warnings = write_geom(attr, chunk.geom, bulk)
+        if chunk.neighbors is not None:
+            write_ninf(attr, chunk.neighbors)
+    return warnings
+
+_INFL_RECORD = np.dtype([("index", "<u4"), ("weight", "<f4"), ("position", "<f4", 3)])
+
+def bone_influences(inv_matrix, positions, weights, bone_group):
+    """Gather the influences of one bone over a chunk.
+
+    weights is the chunk's CSR weight table (indptr, groups, weights) and bone_group the bone's
+    column in it. Every bound vertex is moved into bone space with a single batched multiply
+    by the bone's (cached) inverse world matrix. Returns (vertex indices, weights, positions).
+    """
+    vertex_of = np.repeat(np.arange(len(weights["indptr"]) - 1), np.diff(weights["indptr"]))
+    members = np.flatnonzero(weights["groups"] == bone_group)
+    indices = vertex_of[members]
+    return indices, weights["weights"][members], transform_rows(inv_matrix, np.asarray(positions)[indices])
+
+def _influence_records(indices, weights, positions):
+    records = np.empty(len(indices), dtype=_INFL_RECORD)
+    records["index"] = indices
+    records["weight"] = weights
+    records["position"] = positions
+    return records
+
+class InfluenceSpool:
+    """INFL records of already written chunks, parked in a temporary file (in memory while
+    small) until INFL is written after the last chunk."""
+
+    def __init__(self, max_memory=16 * 1024 * 1024):
+        self.file = tempfile.SpooledTemporaryFile(max_size=max_memory)
+
+    def add(self, indices, weights, positions):
+        """Store one bone's influences on one chunk. Returns the (offset, count) reference that
+        takes their place in InflBone.influences."""
+        records = _influence_records(indices, weights, positions)
+        self.file.seek(0, io.SEEK_END)
+        offset = self.file.tell()
+        self.file.write(records.tobytes())
+        return offset, len(records)
+
+    def read(self, reference):
+        offset, count = reference
+        self.file.seek(offset)
+        return self.file.read(count * _INFL_RECORD.itemsize)
+
+    def close(self):
+        self.file.close()
+
+def write_infl(rf, bones, num_chunks, spool=None):
+    """With a spool, the bones' influences are InfluenceSpool references."""
+    with jet_chunk(rf, 'INFL') as infl:
+        chunk_ver(infl, 100)
+
+        #NumBones
+        infl.write(struct.pack("<I", len(bones)))
+        #Bones
+        for bone in bones:
+            #Name
+            jet_str(infl, bone.name)
+
+            #Parent
+            if bone.parent_name is not None:
+                jet_str(infl, bone.parent_name)
+            else:
+                infl.write(struct.pack("<I", 0))
+
+            #LocalPosition
+            infl.write(struct.pack("<fff", *bone.position))
+            #LocalOrientation
+            infl.write(struct.pack("<fffffffff", *bone.orientation))
+
+            #having empty influence lists removed breaks stuff, so every chunk gets an entry
+            #NumInfluences
+            infl.write(struct.pack("<I", num_chunks))
+            #Influences
+            for i in range(num_chunks):
+                #ChunkIndex
+                infl.write(struct.pack("<I", i))
+                if i not in bone.influences:
+                    #NumVertices
+                    infl.write(struct.pack("<I", 0))
+                    continue
+
+                if spool is not None:
+                    #NumVertices
+                    infl.write(struct.pack("<I", bone.influences[i][1]))
+                    #Index, Weight, Position
+                    infl.write(spool.read(bone.influences[i]))
+                    continue
+
+                indices, weights, positions = bone.influences[i]
+                #NumVertices
+                infl.write(struct.pack("<I", len(indices)))
+                #Index, Weight, Position
+                infl.write(_influence_records(indices, weights, positions).tobytes())
+
+def _write_skel_bone(chnk, bone, with_transform):
+    with jet_chunk(chnk, 'BONE') as chunk:
+        chunk_ver(chunk, 100)
+        #BoneName
+        jet_str(chunk, bone.name)
+
+        if with_transform:
+            #Position
+            chunk.write(struct.pack("<fff", *bone.position))
+            #Orientation
+            chunk.write(struct.pack("<ffff", *bone.rotation))
+
+        #NumChildren
+        chunk.write(struct.pack("<I", len(bone.children)))
+        #BoneList
+        for child in bone.children:
+            _write_skel_bone(chunk, child, with_transform)
+
+def write_skel(rf, root_bone, with_transform=True):
+    """Write a SKEL hierarchy. .kin skeletons only store names (with_transform=False)."""
+    with jet_chunk(rf, 'SKEL') as skel:
+        chunk_ver(skel, 100)
+        #SkeletonBlock
+        _write_skel_bone(skel, root_bone, with_transform)
+
+def write_atch(rf, attachments):
+    with jet_chunk(rf, 'ATCH') as atch:
+        chunk_ver(atch, 100)
+        #NumAttachments
+        atch.write(struct.pack("<I", len(attachments)))
+        #Attachments
+        for att in attachments:
+            #Name
+            jet_str(atch, att.name)
+            #Orientation
+            atch.write(struct.pack("<fffffffff", *att.orientation))
+            #Position
+            atch.write(struct.pack("<fff", *att.position))
+
+def write_im(f, info, chunks, skeleton=None, influences=(), attachments=(), bulk=True):
+    """Write a complete .im file.
+
+    chunks may be any iterable of ChunkData. A SKEL hierarchy is written when a
+    skeleton root is supplied, INFL otherwise. Returns (chunk index, warning) pairs.
+    """
+    warnings = []
+    matl_cache = {}
+
+    #JIRF, filesize
+    with jet_chunk(f, 'JIRF') as rf: #resource file
+        rf.write('IDXM'.encode('utf-8'))
+        write_info(rf, info)
+
+        num_chunks = 0
+        for i, chunk in enumerate(chunks):
+            for warning in write_chnk(rf, i, chunk, bulk, matl_cache):
+                warnings.append((i, warning))
+            num_chunks += 1
+
+        _write_trailer(rf, num_chunks, skeleton, influences, attachments)
+
+    return warnings
+
+def _write_trailer(rf, num_chunks, skeleton, influences, attachments, spool=None):
+    if skeleton is not None:
+        write_skel(rf, skeleton)
+    else:
+        write_infl(rf, influences, num_chunks, spool)
+
+    #AttachmentInfo
+    if len(attachments) > 0:
+        write_atch(rf, attachments)
+
+class ImStreamWriter:
+    """Writes a .im file one CHNK at a time, for exports too large to hold every chunk.
+
+    The output has to be seekable: INFO is written up front from a provisional InfoData and
+    rewritten by finish(), and the NINF records of a chunk can be filled in by set_neighbors()
+    once the chunks its neighbors ended up in are known. Chunk data isn't kept after
+    write_chunk() (MATL bytes are cached per MaterialData, see write_chnk).
+    """
+
+    def __init__(self, f, info, bulk=True):
+        if not f.seekable():
+            raise ValueError("Streaming a .im file needs a seekable output")
+        self.f = f
+        self.bulk = bulk
+        self.matl_cache = {}
+        self.neighbor_offsets = []
+
+        #JIRF, filesize - back-patched by finish()
+        f.write('JIRF'.encode('utf-8'))
+        self.size_pos = f.tell()
+        f.write(b'\0\0\0\0')
+        f.write('IDXM'.encode('utf-8'))
+        self.info_pos = f.tell()
+        write_info(f, info)
+        self.info_end = f.tell()
+
+    @property
+    def num_chunks(self):
+        return len(self.neighbor_offsets)
+
+    def write_chunk(self, chunk):
+        """Write the next CHNK, returning its GEOM warnings. A chunk's neighbors only need the
+        right shape here when they are filled in later."""
+        warnings = write_chnk(self.f, self.num_chunks, chunk, self.bulk, self.matl_cache)
+        offset = None
+        if chunk.neighbors is not None:
+            #NINF closes the CHNK, its records are the last bytes written
+            offset = self.f.tell() - np.asarray(chunk.neighbors, dtype='<u2').nbytes
+        self.neighbor_offsets.append(offset)
+        return warnings
+
+    def set_neighbors(self, index, neighbors):
+        """Overwrite the NINF records of chunk index (same shape as when it was written)."""
+        end = self.f.tell()
+        self.f.seek(self.neighbor_offsets[index])
+        self.f.write(np.asarray(neighbors, dtype='<u2').reshape(-1, 3, 2).tobytes())
+        self.f.seek(end)
+
+    def finish(self, info, skeleton=None, influences=(), attachments=(), spool=None):
+        """Rewrite INFO with the final info and write SKEL/INFL and ATCH. influences may refer
+        to an InfluenceSpool."""
+        end = self.f.tell()
+        self.f.seek(self.info_pos)
+        write_info(self.f, info)
+        if self.f.tell() != self.info_end:
+            raise ValueError("INFO changed size, the provisional InfoData needs the final version")
+        self.f.seek(end)
+
+        _write_trailer(self.f, self.num_chunks, skeleton, influences, attachments, spool)
+
+        end = self.f.tell()
+        self.f.seek(self.size_pos)
+        self.f.write(struct.pack("<I", end - self.size_pos - 4))
+        self.f.seek(end)
+
+def write_fram(rf, frame_num, transforms, anim_scale):
+    """Write a FRAM chunk.
+
+    transforms is a (bones, 10) array of position, rotation (x, y, z, w) and scale per bone,
+    written as one contiguous block. The chunk size is known up front, so FRAM chunks are
+    written straight through without seeking back.
+    """
+    #BoneDataList - Position, Orientation and (with anim_scale) Scale
+    transforms = np.asarray(transforms, dtype='<f4').reshape(-1, 10)
+    if not anim_scale:
+        transforms = transforms[:, :7]
+    bone_data = np.ascontiguousarray(transforms).tobytes()
+
+    rf.write('FRAM'.encode('utf-8'))
+    rf.write(struct.pack("<I", 8 + len(bone_data)))
+
+    #version 101 fixes a lot of things - bone matrices are parent relative rather than global, and rotations aren't backwards anymore
+    chunk_ver(rf, 101 if anim_scale else 100)
+
+    #game may not bother animating if this is outside 0 to NumFrames - 1
+    #FrameNum
+    rf.write(struct.pack("<I", frame_num))
+
+    rf.write(bone_data)
+
+def write_kin(f, info, events, root_bone, frames):
+    """Write a complete .kin file.
+
+    frames is any iterable of (frame number, transforms) - it is consumed lazily and every
+    FRAM goes straight to f as it is sampled, with only the JIRF size patched in at the end,
+    so memory use doesn't grow with the length of the animation.
+    """
+    #JIRF, filesize
+    with jet_chunk(f, 'JIRF') as rf: #resource file
+        rf.write('ANIM'.encode('utf-8'))
+
+        with jet_chunk(rf, 'INFO') as chnk:
+            version_needed = 100
+            if info.anim_scale or info.relative_positioning:
+                version_needed = 102
+            # if info.relative_positioning:
+            #     version_needed = 257
+            flags_needed = version_needed >= 102
+
+            chunk_ver(chnk, version_needed)
+            #FileName
+            jet_str(chnk, info.filename)
+            #NumFrames
+            chnk.write(struct.pack("<I", info.num_frames))
+            #FrameRate
+            chnk.write(struct.pack("<I", info.framerate))
+            #MetricScale
+            chnk.write(struct.pack("<f", 1.0))
+
+            #Flags
+            if flags_needed:
+                flags = 0
+                if info.anim_scale:
+                    flags |= 0x2
+                if info.relative_positioning:
+                    flags |= 0x1
+                    #flags |= 0x8
+
+                chnk.write(struct.pack("<I", flags))
+
+        # AFAIK, supported event types are AET_SOUND_EVENT (0), and AET_GENERIC_EVENT (4)
+        # sound events will play the entry of the same name within the soundscript container in the config - best example of this is the PB interior coalman (<kuid:-25:696>)
+        # generic events are probably used by script
+
+        #Events
+        with jet_chunk(rf, 'EVNT') as evnt:
+            chunk_ver(evnt, 100)
+            #NumEvents
+            evnt.write(struct.pack("<I", len(events)))
+
+            for evt in events:
+                evnt.write(struct.pack("<I", evt.frame))
+                evnt.write(struct.pack("<I", 0 if evt.is_sound else 4)) #AET_SOUND_EVENT, AET_GENERIC_EVENT
+                jet_str(evnt, evt.name)
+
+        #Skeleton
+        write_skel(rf, root_bone, with_transform=False)
+
+        #FrameList
+        for frame_num, transforms in frames:
+            write_fram(rf, frame_num, transforms, info.anim_scale)
+
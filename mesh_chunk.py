@@ -0,0 +1,96 @@
+"""Write stage representation of a GEOM chunk.
+
+A MeshChunk keeps one chunk's vertices and triangles in typed arrays: float32 positions, UVs,
+normals, tangents and colors, uint16 triangle indices and CSR style vertex influences (see
+mesh_extract.extract_vertex_weights). It uses __slots__, so a large export doesn't carry a
+dict per chunk or any per vertex Python objects between gathering and writing.
+"""
+
+import numpy as np
+
+from .mesh_extract import reorder_weights
+
+#uint16 indices address at most this many vertices
+MAX_CHUNK_VERTICES = 0x10000
+
+def _float_rows(values, width):
+    if values is None:
+        return np.zeros((0, width), dtype=np.float32)
+    return np.ascontiguousarray(values, dtype=np.float32).reshape(-1, width)
+
+def _optional_rows(values, width):
+    if values is None or len(values) == 0:
+        return None
+    return _float_rows(values, width)
+
+class MeshChunk:
+    __slots__ = (
+        "obj",
+        "material",
+        "positions",
+        "texcoords",
+        "normals",
+        "tangents",
+        "colors",
+        "indices",
+        "face_normals",
+        "influences",
+        "area",
+        "parent",
+        "parent_bone",
+        "is_curve",
+        #(mesh arrays, triangle indices) of the source triangles, for NINF
+        "face_parts",
+        #new order of the source triangles after optimization, or None
+        "face_order",
+    )
+
+    def __init__(self, obj, material, positions, texcoords, normals, indices, influences,
+                 face_normals=None, tangents=None, colors=None, area=0.0, parent=None, parent_bone=None,
+                 is_curve=False, face_parts=None):
+        self.obj = obj
+        self.material = material
+        self.positions = _float_rows(positions, 3)
+        if len(self.positions) > MAX_CHUNK_VERTICES:
+            raise ValueError(f"Chunk has {len(self.positions)} vertices, at most {MAX_CHUNK_VERTICES} can be indexed")
+        self.texcoords = _float_rows(texcoords, 2)
+        self.normals = _float_rows(normals, 3)
+        self.tangents = _optional_rows(tangents, 3)
+        self.colors = _optional_rows(colors, 4)
+        self.indices = np.asarray(indices).astype(np.uint16).ravel()
+        self.face_normals = _float_rows(face_normals, 3)
+        self.influences = influences
+        self.area = area
+        self.parent = parent
+        self.parent_bone = parent_bone
+        self.is_curve = is_curve
+        self.face_parts = face_parts if face_parts is not None else []
+        self.face_order = None
+
+    @property
+    def num_vertices(self):
+        return len(self.positions)
+
+    @property
+    def max_influence(self):
+        return len(self.influences["names"])
+
+    @property
+    def nbytes(self):
+        arrays = [self.positions, self.texcoords, self.normals, self.tangents, self.colors, self.indices,
+                  self.face_normals, self.influences["indptr"], self.influences["groups"], self.influences["weights"]]
+        return sum(array.nbytes for array in arrays if array is not None)
+
+    def reorder(self, face_order, vertex_order):
+        """Put the triangles in face_order and the vertices in vertex_order (arrays of old indices)."""
+        remap = np.empty(self.num_vertices, dtype=np.int64)
+        remap[vertex_order] = np.arange(self.num_vertices)
+        self.indices = remap[self.indices.reshape(-1, 3)[face_order]].astype(np.uint16).ravel()
+        for name in ("positions", "texcoords", "normals", "tangents", "colors"):
+            values = getattr(self, name)
+            if values is not None and len(values) > 0:
+                setattr(self, name, values[vertex_order])
+        self.influences = reorder_weights(self.influences, vertex_order)
+        if len(self.face_normals) > 0:
+            self.face_normals = self.face_normals[face_order]
+        self.face_order = face_order if self.face_order is None else self.face_order[face_order]
@@ -0,0 +1,174 @@
+"""Bulk extraction of evaluated mesh data into NumPy arrays.
+
+Everything is read with foreach_get, so the exporter never walks per-element RNA
+wrappers (MeshLoop, MeshVertex, MeshLoopTriangle, ...) in its hot loops.
+"""
+
+import numpy as np
+
+def foreach_get_array(collection, attr, dtype, width=1):
+    buf = np.empty(len(collection) * width, dtype=dtype)
+    if len(buf) > 0:
+        collection.foreach_get(attr, buf)
+    if width > 1:
+        return buf.reshape(-1, width)
+    return buf
+
+def extract_mesh_arrays(me, use_tangents=False, use_colors=False):
+    """Read a triangulated mesh into arrays. me.calc_loop_triangles() (and calc_tangents(), if
+    use_tangents) must already have been called.
+
+    Returned dict:
+        positions      (V, 3) float32 vertex coordinates
+        loop_vertex    (L,)   int32 vertex index of each corner
+        loop_edge      (L,)   int32 edge index of each corner
+        corner_normals (L, 3) float32 split normals
+        tangents       (L, 3) float32 or None
+        uvs            (L, 2) float32 from the active UV layer, or None
+        colors         (L, 4) float32 from the active color layer, or None
+        tri_loops      (T, 3) int32 corner indices of each loop triangle
+        tri_material   (T,)   int32 material slot of each loop triangle
+        tri_area       (T,)   float32
+        tri_normal     (T, 3) float32
+    """
+    loops = me.loops
+    triangles = me.loop_triangles
+
+    arrays = {
+        "positions": foreach_get_array(me.vertices, "co", np.float32, 3),
+        "loop_vertex": foreach_get_array(loops, "vertex_index", np.int32),
+        "loop_edge": foreach_get_array(loops, "edge_index", np.int32),
+        "tangents": None,
+        "uvs": None,
+        "colors": None,
+        "tri_loops": foreach_get_array(triangles, "loops", np.int32, 3),
+        "tri_material": foreach_get_array(triangles, "material_index", np.int32),
+        "tri_area": foreach_get_array(triangles, "area", np.float32),
+        "tri_normal": foreach_get_array(triangles, "normal", np.float32, 3),
+    }
+
+    if hasattr(me, "corner_normals"):
+        arrays["corner_normals"] = foreach_get_array(me.corner_normals, "vector", np.float32, 3)
+    else:
+        # pre 4.1, split normals live on the loops after calc_normals_split()
+        arrays["corner_normals"] = foreach_get_array(loops, "normal", np.float32, 3)
+
+    if use_tangents:
+        arrays["tangents"] = foreach_get_array(loops, "tangent", np.float32, 3)
+
+    if len(me.uv_layers) != 0:
+        arrays["uvs"] = foreach_get_array(me.uv_layers.active.data, "uv", np.float32, 2)
+
+    if use_colors and len(me.vertex_colors) != 0:
+        # Blender 4.0 TODO: this is broken
+        arrays["colors"] = foreach_get_array(me.vertex_colors.active.data, "color", np.float32, 4)
+
+    return arrays
+
+def extract_vertex_weights(me, group_names):
+    """Read every vertex's deform weights in one pass into CSR style arrays.
+
+    group_names are the object's vertex group names, in index order. Returned dict:
+        indptr   (V + 1,) int64, the weights of vertex v are [indptr[v], indptr[v + 1])
+        groups   (W,)     int32 vertex group index, ascending within each vertex
+        weights  (W,)     float32, never zero
+        names    the vertex group names
+    """
+    num_vertices = len(me.vertices)
+    weights = {
+        "indptr": np.zeros(num_vertices + 1, dtype=np.int64),
+        "groups": np.zeros(0, dtype=np.int32),
+        "weights": np.zeros(0, dtype=np.float32),
+        "names": list(group_names),
+    }
+    if len(group_names) == 0:
+        return weights
+
+    vertex_of = []
+    groups = []
+    values = []
+    for vertex_index, vert in enumerate(me.vertices):
+        for element in vert.groups:
+            vertex_of.append(vertex_index)
+            groups.append(element.group)
+            values.append(element.weight)
+
+    vertex_of = np.array(vertex_of, dtype=np.int64)
+    groups = np.array(groups, dtype=np.int32)
+    values = np.array(values, dtype=np.float32)
+
+    #like VertexGroup.weight(), the first entry of a group wins
+    order = np.lexsort((groups, vertex_of))
+    vertex_of, groups, values = vertex_of[order], groups[order], values[order]
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = (vertex_of[1:] != vertex_of[:-1]) | (groups[1:] != groups[:-1])
+
+    #drop zero weights and entries of deleted groups
+    keep = first & (values != 0.0) & (groups < len(group_names))
+    vertex_of, groups, values = vertex_of[keep], groups[keep], values[keep]
+
+    weights["indptr"][1:] = np.cumsum(np.bincount(vertex_of, minlength=num_vertices))
+    weights["groups"] = groups
+    weights["weights"] = values
+    return weights
+
+def gather_weights(parts):
+    """Concatenate the weights of a chunk's vertices.
+
+    parts is a list of (weights from extract_vertex_weights, vertex indices). Groups are
+    merged by name, so the returned dict (same layout as extract_vertex_weights) indexes a
+    chunk wide name table.
+    """
+    names = []
+    name_index = {}
+    indptr = [np.zeros(1, dtype=np.int64)]
+    groups = []
+    values = []
+
+    for weights, vertex_indices in parts:
+        #resolve the object's groups to chunk columns once
+        lookup = np.empty(len(weights["names"]), dtype=np.int32)
+        for group, name in enumerate(weights["names"]):
+            if name not in name_index:
+                name_index[name] = len(names)
+                names.append(name)
+            lookup[group] = name_index[name]
+
+        vertex_indices = np.asarray(vertex_indices, dtype=np.int64)
+        starts = weights["indptr"][vertex_indices]
+        counts = weights["indptr"][vertex_indices + 1] - starts
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+        entries = np.repeat(starts - offsets[:-1], counts) + np.arange(offsets[-1])
+
+        indptr.append(offsets[1:] + indptr[-1][-1])
+        groups.append(lookup[weights["groups"][entries]])
+        values.append(weights["weights"][entries])
+
+    #only keep the names that actually carry weight in this chunk
+    groups = np.concatenate(groups) if groups else np.zeros(0, dtype=np.int32)
+    used = np.unique(groups)
+    remap = np.zeros(len(names), dtype=np.int32)
+    remap[used] = np.arange(len(used))
+
+    return {
+        "indptr": np.concatenate(indptr),
+        "groups": remap[groups],
+        "weights": np.concatenate(values) if values else np.zeros(0, dtype=np.float32),
+        "names": [names[group] for group in used.tolist()],
+    }
+
+def reorder_weights(weights, order):
+    """Reorder the vertices of a weights dict (see extract_vertex_weights), order giving the
+    old vertex index of each new vertex."""
+    indptr = weights["indptr"]
+    order = np.asarray(order, dtype=np.int64)
+    starts = indptr[:-1][order]
+    counts = indptr[1:][order] - starts
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+    entries = np.repeat(starts - offsets[:-1], counts) + np.arange(offsets[-1])
+    return {
+        "indptr": offsets,
+        "groups": weights["groups"][entries],
+        "weights": weights["weights"][entries],
+        "names": weights["names"],
+    }
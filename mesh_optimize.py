@@ -0,0 +1,258 @@
+"""Index buffer optimization for GEOM chunks.
+
+Triangles come out of Blender in loop triangle order, which can jump around the mesh and
+miss the GPU's post-transform vertex cache. optimize_vertex_cache reorders a chunk's
+triangles with Tipsify (Sander, Nehab and Barczak, "Fast Triangle Reordering for Vertex
+Locality and Reduced Overdraw"), a linear time greedy fan walk, and optimize_vertex_fetch
+then renumbers the vertices in first use order so the vertex buffer is read front to back.
+
+optimize_overdraw is the second half of the same paper: the cache ordered triangles are cut
+into clusters that each stay within a threshold of the cache efficiency even when drawn
+cold, and the clusters are sorted so the ones most likely to occlude the rest (far from the
+center, facing outwards) are drawn first.
+
+cache_stats simulates a FIFO cache to report the average cache miss ratio (ACMR, misses
+per triangle) and average transform to vertex ratio (ATVR, misses per vertex, 1.0 is ideal).
+estimate_overdraw rasterizes a chunk coarsely from the six axis directions to compare
+triangle orders.
+"""
+
+import collections
+
+import numpy as np
+
+VERTEX_CACHE_SIZE = 16
+#maximum ACMR of an overdraw cluster relative to the cache optimized order
+OVERDRAW_THRESHOLD = 1.05
+
+class _FifoCache:
+    def __init__(self, cache_size):
+        self.cache_size = cache_size
+        self.fifo = collections.deque()
+        self.cached = set()
+
+    def misses(self, triangle):
+        """Push a triangle's vertices, returning how many weren't cached."""
+        misses = 0
+        for index in triangle:
+            if index in self.cached:
+                continue
+            misses += 1
+            self.fifo.append(index)
+            self.cached.add(index)
+            if len(self.fifo) > self.cache_size:
+                self.cached.discard(self.fifo.popleft())
+        return misses
+
+    def flush(self):
+        self.fifo.clear()
+        self.cached.clear()
+
+def cache_stats(indices, cache_size=VERTEX_CACHE_SIZE):
+    """Simulate a FIFO vertex cache over a triangle list. Returns (ACMR, ATVR)."""
+    triangles = np.asarray(indices).reshape(-1, 3).tolist()
+    if len(triangles) == 0:
+        return 0.0, 0.0
+
+    cache = _FifoCache(cache_size)
+    misses = sum(cache.misses(triangle) for triangle in triangles)
+    return misses / len(triangles), misses / len(np.unique(indices))
+
+def _vertex_triangles(triangles, num_vertices):
+    """CSR table of the triangles using each vertex, in ascending triangle order."""
+    corners = triangles.ravel()
+    order = np.argsort(corners, kind='stable')
+    indptr = np.zeros(num_vertices + 1, dtype=np.int64)
+    np.cumsum(np.bincount(corners, minlength=num_vertices), out=indptr[1:])
+    return indptr.tolist(), (order // 3).tolist()
+
+def optimize_vertex_cache(indices, num_vertices, cache_size=VERTEX_CACHE_SIZE):
+    """Tipsify triangle order for a (3 * T,) triangle list. Returns (T,) old triangle indices in
+    their new order."""
+    triangles = np.asarray(indices, dtype=np.int64).reshape(-1, 3)
+    num_tris = len(triangles)
+    if num_tris == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    indptr, adjacent = _vertex_triangles(triangles, num_vertices)
+    tri_list = triangles.tolist()
+    live = np.diff(indptr).tolist()
+    timestamps = [0] * num_vertices
+    emitted = [False] * num_tris
+    dead_end = []
+    order = []
+
+    stamp = cache_size + 1
+    cursor = 0
+    fan = tri_list[0][0]
+    while fan >= 0:
+        candidates = []
+        for tri in adjacent[indptr[fan]:indptr[fan + 1]]:
+            if emitted[tri]:
+                continue
+            emitted[tri] = True
+            order.append(tri)
+            for vertex in tri_list[tri]:
+                dead_end.append(vertex)
+                candidates.append(vertex)
+                live[vertex] -= 1
+                if stamp - timestamps[vertex] > cache_size:
+                    timestamps[vertex] = stamp
+                    stamp += 1
+
+        #next fan: the candidate that will still be in the cache after its remaining triangles
+        fan = -1
+        best = -1
+        for vertex in candidates:
+            if live[vertex] <= 0:
+                continue
+            priority = 0
+            if stamp - timestamps[vertex] + 2 * live[vertex] <= cache_size:
+                priority = stamp - timestamps[vertex]
+            if priority > best:
+                best = priority
+                fan = vertex
+
+        if fan < 0:
+            #dead end - back up through recently used vertices, then scan for any live one
+            while dead_end:
+                vertex = dead_end.pop()
+                if live[vertex] > 0:
+                    fan = vertex
+                    break
+            while fan < 0 and cursor < num_vertices:
+                if live[cursor] > 0:
+                    fan = cursor
+                cursor += 1
+
+    return np.array(order, dtype=np.int64)
+
+def optimize_vertex_fetch(indices, num_vertices):
+    """Renumber vertices in first use order. Returns (new indices, (V,) old vertex indices in
+    their new order). Unreferenced vertices are kept, after the referenced ones."""
+    indices = np.asarray(indices, dtype=np.int64).ravel()
+    first_use = np.full(num_vertices, len(indices), dtype=np.int64)
+    np.minimum.at(first_use, indices, np.arange(len(indices)))
+    vertex_order = np.argsort(first_use, kind='stable')
+
+    remap = np.empty(num_vertices, dtype=np.int64)
+    remap[vertex_order] = np.arange(num_vertices)
+    return remap[indices], vertex_order
+
+def _clusters(triangles, threshold, cache_size):
+    """Cluster start offsets of a cache ordered (T, 3) triangle list."""
+    tri_list = triangles.tolist()
+    cache = _FifoCache(cache_size)
+
+    #hard boundaries where the cache order jumped and the whole triangle missed
+    misses = [cache.misses(triangle) for triangle in tri_list]
+    hard = [i for i, count in enumerate(misses) if count == 3 or i == 0] + [len(tri_list)]
+
+    #soft boundaries wherever the cluster so far, started with a cold cache, is already
+    #within the threshold of its hard cluster's ACMR
+    starts = []
+    for start, end in zip(hard[:-1], hard[1:]):
+        cache.flush()
+        limit = threshold * sum(cache.misses(triangle) for triangle in tri_list[start:end]) / (end - start)
+
+        cache.flush()
+        cluster_start = start
+        cluster_misses = 0
+        starts.append(start)
+        for i in range(start, end - 1):
+            cluster_misses += cache.misses(tri_list[i])
+            if cluster_misses <= limit * (i + 1 - cluster_start):
+                cluster_start = i + 1
+                cluster_misses = 0
+                starts.append(cluster_start)
+                cache.flush()
+    return np.array(starts, dtype=np.int64)
+
+def optimize_overdraw(indices, positions, threshold=OVERDRAW_THRESHOLD, cache_size=VERTEX_CACHE_SIZE):
+    """Sort clusters of a cache optimized (3 * T,) triangle list by occlusion potential. Returns
+    (T,) triangle indices in their new order."""
+    triangles = np.asarray(indices, dtype=np.int64).reshape(-1, 3)
+    if len(triangles) == 0:
+        return np.zeros(0, dtype=np.int64)
+    positions = np.asarray(positions, dtype=np.float64)
+
+    starts = _clusters(triangles, threshold, cache_size)
+    cluster_of = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, len(triangles))))
+
+    #area weighted centroid and normal of each cluster
+    corners = positions[triangles]
+    cross = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    area = np.linalg.norm(cross, axis=1)
+    centroid = np.zeros((len(starts), 3))
+    normal = np.zeros((len(starts), 3))
+    np.add.at(centroid, cluster_of, corners.mean(axis=1) * area[:, None])
+    np.add.at(normal, cluster_of, cross)
+    cluster_area = np.bincount(cluster_of, weights=area, minlength=len(starts))
+    centroid[cluster_area > 0] /= cluster_area[cluster_area > 0, None]
+    length = np.linalg.norm(normal, axis=1)
+    normal[length > 0] /= length[length > 0, None]
+
+    #clusters far out along their normal are drawn first
+    mesh_center = positions[np.unique(triangles)].mean(axis=0)
+    potential = np.einsum('ij,ij->i', centroid - mesh_center, normal)
+    cluster_order = np.argsort(-potential, kind='stable')
+    return np.concatenate([np.arange(starts[c], starts[c + 1] if c + 1 < len(starts) else len(triangles))
+                           for c in cluster_order.tolist()])
+
+def _barycentric_samples(levels):
+    samples = [(levels - i - j, i, j) for i in range(levels + 1) for j in range(levels + 1 - i)]
+    return np.array(samples, dtype=np.float64) / levels
+
+def estimate_overdraw(indices, positions, resolution=64):
+    """Average overdraw (shaded fragments per covered pixel) of drawing the triangles in order
+    with early depth testing and back face culling, viewed along +-X, +-Y and +-Z.
+
+    Triangles are point sampled into a coarse depth buffer, so this is only good for comparing
+    triangle orders of the same chunk."""
+    triangles = np.asarray(indices, dtype=np.int64).reshape(-1, 3)
+    positions = np.asarray(positions, dtype=np.float64)
+    if len(triangles) == 0:
+        return 0.0
+
+    corners = positions[triangles]
+    cross = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+    low = corners.reshape(-1, 3).min(axis=0)
+    extent = np.maximum(corners.reshape(-1, 3).max(axis=0) - low, 1.0e-9)
+    points = np.einsum('sk,tkc->tsc', _barycentric_samples(3), corners)
+    cells = np.clip(((points - low) / extent * resolution).astype(np.int64), 0, resolution - 1)
+    depths = (points - low) / extent
+
+    shaded = 0
+    covered = 0
+    for axis in range(3):
+        u, v = [k for k in range(3) if k != axis]
+        for sign in (1.0, -1.0):
+            #viewer at +-infinity along the axis, front faces point towards it
+            front = np.flatnonzero(cross[:, axis] * sign > 0.0)
+            pixel = (cells[front, :, u] * resolution + cells[front, :, v]).ravel()
+            depth = (1.0 - depths[front, :, axis] if sign > 0.0 else depths[front, :, axis]).ravel()
+            draw = np.repeat(np.arange(len(front)), points.shape[1])
+
+            #one fragment per triangle and pixel, the nearest sample
+            order = np.lexsort((depth, pixel, draw))
+            first = np.ones(len(order), dtype=bool)
+            first[1:] = (draw[order][1:] != draw[order][:-1]) | (pixel[order][1:] != pixel[order][:-1])
+            keep = order[first]
+            draw, pixel, depth = draw[keep], pixel[keep], depth[keep]
+
+            #per pixel in draw order, a fragment is shaded if it's nearer than everything before it
+            order = np.lexsort((draw, pixel))
+            pixel, depth = pixel[order], depth[order]
+            if len(pixel) == 0:
+                continue
+            new_pixel = np.concatenate([[True], pixel[1:] != pixel[:-1]])
+            group = np.cumsum(new_pixel)
+            #depths are in [0, 1], the descending per pixel offset keeps the running minimum
+            #from leaking into the next pixel and makes its first fragment always pass
+            biased = depth + (group[-1] - group) * 2.0
+            nearest = np.minimum.accumulate(biased)
+
+            shaded += 1 + int((biased[1:] < nearest[:-1]).sum())
+            covered += int(new_pixel.sum())
+
+    return shaded / covered if covered else 0.0
@@ -0,0 +1,97 @@
+"""Batched matrix/quaternion helpers for .kin sampling.
+
+These follow mathutils (Matrix.decompose(), Quaternion.inverted(), ...) but work on whole
+(N, 4, 4) stacks of matrices at once, so a frame of pose data is converted in a handful of
+NumPy calls instead of one decompose per bone. Math is done in double precision.
+"""
+
+import numpy as np
+
+def matrices_to_quaternions(rotations):
+    """Convert (N, 3, 3) orthonormal rotation matrices to (N, 4) w, x, y, z quaternions.
+
+    Same branch selection and sign convention as Blender's mat3_normalized_to_quat (negative
+    matrices are negated first, w is kept non-negative).
+    """
+    r = np.array(rotations, dtype=np.float64)
+    negative = np.linalg.det(r) < 0.0
+    r[negative] = -r[negative]
+
+    r00, r01, r02 = r[:, 0, 0], r[:, 0, 1], r[:, 0, 2]
+    r10, r11, r12 = r[:, 1, 0], r[:, 1, 1], r[:, 1, 2]
+    r20, r21, r22 = r[:, 2, 0], r[:, 2, 1], r[:, 2, 2]
+
+    quats = np.empty((len(r), 4), dtype=np.float64)
+
+    branch_x = (r22 < 0.0) & (r00 > r11)
+    branch_y = (r22 < 0.0) & ~branch_x
+    branch_z = (r22 >= 0.0) & (r00 < -r11)
+    branch_w = ~(branch_x | branch_y | branch_z)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        s = 2.0 * np.sqrt(np.maximum(1.0 + r00 - r11 - r22, 0.0))
+        s = np.where(r21 < r12, -s, s)
+        quats[branch_x] = np.stack([(r21 - r12) / s, 0.25 * s, (r10 + r01) / s, (r02 + r20) / s], axis=1)[branch_x]
+
+        s = 2.0 * np.sqrt(np.maximum(1.0 - r00 + r11 - r22, 0.0))
+        s = np.where(r02 < r20, -s, s)
+        quats[branch_y] = np.stack([(r02 - r20) / s, (r10 + r01) / s, 0.25 * s, (r21 + r12) / s], axis=1)[branch_y]
+
+        s = 2.0 * np.sqrt(np.maximum(1.0 - r00 - r11 + r22, 0.0))
+        s = np.where(r10 < r01, -s, s)
+        quats[branch_z] = np.stack([(r10 - r01) / s, (r02 + r20) / s, (r21 + r12) / s, 0.25 * s], axis=1)[branch_z]
+
+        s = 2.0 * np.sqrt(np.maximum(1.0 + r00 + r11 + r22, 0.0))
+        quats[branch_w] = np.stack([0.25 * s, (r21 - r12) / s, (r02 - r20) / s, (r10 - r01) / s], axis=1)[branch_w]
+
+    return normalize_quaternions(quats)
+
+def normalize_quaternions(quats):
+    length = np.linalg.norm(quats, axis=1)
+    out = np.zeros_like(quats)
+    out[:, 0] = 1.0
+    valid = length > 1.0e-35
+    out[valid] = quats[valid] / length[valid, None]
+    return out
+
+def invert_quaternions(quats):
+    """Quaternion.inverted() for (N, 4) w, x, y, z quaternions."""
+    quats = np.asarray(quats, dtype=np.float64)
+    dot = np.einsum('ij,ij->i', quats, quats)
+    out = quats * np.array([1.0, -1.0, -1.0, -1.0])
+    valid = dot != 0.0
+    out[valid] /= dot[valid, None]
+    return out
+
+def quaternions_to_matrices(quats):
+    """(N, 4) w, x, y, z quaternions to (N, 3, 3) rotation matrices."""
+    w, x, y, z = np.asarray(quats, dtype=np.float64).T
+    return np.stack([
+        np.stack([1.0 - 2.0 * (y * y + z * z), 2.0 * (x * y - w * z), 2.0 * (x * z + w * y)], axis=1),
+        np.stack([2.0 * (x * y + w * z), 1.0 - 2.0 * (x * x + z * z), 2.0 * (y * z - w * x)], axis=1),
+        np.stack([2.0 * (x * z - w * y), 2.0 * (y * z + w * x), 1.0 - 2.0 * (x * x + y * y)], axis=1),
+    ], axis=1)
+
+def decompose_matrices(matrices):
+    """Matrix.decompose() for a (N, 4, 4) stack. Returns (N, 3) locations, (N, 4) w, x, y, z
+    rotations and (N, 3) scales."""
+    m = np.asarray(matrices, dtype=np.float64)
+    basis = m[:, :3, :3]
+
+    #column lengths, negated for mirrored matrices
+    scale = np.linalg.norm(basis, axis=1)
+    rotation = np.zeros_like(basis)
+    valid = scale > 1.0e-35
+    np.divide(basis, scale[:, None, :], out=rotation, where=valid[:, None, :])
+    scale[np.linalg.det(basis) < 0.0] *= -1.0
+
+    return m[:, :3, 3].copy(), matrices_to_quaternions(rotation), scale
+
+def remove_scale(matrices):
+    """Rebuild (N, 4, 4) matrices from their location and rotation only."""
+    loc, rot, _ = decompose_matrices(matrices)
+    out = np.zeros((len(loc), 4, 4), dtype=np.float64)
+    out[:, :3, :3] = quaternions_to_matrices(rot)
+    out[:, :3, 3] = loc
+    out[:, 3, 3] = 1.0
+    return out
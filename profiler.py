@@ -0,0 +1,131 @@
+"""Per phase instrumentation of an export.
+
+The exporter wraps its phases (evaluation, tangents, dedup, INFL, textures, .kin sampling,
+...) in phase() blocks and bumps counters with count(). Both are no-ops unless a profiler
+has been started, so the instrumentation stays in place at no real cost. Whole functions
+are wrapped with the profiled(name) decorator.
+
+An ExportProfiler records wall time and call count per phase and, with trace_memory, the
+tracemalloc peak (above the memory in use when the phase started). Phases nest; a
+phase's time includes its children. report() returns a JSON serializable dict.
+"""
+
+import contextlib
+import functools
+import json
+import time
+import tracemalloc
+
+_active = None
+
+class ExportProfiler:
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.phases = {}
+        self.counters = {}
+        self.stack = []
+        self.started_tracing = False
+        self.start_time = None
+        self.total_time = None
+
+    def start(self):
+        self.start_time = time.perf_counter()
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+
+    def stop(self):
+        self.total_time = time.perf_counter() - self.start_time
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        #[name, start memory, highest peak of finished children]
+        frame = [name, 0, 0]
+        if self.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if self.stack:
+                #the running peak belongs to the parent, it's about to be reset
+                self.stack[-1][2] = max(self.stack[-1][2], peak)
+            frame[1] = current
+            tracemalloc.reset_peak()
+        self.stack.append(frame)
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.stack.pop()
+
+            stats = self.phases.get(name)
+            if stats is None:
+                stats = self.phases[name] = {"time": 0.0, "calls": 0}
+                if self.trace_memory:
+                    stats["peak_memory"] = 0
+            stats["time"] += elapsed
+            stats["calls"] += 1
+
+            if self.trace_memory:
+                peak = max(tracemalloc.get_traced_memory()[1], frame[2])
+                stats["peak_memory"] = max(stats["peak_memory"], peak - frame[1])
+                if self.stack:
+                    self.stack[-1][2] = max(self.stack[-1][2], peak)
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def report(self):
+        return {
+            "total_time": self.total_time,
+            "phases": self.phases,
+            "counters": self.counters,
+        }
+
+    def write(self, path):
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2)
+
+    def summary_lines(self):
+        lines = []
+        for name, stats in sorted(self.phases.items(), key=lambda item: -item[1]["time"]):
+            line = f"{name:24} {stats['time']:9.3f}s {stats['calls']:7}x"
+            if "peak_memory" in stats:
+                line += f" {stats['peak_memory'] / (1024 * 1024):9.1f} MiB"
+            lines.append(line)
+        return lines
+
+def start(trace_memory=False):
+    """Start collecting into a new profiler and return it."""
+    global _active
+    _active = ExportProfiler(trace_memory)
+    _active.start()
+    return _active
+
+def stop():
+    global _active
+    profiler, _active = _active, None
+    if profiler is not None:
+        profiler.stop()
+    return profiler
+
+def phase(name):
+    if _active is None:
+        return contextlib.nullcontext()
+    return _active.phase(name)
+
+def count(name, amount=1):
+    if _active is not None:
+        _active.count(name, amount)
+
+def profiled(name):
+    """Decorator running every call of the function as the phase name."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with phase(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
@@ -0,0 +1,56 @@
+"""Lifetime of the evaluated meshes an export creates.
+
+Applying modifiers needs a mesh of the evaluated object. The depsgraph's own mesh goes away
+as soon as the scene is re-evaluated (the temporary TRIANGULATE modifier is removed right
+after, and frames change for animated bounds), so a copy is taken as a datablock of its own.
+Copies have no users and Blender only drops them when the file is reloaded, so every export
+would otherwise add a copy of each mesh to the session. TemporaryMeshes hands out those
+copies, frees the depsgraph's mesh straight away and removes each copy once its data has
+been extracted. Whatever is still alive when the context exits, e.g. after an error, is
+removed then.
+"""
+
+import logging
+
+import bpy
+
+from . import profiler
+
+log = logging.getLogger(__name__)
+
+class TemporaryMeshes:
+    def __init__(self):
+        #name -> mesh, for the copies not yet removed
+        self.live = {}
+        self.created = 0
+        self.released = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        for me in list(self.live.values()):
+            self.release(me)
+        log.info(f"Temporary meshes: {self.created} created, {self.released} released")
+
+    def evaluated_copy(self, obj, depsgraph):
+        """A copy of the object's evaluated mesh, or None if it has no mesh data."""
+        final = obj.evaluated_get(depsgraph)
+        try:
+            me = final.to_mesh(preserve_all_data_layers=True, depsgraph=depsgraph).copy()
+        except RuntimeError:
+            return None
+        finally:
+            final.to_mesh_clear()
+        self.live[me.name] = me
+        self.created += 1
+        profiler.count("temp_meshes")
+        return me
+
+    def release(self, me):
+        """Remove a copy made by evaluated_copy. Other meshes (object data) are left alone."""
+        if self.live.get(me.name) != me:
+            return
+        del self.live[me.name]
+        bpy.data.meshes.remove(me)
+        self.released += 1
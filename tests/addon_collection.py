@@ -0,0 +1,11 @@
+"""pytest plugin, loaded from pytest.ini.
+
+The add-on's __init__ imports bpy, so its folder is collected as a plain directory rather
+than as a package. The tests import the bpy free modules directly.
+"""
+
+import pytest
+
+def pytest_collect_directory(path, parent):
+    if path == parent.config.rootpath:
+        return pytest.Dir.from_parent(parent, path=path)
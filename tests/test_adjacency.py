@@ -0,0 +1,70 @@
+import numpy as np
+
+from adjacency import NO_NEIGHBOR, neighbor_records, triangle_neighbors
+
+def reference_neighbors(tri_edges):
+    """The original per face lookup: the other faces on each of a face's edges, in order."""
+    edges_2_faces = {}
+    for face, edges in enumerate(tri_edges):
+        for edge in edges:
+            edges_2_faces.setdefault(edge, []).append(face)
+    return [[f for edge in edges for f in edges_2_faces[edge] if f != face]
+            for face, edges in enumerate(tri_edges)]
+
+def reference_records(neighbor_map, tri_chunk, tri_primitive):
+    records = []
+    for neighbors in neighbor_map:
+        for i in range(3):
+            if i < len(neighbors):
+                records.append((tri_primitive[neighbors[i]], tri_chunk[neighbors[i]]))
+            else:
+                records.append((NO_NEIGHBOR, NO_NEIGHBOR))
+    return records
+
+def check_against_reference(tri_edges):
+    neighbors = triangle_neighbors(tri_edges)
+    expected = reference_neighbors(tri_edges.tolist())
+    assert neighbors.shape == (len(tri_edges), 3)
+    for row, reference in zip(neighbors.tolist(), expected):
+        assert [f for f in row if f >= 0] == reference[:3]
+        assert row[len(reference[:3]):] == [-1] * (3 - len(reference[:3]))
+    return neighbors, expected
+
+def test_manifold_grid():
+    #two triangles per quad of a 10x10 grid, edges numbered per quad side and diagonal
+    size = 10
+    tris = []
+    for y in range(size):
+        for x in range(size):
+            bottom = ("h", x, y)
+            top = ("h", x, y + 1)
+            left = ("v", x, y)
+            right = ("v", x + 1, y)
+            diagonal = ("d", x, y)
+            tris.append([bottom, right, diagonal])
+            tris.append([diagonal, top, left])
+    names = {}
+    tri_edges = np.array([[names.setdefault(edge, len(names)) for edge in tri] for tri in tris])
+    check_against_reference(tri_edges)
+
+def test_non_manifold_and_degenerate():
+    rng = np.random.default_rng(0)
+    #few edges, so edges are shared by many triangles and some triangles repeat an edge
+    tri_edges = rng.integers(0, 25, (400, 3))
+    tri_edges[:20, 1] = tri_edges[:20, 0]
+    tri_edges[20:25] = tri_edges[20:25, :1]
+    check_against_reference(tri_edges)
+
+def test_neighbor_records():
+    rng = np.random.default_rng(1)
+    tri_edges = rng.integers(0, 300, (200, 3))
+    neighbors, expected = check_against_reference(tri_edges)
+    tri_chunk = rng.integers(0, 4, 200)
+    tri_primitive = rng.integers(0, 60000, 200)
+    records = neighbor_records(neighbors, tri_chunk, tri_primitive)
+    assert records.dtype == np.uint16 and records.shape == (200, 3, 2)
+    assert [tuple(record) for record in records.reshape(-1, 2).tolist()] == \
+        reference_records(expected, tri_chunk.tolist(), tri_primitive.tolist())
+
+def test_empty():
+    assert triangle_neighbors(np.zeros((0, 3), dtype=np.int64)).shape == (0, 3)
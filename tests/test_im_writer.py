@@ -0,0 +1,142 @@
+import io
+
+import numpy as np
+import pytest
+
+from im_writer import (
+    Attachment,
+    ChunkData,
+    GeomData,
+    ImStreamWriter,
+    InflBone,
+    InfluenceSpool,
+    InfoData,
+    MaterialData,
+    SkelBone,
+    TextureSlot,
+    write_geom,
+    write_im,
+)
+
+GEOM_VERSIONS = [100, 101, 102, 103, 104, 200, 201]
+
+def make_geom(rng, version, num_vertices=50, num_faces=40, **kwargs):
+    geom = dict(
+        version=version,
+        positions=rng.normal(size=(num_vertices, 3)).astype(np.float32),
+        texcoords=rng.random((num_vertices, 2)).astype(np.float32),
+        indices=rng.integers(0, num_vertices, num_faces * 3),
+        normals=rng.normal(size=(num_vertices, 3)).astype(np.float32),
+        face_normals=rng.normal(size=(num_faces, 3)).astype(np.float32),
+        tangents=rng.normal(size=(num_vertices, 3)).astype(np.float32),
+        #out of range colors are clamped
+        colors=rng.uniform(-0.5, 1.5, (num_vertices, 4)).astype(np.float32),
+        area=12.5,
+        max_influence=3,
+    )
+    geom.update(kwargs)
+    return GeomData(**geom)
+
+def geom_bytes(geom, bulk):
+    f = io.BytesIO()
+    warnings = write_geom(f, geom, bulk)
+    return f.getvalue(), warnings
+
+@pytest.mark.parametrize("version", GEOM_VERSIONS)
+def test_geom_bulk_matches_struct(version):
+    rng = np.random.default_rng(version)
+    variants = [
+        make_geom(rng, version),
+        make_geom(rng, version, tangents=None, colors=None),
+        make_geom(rng, version, parent_name="b.r.parent",
+                  parent_transform=np.array([[0, -1, 0, 1], [1, 0, 0, 2], [0, 0, 2, 3], [0, 0, 0, 1]], dtype=np.float64)),
+        make_geom(rng, version, is_curve=True, indices=rng.integers(0, 50, 60)),
+        make_geom(rng, version, num_vertices=0, num_faces=0, indices=np.zeros(0, dtype=np.int64)),
+    ]
+    nan_geom = make_geom(rng, version)
+    nan_geom.positions[3, 1] = np.nan
+    nan_geom.normals[5, 0] = np.inf
+    variants.append(nan_geom)
+
+    for geom in variants:
+        bulk, bulk_warnings = geom_bytes(geom, True)
+        packed, packed_warnings = geom_bytes(geom, False)
+        assert bulk == packed
+        assert bulk_warnings == packed_warnings
+    assert geom_bytes(nan_geom, True)[1] == ['NaN position data detected', 'NaN normal data detected']
+
+def make_scene(rng, num_chunks=6, num_bones=3):
+    materials = [
+        MaterialData(103, "body.m.onetex", False, 1.0, (1.0, 1.0, 1.0), (0.8, 0.8, 0.8), (0.5, 0.5, 0.5),
+                     (0.0, 0.0, 0.0), 64.0, {"key": "value"}, [TextureSlot(1, "body.texture", 1.0)]),
+        MaterialData(103, "glass.m.notex", True, 0.5, (0.2, 0.2, 0.2), (0.2, 0.3, 0.4), (1.0, 1.0, 1.0),
+                     (0.0, 0.0, 0.0), 128.0),
+    ]
+    chunks = []
+    for i in range(num_chunks):
+        num_faces = int(rng.integers(5, 30))
+        geom = make_geom(rng, 201, num_vertices=40, num_faces=num_faces, colors=None)
+        neighbors = rng.integers(0, 0x10000, (num_faces, 3, 2)).astype(np.uint16)
+        chunks.append(ChunkData(materials[i % 2], geom, neighbors))
+
+    influences = []
+    for b in range(num_bones):
+        bone_influences = {}
+        for i in range(num_chunks):
+            if (i + b) % 3 == 0:
+                #a chunk the bone doesn't influence
+                continue
+            count = int(rng.integers(1, 40))
+            bone_influences[i] = (np.sort(rng.choice(40, count, replace=False)),
+                                  rng.random(count).astype(np.float32),
+                                  rng.normal(size=(count, 3)).astype(np.float32))
+        influences.append(InflBone(f"b.r.bone{b}", None if b == 0 else "b.r.bone0", (0.0, 1.0, 2.0),
+                                   (1.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 1.0), bone_influences))
+
+    info = InfoData(104, (0.0, 0.0, 0.0), (1.0, 0.0, 0.0, 0.0), num_chunks, 4, 3, (-1.0, -2.0, -3.0), (1.0, 2.0, 3.0))
+    attachments = [Attachment("a.light", (1.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 1.0), (0.0, 0.5, 1.0))]
+    return info, chunks, influences, attachments
+
+def buffered(info, chunks, skeleton, influences, attachments):
+    f = io.BytesIO()
+    warnings = write_im(f, info, chunks, skeleton, influences, attachments)
+    return f.getvalue(), [warning for _, warning in warnings]
+
+def streamed(info, chunks, skeleton, influences, attachments, max_memory):
+    """Write like a streaming export: provisional INFO, zeroed NINF patched afterwards and the
+    influences of each written chunk moved to a spool."""
+    f = io.BytesIO()
+    provisional = InfoData(info.version, info.position, info.rotation, 0)
+    writer = ImStreamWriter(f, provisional)
+    spool = InfluenceSpool(max_memory)
+    spooled = [InflBone(bone.name, bone.parent_name, bone.position, bone.orientation, {}) for bone in influences]
+    warnings = []
+    for i, chunk in enumerate(chunks):
+        placeholder = np.zeros_like(chunk.neighbors)
+        warnings += writer.write_chunk(ChunkData(chunk.matl, chunk.geom, placeholder))
+        for bone, spooled_bone in zip(influences, spooled):
+            if i in bone.influences:
+                spooled_bone.influences[i] = spool.add(*bone.influences[i])
+    for i, chunk in enumerate(chunks):
+        writer.set_neighbors(i, chunk.neighbors)
+    writer.finish(info, skeleton, spooled, attachments, spool)
+    spool.close()
+    return f.getvalue(), warnings
+
+@pytest.mark.parametrize("max_memory", [16 * 1024 * 1024, 64])
+def test_stream_matches_write_im(max_memory):
+    info, chunks, influences, attachments = make_scene(np.random.default_rng(0))
+    assert streamed(info, chunks, None, influences, attachments, max_memory) == \
+        buffered(info, chunks, None, influences, attachments)
+
+def test_stream_matches_write_im_with_skeleton():
+    info, chunks, _, attachments = make_scene(np.random.default_rng(1))
+    skeleton = SkelBone("b.r.root", (0.0, 0.0, 0.0), (0.0, 0.0, 0.0, 1.0),
+                        [SkelBone("b.r.child", (0.0, 1.0, 0.0), (0.0, 0.0, 0.0, 1.0))])
+    assert streamed(info, chunks, skeleton, [], attachments, 1024) == buffered(info, chunks, skeleton, [], attachments)
+
+def test_stream_info_must_keep_its_size():
+    info, chunks, influences, attachments = make_scene(np.random.default_rng(2))
+    writer = ImStreamWriter(io.BytesIO(), InfoData(102, info.position, info.rotation, 0))
+    with pytest.raises(ValueError):
+        writer.finish(info, None, influences, attachments)
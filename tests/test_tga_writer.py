@@ -0,0 +1,33 @@
+import os
+import struct
+
+import numpy as np
+
+from tga_writer import TgaWriterPool, encode_tga
+
+def test_encode_tga_header_and_swizzle():
+    pixels = np.array([1.0, 0.5, 0.0, 1.0], dtype=np.float32)
+    data = encode_tga(pixels, 1, 1)
+    assert struct.unpack("<BBBHHBHHHHBB", data[:18]) == (0, 0, 2, 0, 0, 0, 0, 0, 1, 1, 32, 8)
+    assert data[18:] == bytes([0, 128, 255, 255])
+
+def test_pool_writes_each_path_once(tmp_path):
+    pixels = np.random.default_rng(0).random(64 * 64 * 4).astype(np.float32)
+    path = str(tmp_path / "shared.tga")
+    other = str(tmp_path / "other.tga")
+    done = []
+
+    pool = TgaWriterPool(max_workers=4)
+    try:
+        for i in range(8):
+            pool.submit(path, pixels, 64, 64, on_done=lambda p, i=i: done.append((p, i)))
+        pool.submit(other, pixels, 64, 64)
+        assert sum(1 for _, queued in pool.pending if queued == path) <= 1
+        assert pool.wait() == []
+    finally:
+        pool.shutdown()
+
+    assert sorted(done) == [(path, i) for i in range(8)]
+    assert sorted(os.listdir(tmp_path)) == ["other.tga", "shared.tga"]
+    with open(path, "rb") as f:
+        assert f.read() == encode_tga(pixels, 64, 64)
@@ -0,0 +1,128 @@
+import numpy as np
+
+from vertex_dedup import MAX_CHUNK_VERTICES, dedup_ids, quantize_keys, split_chunks, spatial_segments
+
+def grid_object(num_faces, offset=0.0):
+    """obj_data of a triangle soup, every corner its own vertex, plus its segment ids."""
+    positions = np.random.default_rng(num_faces).random((num_faces * 3, 3)).astype(np.float32) + offset
+    corners = np.arange(num_faces * 3)
+    obj_data = {
+        "arrays": {"positions": positions, "loop_vertex": corners},
+        "faces": np.arange(num_faces),
+        "corners": corners,
+    }
+    return obj_data, corners.copy()
+
+def test_spatial_segments_empty_group():
+    group, segments, breaks, min_chunks = spatial_segments([], [])
+    assert group == [] and segments == [] and len(breaks) == 0
+    assert split_chunks(segments, breaks=breaks) == []
+
+def test_spatial_segments_material_slot_without_faces():
+    empty, empty_ids = grid_object(0)
+    full, full_ids = grid_object(10)
+    group, segments, breaks, min_chunks = spatial_segments([empty, full], [empty_ids, full_ids])
+    assert min_chunks == 1 and len(breaks) == 0
+    chunks = split_chunks(segments, breaks=breaks)
+    assert len(chunks) == 1 and len(chunks[0]["indices"]) == 30
+
+def test_spatial_segments_covers_every_face_once():
+    num_faces = MAX_CHUNK_VERTICES // 3 + 1000
+    first, first_ids = grid_object(num_faces)
+    second, second_ids = grid_object(500, offset=2.0)
+    group, segments, breaks, min_chunks = spatial_segments([first, second], [first_ids, second_ids])
+    assert min_chunks == 2 and len(breaks) >= 2
+
+    faces = {0: [], 1: []}
+    for obj_data in group:
+        faces[0 if obj_data["arrays"] is first["arrays"] else 1].append(obj_data["faces"])
+    assert np.array_equal(np.sort(np.concatenate(faces[0])), np.arange(num_faces))
+    assert np.array_equal(np.sort(np.concatenate(faces[1])), np.arange(500))
+
+    for chunk in split_chunks(segments, breaks=breaks):
+        assert chunk["indices"].max() < MAX_CHUNK_VERTICES
+
+#reference: the original per corner loop, a uv dictionary per object that is cleared
+#whenever a chunk is split after the face that takes it past a limit
+
+def veckey2d(v):
+    return round(v[0], 4), round(v[1], 4)
+
+def veckey3d(v):
+    return round(v[0], 4), round(v[1], 4), round(v[2], 4)
+
+def reference_chunks(objects, max_vertices, max_triangles):
+    chunks = []
+    vertex_corners = []
+    indices = []
+    for segment_index, (vertex_index, uvs, normals, colors) in enumerate(objects):
+        uv_dict = {}
+        for face in range(len(vertex_index) // 3):
+            for corner in range(face * 3, face * 3 + 3):
+                uv = uvs[corner] if uvs is not None else [0, 0]
+                color = colors[corner] if colors is not None else [1, 1, 1, 1]
+                uv_key = vertex_index[corner], veckey2d(uv), veckey3d(normals[corner]), veckey3d(color)
+                if uv_dict.get(uv_key) is None:
+                    uv_dict[uv_key] = len(vertex_corners)
+                    vertex_corners.append((segment_index, corner))
+                indices.append(uv_dict[uv_key])
+
+            if len(vertex_corners) > max_vertices or len(indices) // 3 > max_triangles:
+                chunks.append((vertex_corners, indices))
+                vertex_corners = []
+                indices = []
+                uv_dict.clear()
+    if vertex_corners:
+        chunks.append((vertex_corners, indices))
+    return chunks
+
+def random_object(rng, num_faces, use_uvs=True, use_colors=False, use_nan=False):
+    vertex_index = rng.integers(0, 40, num_faces * 3)
+    #values around the 4th decimal, where the rounding has to agree
+    choices = np.array([0.0, 0.5, 0.12345, 0.12355, -0.00005, 0.00015, 1.0, 0.33333], dtype=np.float32)
+    uvs = rng.choice(choices, (num_faces * 3, 2)) if use_uvs else None
+    normals = rng.choice(choices, (num_faces * 3, 3))
+    colors = rng.choice(choices, (num_faces * 3, 4)) if use_colors else None
+    if use_nan:
+        normals[rng.integers(0, num_faces * 3, 5), 1] = np.nan
+    return vertex_index, uvs, normals, colors
+
+def split_result(chunks):
+    result = []
+    for chunk in chunks:
+        vertex_corners = [(segment_index, int(corner)) for segment_index, _, _, corners in chunk["parts"]
+                          for corner in corners]
+        result.append((vertex_corners, chunk["indices"].tolist()))
+    return result
+
+def check_against_reference(objects, max_vertices, max_triangles):
+    segments = [dedup_ids(quantize_keys(vertex_index, uvs, normals, colors))
+                for vertex_index, uvs, normals, colors in objects]
+    chunks = split_chunks(segments, max_vertices, max_triangles)
+    as_lists = [(vertex_index.tolist(), None if uvs is None else uvs.tolist(), normals.tolist(),
+                 None if colors is None else colors.tolist()) for vertex_index, uvs, normals, colors in objects]
+    assert split_result(chunks) == reference_chunks(as_lists, max_vertices, max_triangles)
+
+def test_dedup_and_split_match_reference():
+    rng = np.random.default_rng(1)
+    objects = [random_object(rng, 300), random_object(rng, 250, use_colors=True), random_object(rng, 200, use_uvs=False)]
+    check_against_reference(objects, 100, 120)
+    check_against_reference(objects, 5000, 5000)
+
+def test_dedup_and_split_nan_corners_stay_unique():
+    rng = np.random.default_rng(2)
+    check_against_reference([random_object(rng, 200, use_nan=True)], 90, 200)
+
+def test_split_triangle_limit():
+    rng = np.random.default_rng(3)
+    #few distinct vertices, so the triangle limit is the one that splits
+    vertex_index = rng.integers(0, 4, 600)
+    normals = np.zeros((600, 3), dtype=np.float32)
+    check_against_reference([(vertex_index, None, normals, None)], 1000, 64)
+
+def test_dedup_ids_equal_rows_share_ids():
+    keys = np.array([[1, 2], [3, 4], [1, 2], [3, 5], [3, 4]])
+    ids = dedup_ids(keys)
+    assert ids[0] == ids[2] and ids[1] == ids[4]
+    assert len(set(ids.tolist())) == 3
+    assert len(dedup_ids(np.zeros((0, 2), dtype=np.int64))) == 0
@@ -0,0 +1,120 @@
+"""Incremental texture output.
+
+Converted textures and texture.txt files are only (re)written when something that goes
+into them changed. Within an export every output is produced once, and across exports a
+small JSON cache in the .im_cache folder next to the exported files remembers which source
+content and conversion settings each output was made from. A texture whose key still
+matches, and whose file hasn't been touched since, is skipped entirely.
+"""
+
+import hashlib
+import json
+import logging
+import os
+
+CACHE_VERSION = 1
+CACHE_FILENAME = "textures.json"
+
+log = logging.getLogger(__name__)
+
+def hash_bytes(*parts):
+    digest = hashlib.sha1()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode('utf-8')
+        digest.update(part)
+    return digest.hexdigest()
+
+def _file_stat(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+class TextureCache:
+    def __init__(self, cache_dir):
+        self.path = os.path.join(cache_dir, CACHE_FILENAME)
+        self.sources = {}
+        self.outputs = {}
+        #outputs produced during this export, path -> key
+        self.done = {}
+        self.dirty = False
+
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            if data.get("version") == CACHE_VERSION:
+                self.sources = data.get("sources", {})
+                self.outputs = data.get("outputs", {})
+        except (OSError, ValueError):
+            pass
+
+    def file_hash(self, path):
+        """Content hash of a source file. Re-hashed only when its mtime or size changes."""
+        path = os.path.abspath(path)
+        stat = _file_stat(path)
+        if stat is None:
+            return None
+        entry = self.sources.get(path)
+        if entry is not None and entry["stat"] == stat:
+            return entry["hash"]
+
+        digest = hashlib.sha1()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        self.sources[path] = {"stat": stat, "hash": digest.hexdigest()}
+        self.dirty = True
+        return self.sources[path]["hash"]
+
+    def is_current(self, output_path, key):
+        """True if output_path was already produced from key, in this export or an earlier one."""
+        if self.done.get(output_path) == key:
+            return True
+        entry = self.outputs.get(os.path.abspath(output_path))
+        if entry is None or entry["key"] != key or entry["stat"] != _file_stat(output_path):
+            return False
+        self.done[output_path] = key
+        return True
+
+    def reserve(self, output_path, key):
+        """Mark output_path as being produced from key in this export, before it is written."""
+        self.done[output_path] = key
+
+    def record(self, output_path, key):
+        """Remember that output_path now holds the result for key."""
+        self.done[output_path] = key
+        self.outputs[os.path.abspath(output_path)] = {"key": key, "stat": _file_stat(output_path)}
+        self.dirty = True
+
+    def write_text(self, path, text):
+        """Write a small text file unless it already has exactly this content. Returns True if written."""
+        key = hash_bytes(text)
+        if self.is_current(path, key):
+            return False
+        try:
+            with open(path, "r") as f:
+                unchanged = f.read() == text
+        except (OSError, UnicodeDecodeError):
+            unchanged = False
+
+        if not unchanged:
+            with open(path, "w") as f:
+                f.write(text)
+        self.record(path, key)
+        return not unchanged
+
+    def save(self):
+        if not self.dirty:
+            return
+        data = {"version": CACHE_VERSION, "sources": self.sources, "outputs": self.outputs}
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temp_path = self.path + ".tmp"
+            with open(temp_path, "w") as f:
+                json.dump(data, f)
+            os.replace(temp_path, self.path)
+            self.dirty = False
+        except OSError as e:
+            log.warning("Could not write texture cache " + self.path + ": " + str(e))
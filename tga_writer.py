@@ -0,0 +1,118 @@
+"""Uncompressed 32 bit TGA encoding off the main thread.
+
+Blender's pixel buffers are float RGBA, bottom row first. That is also the row order of a
+TGA with a bottom-left origin, so encoding is a float to byte conversion and an RGBA to BGRA
+swizzle, done in NumPy. Encoding and the file write run in a thread pool - NumPy and file
+I/O release the GIL - while the main thread keeps reading the next image.
+"""
+
+import concurrent.futures
+import os
+import struct
+import tempfile
+
+import numpy as np
+
+def linear_to_srgb(values):
+    values = np.clip(values, 0.0, None)
+    return np.where(values <= 0.0031308, values * 12.92, 1.055 * np.power(values, 1.0 / 2.4) - 0.055)
+
+def encode_tga(pixels, width, height, linear=False):
+    """Encode float RGBA pixels (bottom row first) as an uncompressed 32 bit TGA.
+
+    With linear set the color channels are converted to sRGB first (float images).
+    """
+    pixels = np.asarray(pixels, dtype=np.float32).reshape(height, width, 4)
+    if linear:
+        pixels = pixels.copy()
+        pixels[..., :3] = linear_to_srgb(pixels[..., :3])
+
+    #same rounding as Blender's unit_float_to_uchar_clamp
+    rgba = np.clip(np.floor(pixels * np.float32(255.0) + np.float32(0.5)), 0, 255).astype(np.uint8)
+    bgra = rgba[..., [2, 1, 0, 3]]
+
+    #no image id, no color map, uncompressed true color, bottom-left origin with 8 alpha bits
+    header = struct.pack("<BBBHHBHHHHBB", 0, 0, 2, 0, 0, 0, 0, 0, width, height, 32, 8)
+    return header + bgra.tobytes()
+
+def write_tga(path, pixels, width, height, linear=False):
+    data = encode_tga(pixels, width, height, linear)
+    #a temporary file of its own, next to the target so the replace stays on one file system
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(path) or ".", prefix=os.path.basename(path) + ".",
+                                     suffix=".tmp", delete=False) as f:
+        temp_path = f.name
+        try:
+            f.write(data)
+        except BaseException:
+            f.close()
+            os.remove(temp_path)
+            raise
+    try:
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+class TgaWriterPool:
+    """Encodes and writes TGAs on worker threads.
+
+    submit() only queues work, bounded so that pending pixel buffers don't pile up in memory;
+    wait() blocks until everything is written and runs the completion callbacks on the
+    calling thread. Each path is written once between two wait() calls, later submits of the
+    same path only add their callback.
+    """
+
+    def __init__(self, max_workers=None):
+        if max_workers is None:
+            max_workers = min(8, os.cpu_count() or 1)
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        self.max_pending = max_workers * 2
+        self.pending = []
+        self.finished = []
+        self.errors = []
+        #path -> completion callbacks, for every path submitted since the last wait()
+        self.callbacks = {}
+
+    def submit(self, path, pixels, width, height, linear=False, on_done=None):
+        callbacks = self.callbacks.get(path)
+        if callbacks is not None:
+            #already queued or written, the image is shared by several materials
+            if on_done is not None:
+                callbacks.append(on_done)
+            return
+        while len(self.pending) >= self.max_pending:
+            self._collect(concurrent.futures.FIRST_COMPLETED)
+        future = self.executor.submit(write_tga, path, pixels, width, height, linear)
+        self.callbacks[path] = [on_done] if on_done is not None else []
+        self.pending.append((future, path))
+
+    def _collect(self, return_when):
+        done, _ = concurrent.futures.wait([future for future, _ in self.pending], return_when=return_when)
+        still_pending = []
+        for future, path in self.pending:
+            if future not in done:
+                still_pending.append((future, path))
+                continue
+            error = future.exception()
+            if error is not None:
+                self.errors.append((path, error))
+            else:
+                self.finished.append(path)
+        self.pending = still_pending
+
+    def wait(self):
+        """Finish all queued images. Returns a list of (path, exception) for failed writes."""
+        self._collect(concurrent.futures.ALL_COMPLETED)
+        for path in self.finished:
+            for on_done in self.callbacks[path]:
+                on_done(path)
+        self.finished = []
+        self.callbacks = {}
+        errors, self.errors = self.errors, []
+        return errors
+
+    def shutdown(self):
+        """Stop the workers. Images still queued (an export that failed before wait()) are dropped."""
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        self.pending = []
+        self.callbacks = {}
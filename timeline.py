@@ -0,0 +1,66 @@
+"""Single pass timeline sampling.
+
+scene.frame_set() is a full depsgraph evaluation, so instead of every consumer (animated
+bounds, .kin frames, ...) walking the timeline on its own, one sweep visits each frame once
+and hands it to all of them.
+"""
+
+import numpy as np
+
+from . import profiler
+from .im_writer import transform_rows
+
+class TimelineSweep:
+    """Visits every frame of [frame_start, frame_end] once, calling each listener(frame) after
+    the scene has been evaluated at that frame."""
+
+    def __init__(self, scene, frame_start, frame_end):
+        self.scene = scene
+        self.frame_start = frame_start
+        self.frame_end = frame_end
+        self.next_frame = frame_start
+        self.listeners = []
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def frames(self):
+        """Evaluate the remaining frames one at a time, yielding each frame number so the
+        caller can read the evaluated state before the sweep moves on."""
+        while self.next_frame <= self.frame_end:
+            frame = self.next_frame
+            with profiler.phase("frame_set"):
+                self.scene.frame_set(frame)
+            with profiler.phase("timeline_listeners"):
+                for listener in self.listeners:
+                    listener(frame)
+            profiler.count("frames_evaluated")
+            self.next_frame += 1
+            yield frame
+
+    def finish(self):
+        """Sweep whatever frames haven't been visited yet. Returns the number of frames evaluated."""
+        count = 0
+        for _ in self.frames():
+            count += 1
+        return count
+
+class AnimatedBounds:
+    """Sweep listener growing an axis aligned box over the bound_box of every object."""
+
+    def __init__(self, objects, global_matrix):
+        self.objects = objects
+        self.global_matrix = global_matrix
+        self.min = None
+        self.max = None
+
+    def __call__(self, frame):
+        for obj in self.objects:
+            matrix = [list(row) for row in self.global_matrix @ obj.matrix_world]
+            corners = transform_rows(matrix, [coord[:] for coord in obj.bound_box])
+            if self.min is None:
+                self.min = corners.min(axis=0)
+                self.max = corners.max(axis=0)
+            else:
+                self.min = np.minimum(self.min, corners.min(axis=0))
+                self.max = np.maximum(self.max, corners.max(axis=0))
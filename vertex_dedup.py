@@ -0,0 +1,294 @@
+"""Array based vertex deduplication and chunk splitting.
+
+Produces exactly the unique vertex tables and index buffers of the original per-corner
+uv_dict lookup, keyed on (vertex index, uv, normal, color) rounded to 4 decimals:
+
+* Blender attributes are float32, so x * 10000 is exact in double precision and rint()
+  (round half to even) lands on the same integer as Python's round(x, 4).
+* NaN never compares equal in a dict key, so NaN corners always become new vertices.
+* The uv dictionary is per object and is cleared whenever a chunk is split, so the
+  deduplication scope is (object, chunk), while the chunk limits count everything
+  collated into the chunk.
+
+spatial_partition is the alternative to cutting at whatever face crosses the limit: it
+splits a material group's triangles along the longest axis (k-d style) into spatially
+compact sets that each fit a chunk, and spatial_segments applies it to an exporter material
+group.
+"""
+
+import numpy as np
+
+#a chunk is split after the first face that takes it past either limit
+MAX_CHUNK_VERTICES = 65532
+MAX_CHUNK_TRIANGLES = 65535
+
+_POS_INF_KEY = np.iinfo(np.int64).max
+_NEG_INF_KEY = np.iinfo(np.int64).min + 1
+
+def _quantize(values):
+    values = np.asarray(values, dtype=np.float64)
+    keys = np.rint(values * 10000.0)
+    finite = np.isfinite(keys)
+    if finite.all():
+        return keys.astype(np.int64), None
+
+    out = np.zeros(keys.shape, dtype=np.int64)
+    out[finite] = keys[finite].astype(np.int64)
+    out[keys == np.inf] = _POS_INF_KEY
+    out[keys == -np.inf] = _NEG_INF_KEY
+    return out, np.isnan(values).any(axis=1)
+
+def quantize_keys(vertex_index, uvs=None, normals=None, colors=None):
+    """Build the (C, K) int64 dedup key of each corner.
+
+    uvs default to (0, 0) and colors to white, like the exporter does for meshes without
+    those layers. Only the first three color channels take part in the key.
+    """
+    num_corners = len(vertex_index)
+    columns = [np.asarray(vertex_index, dtype=np.int64)[:, None]]
+    nan = np.zeros(num_corners, dtype=bool)
+
+    for values in (uvs, normals, colors):
+        if values is None:
+            #constant columns can't tell corners apart, leave them out
+            continue
+        quantized, value_nan = _quantize(values[:, :3])
+        columns.append(quantized)
+        if value_nan is not None:
+            nan |= value_nan
+
+    #any NaN makes the corner unique
+    if nan.any():
+        columns.append(np.where(nan, np.arange(num_corners), -1)[:, None])
+
+    return np.concatenate(columns, axis=1)
+
+def _pack_columns(keys):
+    """Losslessly pack key columns into as few int64 words as their value ranges allow."""
+    words = []
+    word = None
+    word_span = 1
+    for column, low, high in zip(keys.T, keys.min(axis=0).tolist(), keys.max(axis=0).tolist()):
+        span = high - low + 1
+        if span == 1:
+            continue
+        if span >= 2**62:
+            #infinity sentinels, keep the column as is
+            words.append(column)
+            continue
+        if word is not None and word_span * span < 2**63:
+            word = word * span + (column - low)
+            word_span *= span
+        else:
+            if word is not None:
+                words.append(word)
+            word = column - low
+            word_span = span
+    if word is not None:
+        words.append(word)
+    return words
+
+def dedup_ids(keys):
+    """Map each row of keys to a class id, equal rows sharing an id."""
+    if len(keys) == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    words = _pack_columns(keys)
+    if len(words) == 0:
+        return np.zeros(len(keys), dtype=np.int64)
+    if len(words) == 1:
+        order = np.argsort(words[0], kind='stable')
+    else:
+        order = np.lexsort(words[::-1])
+
+    is_new = np.zeros(len(keys), dtype=bool)
+    is_new[0] = True
+    for word in words:
+        sorted_word = word[order]
+        is_new[1:] |= sorted_word[1:] != sorted_word[:-1]
+
+    ids = np.empty(len(keys), dtype=np.int64)
+    ids[order] = np.cumsum(is_new) - 1
+    return ids
+
+def _first_use(ids):
+    """For corner class ids, return (local vertex number per corner, corners that create a vertex).
+
+    Vertices are numbered in order of first encounter.
+    """
+    _, first, inverse = np.unique(ids, return_index=True, return_inverse=True)
+    inverse = inverse.ravel()
+    rank = np.empty(len(first), dtype=np.int64)
+    rank[np.argsort(first)] = np.arange(len(first))
+    return rank[inverse], np.sort(first)
+
+def split_chunks(segments, max_vertices=MAX_CHUNK_VERTICES, max_triangles=MAX_CHUNK_TRIANGLES, breaks=()):
+    """Split consecutive segments of triangles into chunks.
+
+    segments is a list of per-object corner class id arrays (3 corners per triangle, see
+    dedup_ids), in the order they are collated into chunks. A new chunk is also started at
+    every segment index in breaks. Returns a list of chunks, each a
+    dict with:
+        parts    list of (segment index, first face, end face, vertex corners) - vertex corners
+                 are the segment relative corners that created each vertex, in vertex order
+        indices  (3 * triangles,) int64 index buffer
+    """
+    chunks = []
+    parts = []
+    indices = []
+    num_vertices = 0
+    num_triangles = 0
+
+    for segment_index, ids in enumerate(segments):
+        if segment_index in breaks and num_vertices > 0:
+            chunks.append({"parts": parts, "indices": np.concatenate(indices)})
+            parts = []
+            indices = []
+            num_vertices = 0
+            num_triangles = 0
+
+        num_faces = len(ids) // 3
+        face_start = 0
+        while face_start < num_faces:
+            #a chunk never holds more than max_triangles faces, so only look that far ahead
+            window_end = min(num_faces, face_start + max_triangles + 1)
+            local_index, vertex_corners = _first_use(ids[face_start * 3:window_end * 3])
+
+            #vertices created by each face
+            created = np.zeros(len(local_index), dtype=np.int64)
+            created[vertex_corners] = 1
+            vertex_count = num_vertices + np.cumsum(created.reshape(-1, 3).sum(axis=1))
+            triangle_count = num_triangles + np.arange(1, len(vertex_count) + 1)
+
+            over = np.flatnonzero((vertex_count > max_vertices) | (triangle_count > max_triangles))
+            face_end = window_end if len(over) == 0 else face_start + over[0] + 1
+            num_part_faces = face_end - face_start
+
+            vertex_corners = vertex_corners[vertex_corners < num_part_faces * 3]
+            parts.append((segment_index, face_start, face_end, vertex_corners + face_start * 3))
+            indices.append(local_index[:num_part_faces * 3] + num_vertices)
+            num_vertices += len(vertex_corners)
+            num_triangles += num_part_faces
+
+            if len(over) != 0:
+                chunks.append({"parts": parts, "indices": np.concatenate(indices)})
+                parts = []
+                indices = []
+                num_vertices = 0
+                num_triangles = 0
+
+            face_start = face_end
+
+    if num_vertices > 0:
+        chunks.append({"parts": parts, "indices": np.concatenate(indices)})
+
+    return chunks
+
+def _chunk_count(corner_ids, triangles, max_vertices, max_triangles):
+    """Lower bound on the chunks needed for triangles (0 if they fit in one)."""
+    num_vertices = len(np.unique(corner_ids[triangles]))
+    if num_vertices <= max_vertices and len(triangles) <= max_triangles:
+        return 0
+    return max(-(-num_vertices // max_vertices), -(-len(triangles) // max_triangles), 2)
+
+def spatial_partition(centroids, corner_ids, max_vertices=MAX_CHUNK_VERTICES, max_triangles=MAX_CHUNK_TRIANGLES):
+    """Partition triangles into spatially compact sets that each fit in a chunk.
+
+    centroids is (T, 3) and corner_ids (T, 3) vertex class ids, unique across everything being
+    partitioned. Sets that are too big are cut along the longest axis of their centroids, in
+    the proportion of the chunks they need at least, so the chunk count stays close to the
+    minimum. Returns a list of ascending triangle index arrays, neighboring sets next to each
+    other.
+    """
+    centroids = np.asarray(centroids, dtype=np.float64).reshape(-1, 3)
+    corner_ids = np.asarray(corner_ids, dtype=np.int64).reshape(-1, 3)
+
+    leaves = []
+    stack = [np.arange(len(centroids))]
+    while stack:
+        triangles = stack.pop()
+        needed = _chunk_count(corner_ids, triangles, max_vertices, max_triangles)
+        if needed == 0:
+            leaves.append(triangles)
+            continue
+
+        points = centroids[triangles]
+        axis = int(np.argmax(points.max(axis=0) - points.min(axis=0)))
+        order = np.argsort(points[:, axis], kind='stable')
+        cut = len(triangles) * (needed // 2) // needed
+        #pushed in reverse so the lower half is emitted first
+        stack.append(np.sort(triangles[order[cut:]]))
+        stack.append(np.sort(triangles[order[:cut]]))
+
+    return leaves
+
+def minimum_chunks(corner_ids, max_vertices=MAX_CHUNK_VERTICES, max_triangles=MAX_CHUNK_TRIANGLES):
+    """Lower bound on the number of chunks any split of the triangles needs."""
+    corner_ids = np.asarray(corner_ids, dtype=np.int64).reshape(-1, 3)
+    return max(1, _chunk_count(corner_ids, np.arange(len(corner_ids)), max_vertices, max_triangles))
+
+
+def spatial_segments(group, segments):
+    """Regroup a material group's per object segments into spatially compact chunks.
+
+    Returns (obj_data list, segments, segment indices starting a chunk, minimum chunk count).
+    Groups that fit in one chunk, or are empty, are returned unchanged. Each obj_data needs
+    "arrays" (with "positions" and "loop_vertex"), "faces" and "corners".
+    """
+    if len(group) == 0:
+        return group, segments, (), 0
+
+    centroids = []
+    corner_ids = []
+    id_offset = 0
+    for obj_data, ids in zip(group, segments):
+        mesh_arrays = obj_data["arrays"]
+        corner_positions = mesh_arrays["positions"][mesh_arrays["loop_vertex"][obj_data["corners"]]]
+        centroids.append(corner_positions.reshape(-1, 3, 3).mean(axis=1))
+        #vertices are only shared within an object
+        corner_ids.append(ids + id_offset)
+        id_offset += int(ids.max()) + 1 if len(ids) > 0 else 0
+    corner_ids = np.concatenate(corner_ids).reshape(-1, 3)
+
+    min_chunks = minimum_chunks(corner_ids)
+    if min_chunks == 1:
+        return group, segments, (), min_chunks
+
+    num_faces = [len(ids) // 3 for ids in segments]
+    owner = np.repeat(np.arange(len(group)), num_faces)
+    first_face = np.concatenate([[0], np.cumsum(num_faces)])
+
+    leaf_group = []
+    leaf_segments = []
+    breaks = set()
+    for leaf in spatial_partition(np.concatenate(centroids), corner_ids):
+        breaks.add(len(leaf_segments))
+        for segment_index in np.unique(owner[leaf]).tolist():
+            obj_data = group[segment_index]
+            local = leaf[owner[leaf] == segment_index] - first_face[segment_index]
+            leaf_group.append(dict(obj_data,
+                                      faces=obj_data["faces"][local],
+                                      corners=obj_data["corners"].reshape(-1, 3)[local].ravel()))
+            leaf_segments.append(segments[segment_index].reshape(-1, 3)[local].ravel())
+    return leaf_group, leaf_segments, breaks, min_chunks
+
+if __name__ == "__main__":
+    #throughput check on a synthetic grid with split normals and UV seams
+    import time
+
+    size = 1000
+    num_faces = (size - 1) * (size - 1) * 2
+    rng = np.random.default_rng(0)
+    quad = np.arange(size * size).reshape(size, size)[:-1, :-1].ravel()
+    tris = np.stack([quad, quad + 1, quad + size, quad + 1, quad + size + 1, quad + size], axis=1).reshape(-1, 3)
+    vertex_index = tris.ravel()
+    uvs = (rng.integers(0, 2, (len(vertex_index), 2)) * 0.5).astype(np.float32)
+    normals = np.tile(np.array([[0.0, 0.0, 1.0]], dtype=np.float32), (len(vertex_index), 1))
+
+    start = time.perf_counter()
+    ids = dedup_ids(quantize_keys(vertex_index, uvs, normals))
+    chunks = split_chunks([ids])
+    elapsed = time.perf_counter() - start
+
+    print(f"{num_faces} triangles, {len(chunks)} chunks in {elapsed:.3f}s "
+          f"({len(vertex_index) / elapsed / 1e6:.1f}M corners/s)")